@@ -0,0 +1,282 @@
+import asyncio
+import importlib.util
+import json
+import os
+import uuid
+from pathlib import Path
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from drive_client import FOLDER_MIMETYPE, ITEM_FIELDS, escape_query
+from id_cache import IdCache
+from local_scan import guess_mimetype
+from scheduler import RequestScheduler, is_retryable
+from transfers import CHUNK_SIZE, part_matches, part_path
+
+ROOT_URL = 'https://www.googleapis.com/'
+MAX_IN_FLIGHT = 100  # connections in the pool; Drive serves about 100 concurrent streams on one HTTP/2 connection
+ALL_DRIVES = {'supportsAllDrives': 'true'}  # sent with every file call, as DriveClient does, so shared drive items are found
+
+
+class AsyncDriveClient:
+    """
+    An asyncio Drive v3 client for the calls the tree code makes: list children, get, delete,
+    create folder, upload and download. Requests go straight to the REST endpoints over one pooled
+    httpx.AsyncClient, so a single event loop keeps as many of them going as the scheduler allows
+    without a thread (and a googleapiclient service) per request. With the optional h2 package
+    installed the pool speaks HTTP/2 and multiplexes them over a single keep-alive connection,
+    otherwise it keeps up to max_in_flight HTTP/1.1 connections alive.
+
+    Every call goes through scheduler, like DriveClient's. Errors are raised as googleapiclient
+    HttpErrors, so scheduler.is_retryable and existing handlers apply. File I/O runs in worker
+    threads, so a slow disk holds up only its own transfer, not the event loop.
+    Needs the optional httpx package.
+
+    Args:
+        credentials: google.auth credentials, refreshed in a worker thread when they expire; None for no auth.
+        root_url: the API root, e.g. a FakeDrive url.
+        max_in_flight: the connection pool size, and the concurrency limit of a new scheduler.
+        scheduler: a RequestScheduler, shared with other clients on the same quota, or None for a new one.
+        id_cache: an IdCache for folder lookups, kept in step with creates and deletes as DriveClient does.
+        drive_id: a shared drive's id, or None for My Drive. As with DriveClient, queries are then
+            limited to that drive and top-level names resolve from its root. Without one, listings
+            still include items from shared drives, so a shared drive folder found by id can be crawled.
+    """
+
+    def __init__(self, credentials=None, root_url: str = ROOT_URL, max_in_flight: int = MAX_IN_FLIGHT,
+                 scheduler: RequestScheduler = None, id_cache: IdCache = None, drive_id: str = None):
+        import httpx
+        self._credentials = credentials
+        self._root_url = root_url.rstrip('/')
+        self._http = httpx.AsyncClient(http2=importlib.util.find_spec('h2') is not None, timeout=60,
+                                       limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight))
+        self.scheduler = RequestScheduler(max_concurrency=max_in_flight) if scheduler is None else scheduler
+        self._refresh_lock = asyncio.Lock()
+        self.id_cache = id_cache
+        self.drive_id = drive_id
+
+    @property
+    def root_id(self):
+        """ Where top-level names resolve from: the shared drive, or 'root' for My Drive. """
+        return self.drive_id or 'root'
+
+    def _corpus(self):
+        """ The files.list parameters that reach shared drive items, limited to the client's drive if it has one. """
+        if self.drive_id is None:
+            return dict(ALL_DRIVES, includeItemsFromAllDrives='true')
+        return dict(ALL_DRIVES, includeItemsFromAllDrives='true', corpora='drive', driveId=self.drive_id)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def _auth_headers(self):
+        headers = {}
+        if self._credentials is None:
+            return headers
+        if not self._credentials.valid:
+            async with self._refresh_lock:
+                if not self._credentials.valid:
+                    from google.auth.transport.requests import Request
+                    await asyncio.to_thread(self._credentials.refresh, Request())
+        self._credentials.apply(headers)
+        return headers
+
+    async def _request(self, method: str, path: str, params: dict = None, name: str = None, **kwargs):
+        """
+        One API call through the scheduler, named in its metrics as name, e.g. 'drive.files.get'.
+        Returns the httpx response, raises HttpError for anything but 2xx.
+        """
+        extra_headers = kwargs.pop('headers', {})
+
+        async def send():
+            headers = dict(extra_headers, **await self._auth_headers())
+            response = await self._http.request(method, self._root_url + path, params=params, headers=headers, **kwargs)
+            if response.status_code >= 300:
+                raise _http_error(response)
+            return response
+        return await self.scheduler.call_async(send, method=name)
+
+    async def get(self, file_id: str, fields: str = ITEM_FIELDS):
+        return (await self._request('GET', f'/drive/v3/files/{file_id}', dict(ALL_DRIVES, fields=fields), 'drive.files.get')).json()
+
+    async def list(self, q: str, fields: str = ITEM_FIELDS, page_size: int = 1000):
+        """ Runs a files.list query to completion, following nextPageToken. """
+        items = []
+        params = dict(self._corpus(), q=q, spaces='drive', fields=f'nextPageToken, files({fields})', pageSize=page_size)
+        while True:
+            response = (await self._request('GET', '/drive/v3/files', params, 'drive.files.list')).json()
+            items.extend(response.get('files', []))
+            self.scheduler.metrics.count('pages_fetched', method='drive.files.list')
+            self.scheduler.metrics.count('items_listed', len(response.get('files', [])), method='drive.files.list')
+            if not response.get('nextPageToken'):
+                return items
+            params['pageToken'] = response['nextPageToken']
+
+    async def list_children(self, folder_id: str, fields: str = ITEM_FIELDS):
+        return await self.list(f"'{folder_id}' in parents and trashed=false", fields)
+
+    async def find_folder(self, folder_name: str, parent_id: str = None):
+        """
+        Returns:
+            str: the ID of the first folder called folder_name directly under parent_id (root_id
+                if None), or None.
+        """
+        parent_id = self.root_id if parent_id is None else parent_id
+        if self.id_cache is not None:
+            cached = self.id_cache.get(parent_id, folder_name)
+            if cached is not None and cached[1] == FOLDER_MIMETYPE:
+                return cached[0]
+        query = f"name = '{escape_query(folder_name)}' and mimeType = '{FOLDER_MIMETYPE}' and '{parent_id}' in parents and trashed=false"
+        folders = await self.list(query, 'id, name, parents')
+        if not folders:
+            return None
+        self._remember(parent_id, folder_name, folders[0]['id'], FOLDER_MIMETYPE)
+        return folders[0]['id']
+
+    def _remember(self, parent_id: str, name: str, file_id: str, mime_type: str = None):
+        if self.id_cache is not None:
+            self.id_cache.put(parent_id, name, file_id, mime_type)
+
+    async def create_folder(self, folder_name: str, parent_id: str, fields: str = ITEM_FIELDS):
+        body = {'name': folder_name, 'mimeType': FOLDER_MIMETYPE, 'parents': [parent_id]}
+        folder = (await self._request('POST', '/drive/v3/files', dict(ALL_DRIVES, fields=fields), 'drive.files.create', json=body)).json()
+        self._remember(parent_id, folder_name, folder['id'], FOLDER_MIMETYPE)
+        return folder
+
+    async def delete(self, file_id: str):
+        await self._request('DELETE', f'/drive/v3/files/{file_id}', ALL_DRIVES, 'drive.files.delete')
+        if self.id_cache is not None:
+            self.id_cache.invalidate(file_id, children=True)
+
+    async def delete_many(self, file_ids):
+        """
+        Deletes files concurrently, as many at a time as the scheduler allows.
+
+        Returns:
+            dict: file id -> None if deleted, otherwise the HttpError
+        """
+        async def delete(file_id):
+            try:
+                await self.delete(file_id)
+            except HttpError as error:
+                return error
+        file_ids = list(file_ids)
+        return dict(zip(file_ids, await asyncio.gather(*(delete(file_id) for file_id in file_ids))))
+
+    async def upload_file(self, file_path, parent_id: str, name: str = None, fields: str = ITEM_FIELDS):
+        """ Uploads a local file into parent_id in a single multipart request; meant for small files. """
+        file_path = Path(file_path)
+        metadata = {'name': name or file_path.name, 'parents': [parent_id]}
+        data = await asyncio.to_thread(file_path.read_bytes)
+        boundary = uuid.uuid4().hex
+        body = (f'--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(metadata)}\r\n'
+                f'--{boundary}\r\nContent-Type: {guess_mimetype(file_path.name)}\r\n\r\n').encode() + data + f'\r\n--{boundary}--'.encode()
+        response = await self._request('POST', '/upload/drive/v3/files', dict(ALL_DRIVES, uploadType='multipart', fields=fields),
+                                       'drive.files.create', content=body, headers={'Content-Type': f'multipart/related; boundary={boundary}'})
+        self.scheduler.metrics.count('bytes_sent', len(body))
+        file = response.json()
+        self._remember(parent_id, metadata['name'], file['id'], file.get('mimeType'))
+        return file
+
+    async def download_file(self, file_id: str, destination, chunk_size: int = CHUNK_SIZE):
+        """
+        Streams a file to <destination>.part and renames it into place, resuming a .part file
+        left by an earlier attempt with a Range request, like transfers.download_file, which
+        also checks a .part Drive has nothing past against the file's size and md5Checksum.
+        Chunks are written from a worker thread while the next one streams in.
+
+        Returns:
+            int: the number of bytes fetched.
+        """
+        part = part_path(destination)
+        await asyncio.to_thread(part.touch)  # so an empty file, which Drive answers with a 416, has a .part to check
+        fetched = 0
+
+        async def stream():
+            nonlocal fetched
+            offset = part.stat().st_size if part.exists() else 0
+            headers = dict(await self._auth_headers(), Range=f'bytes={offset}-')
+            async with self._http.stream('GET', f'{self._root_url}/drive/v3/files/{file_id}', params=dict(ALL_DRIVES, alt='media'),
+                                         headers=headers) as response:
+                if response.status_code == 416:  # offset is at (or past) the end
+                    return offset
+                if response.status_code not in (200, 206):
+                    await response.aread()
+                    raise _http_error(response)
+                f = await asyncio.to_thread(open, part, 'ab' if response.status_code == 206 else 'wb')
+                try:
+                    async for chunk in response.aiter_bytes(chunk_size):
+                        await asyncio.to_thread(f.write, chunk)
+                        fetched += len(chunk)
+                        self.scheduler.metrics.count('bytes_received', len(chunk))
+                finally:
+                    await asyncio.to_thread(f.close)
+            return None
+
+        complete = await self.scheduler.call_async(stream, method='media.get')
+        if complete is not None and not await asyncio.to_thread(part_matches, part, complete, await self.get(file_id, 'size, md5Checksum')):
+            await asyncio.to_thread(part.unlink)  # left by an older version of the file
+            await self.scheduler.call_async(stream, method='media.get')
+        await asyncio.to_thread(os.replace, part, destination)
+        return fetched
+
+
+def _http_error(response):
+    """ An httpx response as the HttpError googleapiclient would raise for it. """
+    resp = httplib2.Response(dict(response.headers, status=str(response.status_code)))
+    resp.reason = response.reason_phrase
+    return HttpError(resp, response.content, uri=str(response.url))
+
+
+async def crawl_folder(client: AsyncDriveClient, folder_name: str):
+    """
+    The asyncio counterpart of tree_builder.crawl_folder: every folder's children are listed as
+    soon as the folder itself is found, with no per-level barrier, and the client's scheduler caps
+    how many list calls are in flight. An item with several parents is filed, and a folder
+    listed, once, under the first parent reached.
+
+    Returns:
+        dict: the same id_item/id_name/name_id Dictionary crawl_folder returns.
+    """
+    from tree_builder import add_item, finish_master_dict, new_master_dict  # not at the top: only the crawl needs tt_dictionary
+    master_dict = new_master_dict()
+    folder_id = await client.find_folder(folder_name)
+    if folder_id is None:
+        print(f"Folder '{folder_name}' not found at the highest level of your Drive.")
+        return finish_master_dict(master_dict)
+
+    try:
+        root = add_item(master_dict, master_dict, await client.get(folder_id))
+    except HttpError as error:
+        print(f"Error fetching metadata for start folder ID '{folder_id}': {error}")
+        return finish_master_dict(master_dict)
+    seen = {folder_id}
+
+    async def crawl(current_folder_id, folder_dict):
+        try:
+            children = await client.list_children(current_folder_id)
+        except HttpError as error:
+            if is_retryable(error):  # the scheduler gave up on it, so the tree would be missing a subtree
+                raise
+            print(f"An error occurred while fetching descendants of folder ID '{current_folder_id}': {error}")
+            return
+        subfolders = []
+        for child in children:
+            if child['id'] in seen:
+                continue
+            seen.add(child['id'])
+            is_folder = child.get('mimeType') == FOLDER_MIMETYPE
+            stored = add_item(master_dict, folder_dict, child)
+            if is_folder:
+                subfolders.append(crawl(stored['id'], stored))
+        await asyncio.gather(*subfolders)
+
+    await crawl(folder_id, root)
+    return finish_master_dict(master_dict)
@@ -0,0 +1,63 @@
+"""
+Threads vs asyncio against a local FakeDrive with per-request latency: a full crawl, and a burst of
+metadata gets. The threaded client needs a googleapiclient service per thread, the asyncio client
+keeps every request on one event loop and one connection pool.
+Run from the repository root:  python -m benchmarks.bench_async
+
+The fake server shares the GIL with the client, so the speedups are a lower bound.
+The schedulers are opened up so only each client's own concurrency limits it.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from async_client import AsyncDriveClient, crawl_folder
+from drive_client import DriveClient
+from fake_drive import FakeDrive, synthetic_images_tree
+from scheduler import RequestScheduler
+from tree_builder import crawl_folder as threaded_crawl_folder
+
+LATENCY = 0.1
+LOCATIONS = 10
+IMAGES = 10
+GETS = 2000
+
+
+def unthrottled(max_concurrency: int = 1000):
+    return RequestScheduler(rate=1e6, burst=10**6, max_concurrency=max_concurrency)
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+async def async_gets(drive: FakeDrive, ids: list, max_in_flight: int):
+    async with AsyncDriveClient(root_url=drive.url, max_in_flight=max_in_flight, scheduler=unthrottled(max_in_flight)) as client:
+        return await asyncio.gather(*(client.get(file_id) for file_id in ids))
+
+
+async def async_crawl(drive: FakeDrive):
+    async with AsyncDriveClient(root_url=drive.url, scheduler=unthrottled(100)) as client:
+        return await crawl_folder(client, 'images 3.0')
+
+
+if __name__ == '__main__':
+    items = synthetic_images_tree(locations=LOCATIONS, images=IMAGES)
+    ids = [item['id'] for item in items][:GETS]
+    print(f'{"run":>18} {"seconds":>8}')
+    with FakeDrive(items, latency=LATENCY) as drive:
+        client = DriveClient(drive.service, unthrottled())
+        for workers in (16, 64):
+            elapsed, _ = timed(lambda: threaded_crawl_folder(client, 'images 3.0', workers))
+            print(f'{f"crawl threads x{workers}":>18} {elapsed:>8.2f}')
+        elapsed, _ = timed(lambda: asyncio.run(async_crawl(drive)))
+        print(f'{"crawl asyncio":>18} {elapsed:>8.2f}')
+        for workers in (16, 64):
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                elapsed, _ = timed(lambda: list(pool.map(client.get, ids)))
+            print(f'{f"{len(ids)} gets x{workers}":>18} {elapsed:>8.2f}')
+        for in_flight in (100, 500):
+            elapsed, _ = timed(lambda: asyncio.run(async_gets(drive, ids, in_flight)))
+            print(f'{f"{len(ids)} gets aio {in_flight}":>18} {elapsed:>8.2f}')
@@ -0,0 +1,36 @@
+"""
+Crawl benchmark against a local FakeDrive with per-request latency.
+Run from the repository root:  python -m benchmarks.bench_crawl
+
+The fake server shares the GIL with the client, so the speedups are a lower bound.
+The scheduler is opened up so only the client's own concurrency limits the crawl.
+"""
+import time
+
+from drive_client import DriveClient
+from fake_drive import FakeDrive, synthetic_images_tree
+from scheduler import RequestScheduler
+from tree_builder import build_tree
+
+LATENCY = 0.1
+LOCATIONS = 5
+IMAGES = 20
+
+
+def run(mode: str, concurrency: int = 1):
+    with FakeDrive(synthetic_images_tree(locations=LOCATIONS, images=IMAGES), latency=LATENCY) as drive:
+        client = DriveClient(drive.service, RequestScheduler(rate=1e6, burst=10**6, max_concurrency=1000))
+        start = time.perf_counter()
+        master_dict = build_tree(client, 'images 3.0', mode, concurrency)
+        elapsed = time.perf_counter() - start
+        return elapsed, drive.request_count, len(master_dict['id_item'])
+
+
+if __name__ == '__main__':
+    results = {f'crawl x{c}': run('crawl', c) for c in (1, 4, 16, 32)}
+    results['flat'] = run('flat')
+    results['auto x16'] = run('auto', 16)
+    baseline = results['crawl x1'][0]
+    print(f'\n{"mode":>12} {"seconds":>9} {"requests":>9} {"items":>8} {"speedup":>8}')
+    for mode, (elapsed, requests, items) in results.items():
+        print(f'{mode:>12} {elapsed:>9.2f} {requests:>9} {items:>8} {baseline / elapsed:>7.1f}x')
@@ -0,0 +1,60 @@
+"""
+Duplicate detection on a synthetic tree: TreeStore.duplicates' (md5, size) index over every file,
+and near_duplicate_groups' multi-index buckets vs comparing every pair of difference hashes.
+Run from the repository root:  python -m benchmarks.bench_dedup
+"""
+import hashlib
+import random
+import time
+
+from dedup import MAX_DISTANCE, near_duplicate_groups
+from fake_drive import iter_synthetic_images
+from tree_store import TreeStore
+
+LOCATIONS = 50  # ~680k files
+REPEAT_EVERY = 50  # every 50th image is a re-upload of another
+HASHES = 100_000
+PAIRWISE = 5_000
+
+
+def build(locations: int):
+    store = TreeStore()
+    md5 = size = None
+    for number, item in enumerate(iter_synthetic_images(locations=locations)):
+        parent_id = item['parents'][0]
+        if 'size' in item and (md5 is None or number % REPEAT_EVERY):
+            md5, size = hashlib.md5(item['id'].encode()).hexdigest(), item['size']
+        store.add(item['id'], item['name'], None if parent_id == 'root' else parent_id, item['mimeType'],
+                  size if 'size' in item else None, md5 if 'size' in item else None)
+    return store
+
+
+def pairwise(hashes: dict, max_distance: int):
+    keys = list(hashes)
+    return sum(1 for i, first in enumerate(keys) for second in keys[i + 1:]
+               if (hashes[first] ^ hashes[second]).bit_count() <= max_distance)
+
+
+if __name__ == '__main__':
+    store = build(LOCATIONS)
+    start = time.perf_counter()
+    groups = store.duplicates()
+    print(f'{len(store)} nodes: {len(groups)} duplicate sets in {time.perf_counter() - start:.2f}s')
+
+    random.seed(0)
+    hashes = {}
+    for key in range(HASHES):
+        value = random.getrandbits(64)
+        if key % 10 == 0 and key:  # a near copy of the previous image
+            value = hashes[key - 1] ^ (1 << random.randrange(64)) ^ (1 << random.randrange(64))
+        hashes[key] = value
+    start = time.perf_counter()
+    groups = near_duplicate_groups(hashes, MAX_DISTANCE)
+    banded = time.perf_counter() - start
+    print(f'{HASHES} hashes: {len(groups)} near duplicate sets in {banded:.2f}s (multi-index)')
+
+    sample = {key: hashes[key] for key in range(PAIRWISE)}
+    start = time.perf_counter()
+    pairwise(sample, MAX_DISTANCE)
+    elapsed = time.perf_counter() - start
+    print(f'{PAIRWISE} hashes pairwise in {elapsed:.2f}s, ~{elapsed * (HASHES / PAIRWISE) ** 2:.0f}s for {HASHES}')
@@ -0,0 +1,76 @@
+"""
+Download benchmark against a local FakeDrive: the original io.BytesIO download one file at a time,
+then download_tree streaming to disk with 1 to 16 concurrent files. The client runs in a fresh
+interpreter so its peak RSS (VmHWM, Linux only) does not include the server's.
+Run from the repository root:  python -m benchmarks.bench_download
+"""
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from fake_drive import FakeDrive
+
+LATENCY = 0.05
+FILES = 16
+FILE_SIZE = 64 * 2**20
+FOLDER = 'downloads'
+
+BYTESIO = '''
+import io
+from googleapiclient.http import MediaIoBaseDownload
+DEST.mkdir()
+for index in store.children(store.roots[0]):
+    request = client.service.files().get_media(fileId=store.ids[index])
+    file_handle = io.BytesIO()
+    downloader = MediaIoBaseDownload(file_handle, request)
+    done = False
+    while done is False:
+        status, done = downloader.next_chunk()
+    with open(DEST / store.names[store.name[index]], 'wb') as f:
+        f.write(file_handle.getvalue())
+'''
+STREAM = '''
+from transfers import download_tree
+errors = download_tree(client, store, DEST, workers=WORKERS)
+assert not errors, errors
+'''
+HARNESS = '''
+import sys, time
+from pathlib import Path
+from drive_client import DriveClient
+from fake_drive import fake_service
+from sync_plan import drive_store
+URL, WORKERS, DEST = sys.argv[1], int(sys.argv[2]), Path(sys.argv[3])
+client = DriveClient(lambda: fake_service(URL))
+store = drive_store(client, {folder!r})
+start = time.perf_counter()
+{download}
+elapsed = time.perf_counter() - start
+peak_kb = next(line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM'))
+print(elapsed, int(peak_kb) / 1024)
+'''
+
+
+def items():
+    folder = {'id': 'folder', 'name': FOLDER, 'mimeType': 'application/vnd.google-apps.folder', 'parents': ['root']}
+    return [folder] + [{'id': f'file{i:04d}', 'name': f'file{i:04d}.bin', 'mimeType': 'application/octet-stream',
+                        'parents': ['folder'], 'size': str(FILE_SIZE)} for i in range(FILES)]
+
+
+def run(drive: FakeDrive, download: str, workers: int, destination: Path):
+    output = subprocess.run([sys.executable, '-c', HARNESS.format(folder=FOLDER, download=download),
+                             drive.url, str(workers), str(destination)], capture_output=True, text=True, check=True).stdout
+    elapsed, peak_mb = output.split()
+    return float(elapsed), float(peak_mb)
+
+
+if __name__ == '__main__':
+    total_mb = FILES * FILE_SIZE / 2**20
+    print(f'{FILES} files of {FILE_SIZE / 2**20:.0f} MB, {LATENCY}s latency per request')
+    print(f'{"mode":>14} {"seconds":>8} {"MB/s":>8} {"peak RSS MB":>12}')
+    with FakeDrive(items(), latency=LATENCY) as drive, tempfile.TemporaryDirectory() as folder:
+        modes = [('bytesio x1', BYTESIO, 1)] + [(f'stream x{w}', STREAM, w) for w in (1, 4, 16)]
+        for label, download, workers in modes:
+            elapsed, peak_mb = run(drive, download, workers, Path(folder, label.replace(' ', '_')))
+            print(f'{label:>14} {elapsed:>8.2f} {total_mb / elapsed:>8.1f} {peak_mb:>12.1f}')
@@ -0,0 +1,39 @@
+"""
+Three trees (a folder in My Drive and two shared drives) read one job after another, as separate
+crawls, vs one DrivePool crawling them in parallel under per-account schedulers that share a
+project scheduler, against a local FakeDrive with per-request latency.
+Run from the repository root:  python -m benchmarks.bench_drive_pool
+"""
+import time
+
+from drive_pool import CredentialPool, DrivePool, DriveSource
+from fake_drive import FakeDrive, synthetic_images_tree
+
+LATENCY = 0.05
+LOCATIONS = 3
+IMAGES = 20
+
+
+def sources(credentials: CredentialPool):
+    return [DriveSource(credentials.client('user'), 'images 3.0', 'my drive'),
+            DriveSource(credentials.client('service', 'team-a'), 'images 3.0', 'team-a'),
+            DriveSource(credentials.client('service', 'team-b'), 'images 3.0', 'team-b')]
+
+
+if __name__ == '__main__':
+    with FakeDrive(synthetic_images_tree(locations=LOCATIONS, images=IMAGES), latency=LATENCY) as drive:
+        for drive_id, prefix in (('team-a', 'ta'), ('team-b', 'tb')):
+            drive.add_shared_drive(drive_id, drive_id, synthetic_images_tree(locations=LOCATIONS, images=IMAGES, id_prefix=prefix))
+        credentials = CredentialPool()
+        credentials.add('user', drive.service)
+        credentials.add('service', drive.service)
+
+        start = time.perf_counter()
+        serial = sum(len(source.crawl()) for source in sources(credentials))
+        print(f'serial jobs: {serial} items in {time.perf_counter() - start:.2f}s')
+
+        pool = DrivePool(sources(credentials))
+        start = time.perf_counter()
+        store = pool.crawl()
+        print(f'DrivePool:   {len(store)} items in {time.perf_counter() - start:.2f}s, roots {[store.path(root) for root in store.roots]}')
+        print(f'per account: {credentials.stats()}')
@@ -0,0 +1,38 @@
+"""
+Path resolution against a local FakeDrive with per-request latency: every
+images 3.0/<type>/<location>/<speed> folder resolved without a cache, then with a cold and a warm
+IdCache (reopened from disk, as a new run would).
+Run from the repository root:  python -m benchmarks.bench_id_cache
+"""
+import tempfile
+import time
+from pathlib import Path
+
+from drive_client import DriveClient
+from fake_drive import FakeDrive, synthetic_images_tree
+from id_cache import IdCache
+
+LATENCY = 0.05
+LOCATIONS = 5
+SPEEDS = tuple(s * d for d in (-1, 1) for s in range(3, 11))
+
+
+def resolve_all(drive: FakeDrive, paths: list, id_cache: IdCache = None):
+    client = DriveClient(drive.service, id_cache=id_cache)
+    requests = drive.request_count
+    start = time.perf_counter()
+    ids = [client.resolve_path(path) for path in paths]
+    assert None not in ids
+    return time.perf_counter() - start, drive.request_count - requests
+
+
+if __name__ == '__main__':
+    items = synthetic_images_tree(locations=LOCATIONS, images=1)
+    paths = [f'images 3.0/{t}/loc{loc:03d}/{speed}' for t in ('currents', 'tides') for loc in range(LOCATIONS) for speed in SPEEDS]
+    print(f'{len(paths)} paths of 4 components, {LATENCY}s latency per request')
+    print(f'{"cache":>8} {"seconds":>8} {"requests":>9}')
+    with FakeDrive(items, latency=LATENCY) as drive, tempfile.TemporaryDirectory() as folder:
+        path = Path(folder, 'google_drive.ids.sqlite')
+        for label, id_cache in (('none', None), ('cold', IdCache(path)), ('warm', IdCache(path))):
+            elapsed, requests = resolve_all(drive, paths, id_cache)
+            print(f'{label:>8} {elapsed:>8.3f} {requests:>9}')
@@ -0,0 +1,54 @@
+"""
+The main.py report queries as recursive scans over the nested Dictionary tree vs TreeStore index lookups.
+Run from the repository root:  python -m benchmarks.bench_indexes
+"""
+import time
+
+from fake_drive import PNG_MIMETYPE, synthetic_images_tree
+from tree_builder import assemble_subtree
+from tree_store import TreeStore
+
+LOCATIONS = 20
+SPEEDS = [str(sign * speed) for sign in (-1, 1) for speed in range(3, 11)]
+
+
+def scan(node, match, path=''):
+    """ A full recursive pass like find_keys/recursive_get_key. """
+    found = []
+    for key, value in node.items():
+        if match(key, value):
+            found.append((f'{path}/{key}', value))
+        if isinstance(value, dict):
+            found.extend(scan(value, match, f'{path}/{key}'))
+    return found
+
+
+def timed(queries):
+    start = time.perf_counter()
+    counts = [len(query()) for query in queries]
+    return time.perf_counter() - start, counts
+
+
+if __name__ == '__main__':
+    items = synthetic_images_tree(locations=LOCATIONS)
+    root_id = items[0]['id']
+    tree = assemble_subtree(items, root_id)['images 3.0']
+    store = TreeStore.from_drive_items(items, root_id)
+    print(f'{len(items)} nodes')
+
+    scans = [lambda: scan(tree, lambda k, v: k == '.DS_Store')]
+    scans += [lambda s=s: scan(tree, lambda k, v: k == s) for s in SPEEDS]
+    scans += [lambda: scan(tree, lambda k, v: k == 'size'),
+              lambda: scan(tree, lambda k, v: isinstance(v, dict) and v.get('mimeType') == PNG_MIMETYPE),
+              lambda: scan(tree['currents'], lambda k, v: isinstance(v, dict) and v.get('mimeType') == PNG_MIMETYPE)]
+
+    lookups = [lambda: store.find('.DS_Store')]
+    lookups += [lambda s=s: store.find(s) for s in SPEEDS]
+    lookups += [lambda: store.sizes(PNG_MIMETYPE),
+                lambda: store.find_mimetype(PNG_MIMETYPE),
+                lambda: store.find_mimetype(PNG_MIMETYPE, under='images 3.0/currents')]
+
+    scan_seconds, scan_counts = timed(scans)
+    index_seconds, index_counts = timed(lookups)
+    assert scan_counts == index_counts, (scan_counts, index_counts)
+    print(f'{len(scans)} queries   scan {scan_seconds:.2f}s   index {index_seconds:.3f}s   {scan_seconds / index_seconds:.0f}x')
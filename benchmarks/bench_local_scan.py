@@ -0,0 +1,51 @@
+"""
+Local scan benchmark on a generated directory tree: bare os.walk, scan_tree with 1 to 32 listing
+threads, then MD5 checksums cold and with a warm hash cache. On a local SSD with a warm page cache
+the listing is cheap and tree building dominates; the threads pay off on cold disks and network mounts.
+Run from the repository root:  python -m benchmarks.bench_local_scan [file count, default 500000]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from local_scan import HashCache, scan_tree
+
+FILES_PER_FOLDER = 427
+
+
+def generate(root: Path, file_count: int):
+    speeds = [sign * speed for sign in (-1, 1) for speed in range(3, 11)]
+    written = 0
+    loc = 0
+    while written < file_count:
+        for speed in speeds:
+            folder = root / f'loc{loc:03d}' / str(speed)
+            folder.mkdir(parents=True)
+            for day in range(min(FILES_PER_FOLDER, file_count - written)):
+                (folder / f'loc{loc:03d} {speed} {day}.png').write_bytes(b'x' * (100 + day))
+                written += 1
+            if written >= file_count:
+                break
+        loc += 1
+
+
+def timed(label: str, function):
+    start = time.perf_counter()
+    result = function()
+    print(f'{label:>28} {time.perf_counter() - start:>8.2f}s')
+    return result
+
+
+if __name__ == '__main__':
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    with tempfile.TemporaryDirectory() as folder:
+        root = Path(folder, 'find_test')
+        timed(f'generate {file_count} files', lambda: generate(root, file_count))
+        timed('os.walk + stat (serial)', lambda: sum(len([os.stat(os.path.join(d, f)) for f in fs]) for d, _, fs in os.walk(root)))
+        for workers in (1, 4, 16, 32):
+            timed(f'scan_tree x{workers}', lambda: scan_tree(root, workers=workers))
+        cache = HashCache(Path(folder, 'files.hashes.json'))
+        timed('scan_tree + md5 (cold)', lambda: scan_tree(root, checksums=True, hash_cache=cache))
+        timed('scan_tree + md5 (warm)', lambda: scan_tree(root, checksums=True, hash_cache=HashCache(cache.path)))
@@ -0,0 +1,42 @@
+"""
+What the instrumentation costs: Metrics.count and observe on one thread and on eight at once,
+and RequestScheduler.call of a function that does nothing, which records a latency, a queue
+wait, a call count and two gauges. Drive calls take tens of milliseconds, so a few
+microseconds per call is noise.
+Run from the repository root:  python -m benchmarks.bench_metrics
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Metrics
+from scheduler import RequestScheduler
+
+CALLS = 200_000
+THREADS = 8
+
+
+def record(metrics: Metrics, calls: int):
+    for _ in range(calls):
+        metrics.count('api_calls', method='drive.files.list')
+        metrics.observe('api_latency_seconds', 0.05, method='drive.files.list')
+
+
+def per_call(function, threads: int = 1):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(function, CALLS // threads) for _ in range(threads)]:
+            future.result()
+    return (time.perf_counter() - start) / CALLS * 1e6
+
+
+def schedule(scheduler: RequestScheduler, calls: int):
+    for _ in range(calls):
+        scheduler.call(lambda: None, method='noop')
+
+
+if __name__ == '__main__':
+    for threads in (1, THREADS):
+        metrics = Metrics()
+        print(f'count + observe, {threads} thread(s): {per_call(lambda calls: record(metrics, calls), threads):.2f} us')
+        scheduler = RequestScheduler(rate=1e9, burst=10**9, metrics=Metrics())
+        print(f'scheduler.call, {threads} thread(s): {per_call(lambda calls: schedule(scheduler, calls), threads):.2f} us')
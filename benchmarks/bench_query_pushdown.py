@@ -0,0 +1,54 @@
+"""
+Maintenance queries answered by crawling the whole 'images 3.0' tree and filtering it in memory
+vs pushed down to Drive with find_matching (one files.list query, then only the missing
+ancestors of what it found), against a local FakeDrive with per-request latency. Drive cannot
+filter on size, so 'PNGs over MIN_SIZE bytes' still lists every PNG, one page after another;
+with a modifiedTime bound as well only the recent ones are listed. The .DS_Store strays are
+scattered through a few speed folders.
+Run from the repository root:  python -m benchmarks.bench_query_pushdown
+"""
+import time
+
+from drive_client import DriveClient
+from drive_query import TreeQuery, find_matching
+from fake_drive import PNG_MIMETYPE, FakeDrive, synthetic_images_tree
+from scheduler import RequestScheduler
+from tree_builder import crawl_folder
+from tree_store import TreeStore
+
+LATENCY = 0.02
+LOCATIONS = 4
+STRAYS = 12  # .DS_Store files, one per speed folder at this stride
+STRIDE = 10
+MIN_SIZE = 59800
+SINCE = '2025-01-01T00:00:00Z'
+ROOT = 'images 3.0'
+
+
+def timed(drive: FakeDrive, function):
+    requests = drive.request_count
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start, drive.request_count - requests
+
+
+if __name__ == '__main__':
+    items = synthetic_images_tree(ROOT, locations=LOCATIONS)
+    speeds = [item for item in items if item['name'].lstrip('-').isdigit()]
+    for number, speed in enumerate(speeds[::STRIDE][:STRAYS]):
+        items.append({'id': f'ds{number:03d}', 'name': '.DS_Store', 'mimeType': 'application/octet-stream',
+                      'parents': [speed['id']], 'size': '6148'})
+    queries = {'.DS_Store sweep': TreeQuery(name='.DS_Store'),
+               f'PNGs over {MIN_SIZE} bytes': TreeQuery(mimetype=PNG_MIMETYPE, min_size=MIN_SIZE),
+               '... modified in 2025': TreeQuery(mimetype=PNG_MIMETYPE, min_size=MIN_SIZE, modified_after=SINCE)}
+
+    with FakeDrive(items, latency=LATENCY) as drive:
+        client = DriveClient(drive.service, RequestScheduler(rate=1e6, burst=10**6))
+        print(f'{len(items)} items')
+        print(f'{"query":<26} {"method":<12} {"found":>6} {"requests":>9} {"seconds":>8}')
+        for label, query in queries.items():
+            if query.modified_after is None:  # a crawled tree has no modifiedTime to filter on
+                found, seconds, requests = timed(drive, lambda: query.select(TreeStore.from_master_dict(crawl_folder(client, ROOT, 16)), ROOT))
+                print(f'{label:<26} {"crawl":<12} {len(found):>6} {requests:>9} {seconds:>8.2f}')
+            (_, found), seconds, requests = timed(drive, lambda: find_matching(client, query, ROOT))
+            print(f'{label:<26} {"pushdown":<12} {len(found):>6} {requests:>9} {seconds:>8.2f}')
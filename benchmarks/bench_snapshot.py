@@ -0,0 +1,57 @@
+"""
+Startup benchmark: load the cached tree and answer one query, JSON vs memory-mapped snapshot.
+Each load runs in a fresh interpreter so time and peak RSS (VmHWM, Linux only) are not shared.
+Run from the repository root:  python -m benchmarks.bench_snapshot
+"""
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from fake_drive import synthetic_images_tree
+from tree_builder import assemble_subtree
+from tree_snapshot import write_snapshot
+from tree_store import TreeStore
+
+LOCATIONS = 73  # ~1M nodes
+QUERY = 'loc000 -3 24 1 1.png'
+
+JSON_LOAD = '''
+from tt_dictionary.dictionary import Dictionary
+tree = Dictionary(json_source=PATH)
+result = tree['name_id'].get(QUERY)
+'''
+SNAPSHOT_LOAD = '''
+from tree_snapshot import open_snapshot
+tree = open_snapshot(PATH)
+result = [tree.path(index) for index in tree.find(QUERY)]
+'''
+HARNESS = '''
+import sys, time
+PATH, QUERY = sys.argv[1], sys.argv[2]
+start = time.perf_counter()
+{load}
+elapsed = time.perf_counter() - start
+peak_kb = next(line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM'))
+print(elapsed, int(peak_kb) / 1024, result)
+'''
+
+
+def run(load: str, path: Path):
+    output = subprocess.run([sys.executable, '-c', HARNESS.format(load=load), str(path), QUERY],
+                            capture_output=True, text=True, check=True).stdout
+    elapsed, peak_mb, _ = output.split(' ', 2)
+    return float(elapsed), float(peak_mb)
+
+
+if __name__ == '__main__':
+    items = synthetic_images_tree(locations=LOCATIONS)
+    with tempfile.TemporaryDirectory() as folder:
+        json_path, snapshot_path = Path(folder, 'google_drive.json'), Path(folder, 'google_drive.snapshot')
+        assemble_subtree(items, items[0]['id']).write(json_path)
+        write_snapshot(TreeStore.from_drive_items(items, items[0]['id']), snapshot_path)
+        print(f'{len(items)} nodes')
+        print(f'{"format":>10} {"file MB":>8} {"load+query s":>13} {"peak RSS MB":>12}')
+        for label, load, path in (('json', JSON_LOAD, json_path), ('snapshot', SNAPSHOT_LOAD, snapshot_path)):
+            elapsed, peak_mb = run(load, path)
+            print(f'{label:>10} {path.stat().st_size / 2**20:>8.1f} {elapsed:>13.3f} {peak_mb:>12.1f}')
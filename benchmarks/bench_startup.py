@@ -0,0 +1,74 @@
+"""
+Startup benchmark: the time from a fresh interpreter to answering one query from the cached tree.
+'eager' imports the auth and client libraries and builds the Drive service before starting, as
+authenticate_google_drive and build_drive_service did. 'lazy' creates a DriveClient.from_token_file
+that never reaches the API. 'lazy + service' then builds the service a first API call would need,
+from the cached discovery document. No request is sent and token.json is never read.
+Run from the repository root:  python -m benchmarks.bench_startup
+"""
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from fake_drive import synthetic_images_tree
+from tree_snapshot import write_snapshot
+from tree_store import TreeStore
+
+LOCATIONS = 2
+QUERY = 'loc000 -3 24 1 1.png'
+RUNS = 5
+
+EAGER = '''
+from google.auth.credentials import AnonymousCredentials
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+service = build('drive', 'v3', credentials=AnonymousCredentials())
+from tree_snapshot import open_snapshot
+tree = open_snapshot(PATH)
+result = [tree.path(index) for index in tree.find(QUERY)]
+'''
+LAZY = '''
+from drive_client import DriveClient
+client = DriveClient.from_token_file(Path(PATH).with_name('token.json'))
+from tree_snapshot import open_snapshot
+tree = open_snapshot(PATH)
+result = [tree.path(index) for index in tree.find(QUERY)]
+'''
+LAZY_SERVICE = LAZY + '''
+from google.auth.credentials import AnonymousCredentials
+client = DriveClient.from_credentials(AnonymousCredentials())
+service = client.service
+'''
+HARNESS = '''
+import time
+start = time.perf_counter()
+import sys
+from pathlib import Path
+PATH, QUERY = sys.argv[1], sys.argv[2]
+{load}
+elapsed = time.perf_counter() - start
+assert result
+print(elapsed, len(sys.modules))
+'''
+
+
+def run(load: str, path: Path):
+    output = subprocess.run([sys.executable, '-c', HARNESS.format(load=load), str(path), QUERY],
+                            capture_output=True, text=True, check=True).stdout
+    elapsed, modules = output.split()
+    return float(elapsed), int(modules)
+
+
+if __name__ == '__main__':
+    items = synthetic_images_tree(locations=LOCATIONS)
+    with tempfile.TemporaryDirectory() as folder:
+        snapshot_path = Path(folder, 'google_drive.snapshot')
+        write_snapshot(TreeStore.from_drive_items(items, items[0]['id']), snapshot_path)
+        print(f'{len(items)} nodes, best of {RUNS} fresh interpreters')
+        print(f'{"startup":>15} {"ms":>8} {"modules":>8}')
+        for label, load in (('eager', EAGER), ('lazy', LAZY), ('lazy + service', LAZY_SERVICE)):
+            elapsed, modules = min(run(load, snapshot_path) for _ in range(RUNS))
+            print(f'{label:>15} {elapsed * 1000:>8.1f} {modules:>8}')
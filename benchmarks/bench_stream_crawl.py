@@ -0,0 +1,83 @@
+"""
+Crawl benchmark against a local FakeDrive: crawl_folder holding the tree in Dictionaries and
+writing google_drive.json at the end, vs stream_crawl writing listed folders to a crawl log
+('log'), and crawl_to_snapshot, which then turns the log into a snapshot ('snapshot').
+Each crawl runs in a fresh interpreter so its peak RSS (VmHWM, Linux only) does not include the
+server's. Then a streamed crawl is killed partway and run again, to show how many list calls
+the resume saves.
+Run from the repository root:  python -m benchmarks.bench_stream_crawl
+"""
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from crawl_log import CrawlLog, log_path
+from fake_drive import FakeDrive, synthetic_images_tree
+
+LATENCY = 0.002
+LOCATIONS = 10
+IMAGES = 1000
+KILL_AFTER = 2.0  # seconds
+
+DICTIONARY = '''
+from tree_builder import crawl_folder
+crawl_folder(client, 'images 3.0', 16).write(OUT.with_suffix('.json'))
+'''
+LOG = '''
+from crawl_log import stream_crawl
+stream_crawl(client, 'images 3.0', OUT.with_suffix('.crawl'), 16)
+'''
+STREAM = '''
+from crawl_log import crawl_to_snapshot
+crawl_to_snapshot(client, 'images 3.0', OUT.with_suffix('.snapshot'), 16)
+'''
+HARNESS = '''
+import sys, time
+from pathlib import Path
+from drive_client import DriveClient
+from fake_drive import fake_service
+from scheduler import RequestScheduler
+URL, OUT = sys.argv[1], Path(sys.argv[2])
+client = DriveClient(lambda: fake_service(URL), RequestScheduler(rate=1e6, burst=10**6, max_concurrency=1000))
+start = time.perf_counter()
+{crawl}
+elapsed = time.perf_counter() - start
+peak_kb = next(line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM'))
+print(elapsed, int(peak_kb) / 1024)
+'''
+
+
+def command(drive: FakeDrive, crawl: str, out: Path):
+    return [sys.executable, '-c', HARNESS.format(crawl=crawl), drive.url, str(out)]
+
+
+def run(drive: FakeDrive, crawl: str, out: Path):
+    output = subprocess.run(command(drive, crawl, out), capture_output=True, text=True, check=True).stdout
+    elapsed, peak_mb = output.split()[-2:]
+    return float(elapsed), float(peak_mb)
+
+
+if __name__ == '__main__':
+    items = synthetic_images_tree(locations=LOCATIONS, images=IMAGES)
+    print(f'{len(items)} items, {LATENCY}s latency per request')
+    print(f'{"crawl":>12} {"seconds":>8} {"list calls":>11} {"peak RSS MB":>12}')
+    with FakeDrive(items, latency=LATENCY) as drive, tempfile.TemporaryDirectory() as folder:
+        for label, crawl in (('dictionary', DICTIONARY), ('log', LOG), ('snapshot', STREAM)):
+            requests = drive.request_count
+            elapsed, peak_mb = run(drive, crawl, Path(folder, label))
+            print(f'{label:>12} {elapsed:>8.2f} {drive.request_count - requests:>11} {peak_mb:>12.1f}')
+
+        out = Path(folder, 'resumed')
+        requests = drive.request_count
+        process = subprocess.Popen(command(drive, STREAM, out), stdout=subprocess.DEVNULL)
+        time.sleep(KILL_AFTER)
+        process.kill()
+        process.wait()
+        killed = drive.request_count - requests
+        log = CrawlLog(log_path(out.with_suffix('.snapshot')))
+        print(f'killed after {KILL_AFTER}s: {killed} calls made, {log.folders} folders logged, {len(log.frontier)} in the frontier')
+        requests = drive.request_count
+        elapsed, _ = run(drive, STREAM, out)
+        print(f'{"resumed":>12} {elapsed:>8.2f} {drive.request_count - requests:>11}')
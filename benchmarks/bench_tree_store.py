@@ -0,0 +1,46 @@
+"""
+Memory and lookup benchmark: nested Dictionary tree vs the columnar TreeStore on a ~1M node synthetic tree.
+Run from the repository root:  python -m benchmarks.bench_tree_store
+"""
+import gc
+import time
+import tracemalloc
+
+from fake_drive import synthetic_images_tree
+from tree_builder import assemble_subtree
+from tree_store import TreeStore
+
+LOCATIONS = 73  # 2 types x 73 locations x 16 speeds x 428 items ~ 1M nodes
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    tree = build()
+    elapsed = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return tree, retained, elapsed
+
+
+if __name__ == '__main__':
+    items = synthetic_images_tree(locations=LOCATIONS)
+    root_id = items[0]['id']
+    print(f'{len(items)} nodes')
+
+    master_dict, dict_bytes, dict_seconds = measure(lambda: assemble_subtree(items, root_id))
+    del master_dict
+    store, store_bytes, store_seconds = measure(lambda: TreeStore.from_drive_items(items, root_id))
+
+    print(f'{"":>12} {"MB":>8} {"bytes/node":>11} {"build s":>8}')
+    print(f'{"Dictionary":>12} {dict_bytes / 2**20:>8.1f} {dict_bytes / len(items):>11.0f} {dict_seconds:>8.2f}')
+    print(f'{"TreeStore":>12} {store_bytes / 2**20:>8.1f} {store_bytes / len(items):>11.0f} {store_seconds:>8.2f}')
+    print(f'saved {100 * (1 - store_bytes / dict_bytes):.0f}%')
+
+    names = [item['name'] for item in items[::1000]]
+    start = time.perf_counter()
+    for name in names:
+        for index in store.find(name):
+            store.path(index)
+    print(f'{len(names)} name lookups + path walks: {1e6 * (time.perf_counter() - start) / len(names):.1f} us each')
@@ -0,0 +1,81 @@
+"""
+google_urls.csv export from a snapshot at two tree sizes: main.py's pipeline (every PNG path
+split, a column -> date -> URL dict rebuilt sorted, a DataFrame and a lambda per date) vs
+write_url_csv's pivot into a preallocated grid, written a row at a time. Each export runs in a
+fresh interpreter so its peak RSS (VmHWM, Linux only) is its own; that includes the pages of
+the memory-mapped snapshot it reads.
+Run from the repository root:  python -m benchmarks.bench_url_export
+"""
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from fake_drive import iter_synthetic_images
+from tree_snapshot import write_snapshot
+from tree_store import TreeStore
+
+SIZES = (20, 80)  # locations, 16 speeds x 427 images each per type
+TYPE = 'currents'
+
+NESTED = '''
+from pandas import DataFrame
+columns = {}
+for index in tree.find_mimetype('image/png'):
+    fields = tree.path(index).split('/')
+    if fields[1] != TYPE:
+        continue
+    ymd = fields[4][:-4].split()[2:]
+    date = f'{ymd[0]}/{ymd[1]}/{ymd[2]}'
+    columns.setdefault(f'{fields[2]} {fields[3]}', {})[date] = f'{CSV_PREFIX}{tree.ids[index]}{CSV_SUFFIX}'
+columns_list = sorted(columns, key=lambda x: (x.split()[0], int(x.split()[1])))
+columns = {key: columns[key] for key in columns_list}
+for k, v in columns.items():
+    columns[k] = {key: v[key] for key in sorted(v)}
+image_frame = DataFrame(columns)
+image_frame.insert(0, 'date', value=None)
+image_frame['date'] = image_frame.index
+image_frame['date'] = image_frame['date'].apply(lambda x: f"{x.split('/')[1]}/{x.split('/')[2]}/20{x.split('/')[0]}")
+image_frame.reset_index(drop=True, inplace=True)
+image_frame.to_csv(OUT, index=False)
+'''
+PIVOT = '''
+from csv_export import write_url_csv
+write_url_csv(tree, OUT, type_name=TYPE)
+'''
+HARNESS = '''
+import sys, time
+from csv_export import CSV_PREFIX, CSV_SUFFIX
+from tree_snapshot import open_snapshot
+PATH, OUT, TYPE = sys.argv[1], sys.argv[2], sys.argv[3]
+tree = open_snapshot(PATH)
+start = time.perf_counter()
+{export}
+elapsed = time.perf_counter() - start
+peak_kb = next(line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM'))
+print(elapsed, int(peak_kb) / 1024)
+'''
+
+
+def run(export: str, path: Path, out: Path):
+    output = subprocess.run([sys.executable, '-c', HARNESS.format(export=export), str(path), str(out), TYPE],
+                            capture_output=True, text=True, check=True).stdout
+    elapsed, peak_mb = output.split()
+    return float(elapsed), float(peak_mb)
+
+
+if __name__ == '__main__':
+    print(f'{"images":>8} {"snapshot MB":>12} {"export":>8} {"seconds":>8} {"peak RSS MB":>12}')
+    with tempfile.TemporaryDirectory() as folder:
+        for locations in SIZES:
+            store = TreeStore()
+            for item in iter_synthetic_images(locations=locations):
+                parent_id = item['parents'][0]
+                store.add(item['id'], item['name'], None if parent_id == 'root' else parent_id, item['mimeType'], item.get('size'))
+            path = Path(folder, f'{locations}.snapshot')
+            write_snapshot(store, path)
+            images = locations * 16 * 427
+            del store
+            for label, export in (('nested', NESTED), ('pivot', PIVOT)):
+                elapsed, peak_mb = run(export, path, Path(folder, f'{label}.csv'))
+                print(f'{images:>8} {path.stat().st_size / 2**20:>12.1f} {label:>8} {elapsed:>8.2f} {peak_mb:>12.1f}')
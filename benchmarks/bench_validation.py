@@ -0,0 +1,59 @@
+"""
+Images validation on a synthetic multi-million-row tree: the per-node loops main.py ran
+(a path and split('/') per PNG, counts in a dict, z-scores from per-type lists) vs
+validation.validate's one export into array columns and grouped checks.
+Run from the repository root:  python -m benchmarks.bench_validation
+"""
+import time
+from statistics import mean, pstdev
+
+from fake_drive import iter_synthetic_images
+from tree_store import TreeStore
+from validation import IMAGES_PER_FOLDER, PNG_MIMETYPE, Z_LIMIT, validate
+
+LOCATIONS = 220  # 2 types x 220 locations x 16 speeds x 427 images, ~3M PNGs
+SIZE_LIMIT = 59000
+
+
+def build(locations: int):
+    store = TreeStore()
+    for item in iter_synthetic_images(locations=locations):
+        parent_id = item['parents'][0]
+        store.add(item['id'], item['name'], None if parent_id == 'root' else parent_id, item['mimeType'], item.get('size'))
+    return store
+
+
+def loops(store: TreeStore):
+    """ main.py's checks, one Python loop each over per-node paths. """
+    counts = {}
+    for index in store.find_mimetype(PNG_MIMETYPE):
+        folder = store.path(index).rsplit('/', 1)[0]
+        counts[folder] = counts.get(folder, 0) + 1
+    wrong = [(folder, count) for folder, count in counts.items() if count != IMAGES_PER_FOLDER]
+
+    sizes = {}
+    for index, size in store.sizes(PNG_MIMETYPE):
+        sizes.setdefault(store.path(index).split('/')[1], []).append((index, size))
+    oversized = [(store.path(index), size) for type_sizes in sizes.values() for index, size in type_sizes if size > SIZE_LIMIT]
+    outliers = []
+    for type_sizes in sizes.values():
+        values = [size for _, size in type_sizes]
+        average, deviation = mean(values), pstdev(values)
+        outliers.extend((store.path(index), size) for index, size in type_sizes if abs((size - average) / deviation) > Z_LIMIT)
+    return wrong, oversized, outliers
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    store = build(LOCATIONS)
+    print(f'{len(store)} nodes built in {time.perf_counter() - start:.1f}s')
+    limits = {'currents': {'size': SIZE_LIMIT}, 'tides': {'size': SIZE_LIMIT}}
+    print(f'{"checks":>10} {"seconds":>8} {"wrong counts":>13} {"oversized":>10} {"outliers":>9}')
+
+    start = time.perf_counter()
+    wrong, oversized, outliers = loops(store)
+    print(f'{"loops":>10} {time.perf_counter() - start:>8.2f} {len(wrong):>13} {len(oversized):>10} {len(outliers):>9}')
+
+    start = time.perf_counter()
+    report = validate(store, limits=limits)
+    print(f'{"validate":>10} {time.perf_counter() - start:>8.2f} {len(report.counts):>13} {len(report.oversized):>10} {len(report.outliers):>9}')
@@ -0,0 +1,208 @@
+"""
+End-to-end benchmarks against a local FakeDrive seeded with a synthetic 'images 3.0' tree:
+crawls (level by level, streamed, and under injected errors, 429s and a quota), queries, download,
+upload, bulk delete and loading a snapshot, each timed with the requests it sent. Results are
+saved to benchmarks/results/<time>.json with the commit and Python version, and compared with
+the latest earlier run at the same scale (or --baseline). Anything more than --tolerance slower
+is reported as a regression, and the exit status is 1.
+Run from the repository root:  python -m benchmarks.suite [--scale quick|full] [--no-save]
+
+The fake server shares the GIL with the client, and latency is simulated, so compare results
+from the same machine only.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from crawl_log import stream_crawl
+from drive_client import DriveClient
+from fake_drive import PNG_MIMETYPE, FakeDrive, synthetic_images_tree
+from scheduler import RequestScheduler
+from transfers import download_file, download_tree, upload_files
+from tree_builder import crawl_folder
+from tree_snapshot import write_snapshot
+from tree_store import TreeStore
+
+ROOT = 'images 3.0'
+SCALES = {'quick': {'locations': 1, 'images': 40}, 'full': {'locations': 4, 'images': 427}}
+LATENCY = 0.02
+JITTER = 0.01
+SEED = 0
+ERROR_CALLS = 5  # the faults crawl: about this many calls fail with a server error, at any scale ...
+THROTTLED = 5  # ... the first this many are turned away with a 429 and a Retry-After ...
+RETRY_AFTER = 0.1  # ... of this many seconds ...
+QUOTA = 100  # ... and only this many calls a second are let through, the client is paced to match
+LOOKUPS = 200
+UPLOADS = 50
+UPLOAD_SIZE = 64 * 2**10
+LARGE_UPLOAD_SIZE = 8 * 2**20  # over SIMPLE_UPLOAD_LIMIT, so it goes up resumably
+DELETES = 500
+RESULTS = Path(__file__).parent / 'results'
+TOLERANCE = 0.25
+NOISE = 0.25  # seconds: smaller slowdowns are run to run noise with simulated latency
+SNAPSHOT_LOAD = '''
+import sys, time
+from tree_snapshot import open_snapshot
+start = time.perf_counter()
+tree = open_snapshot(sys.argv[1])
+found = [tree.path(index) for index in tree.find(sys.argv[2])]
+elapsed = time.perf_counter() - start
+peak_kb = next(line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM'))
+print(elapsed, int(peak_kb) / 1024, len(found))
+'''
+
+
+def unthrottled():
+    return RequestScheduler(rate=1e6, burst=10**6)
+
+
+def measure(drive: FakeDrive, client: DriveClient, function):
+    """
+    Runs function(), counting the requests that reached drive and the calls client retried.
+
+    Returns:
+        tuple: (what function returned, {'seconds', 'requests', 'retries'})
+    """
+    requests, retries = drive.request_count, client.scheduler.counters['retries']
+    start = time.perf_counter()
+    result = function()
+    return result, {'seconds': time.perf_counter() - start, 'requests': drive.request_count - requests,
+                    'retries': client.scheduler.counters['retries'] - retries}
+
+
+def run_suite(scale: str):
+    """
+    Returns:
+        dict: benchmark name -> {'seconds', 'requests', 'retries', ...}
+    """
+    results = {}
+    items = synthetic_images_tree(ROOT, **SCALES[scale])
+    with FakeDrive(items, latency=LATENCY, jitter=JITTER, seed=SEED) as drive, tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        client = DriveClient(drive.service, unthrottled())
+
+        master_dict, results['crawl'] = measure(drive, client, lambda: crawl_folder(client, ROOT, 16))
+        store = TreeStore.from_master_dict(master_dict)
+        results['crawl']['items'] = len(store)
+        _, results['stream crawl'] = measure(drive, client, lambda: stream_crawl(client, ROOT, folder / 'x.crawl', 16))
+
+        drive.error_rate = ERROR_CALLS / results['crawl']['requests']  # the same faults per crawl at every scale
+        drive.quota, drive.quota_window = QUOTA, 1.0
+        drive.fail_next, drive.retry_after = THROTTLED, RETRY_AFTER
+        faulty = DriveClient(drive.service, RequestScheduler(rate=QUOTA, burst=QUOTA // 4, base_delay=0.1))
+        _, results['crawl with faults'] = measure(drive, faulty, lambda: crawl_folder(faulty, ROOT, 16))
+        results['crawl with faults']['rejected'] = drive.rejected
+        drive.error_rate, drive.quota, drive.retry_after = 0.0, None, None
+
+        pngs = store.find_mimetype(PNG_MIMETYPE)
+        found, results['query all images'] = measure(
+            drive, client, lambda: client.list(f"mimeType = '{PNG_MIMETYPE}' and trashed=false", 'id'))
+        results['query all images']['items'] = len(found)
+        sample = pngs[::max(len(pngs) // LOOKUPS, 1)][:LOOKUPS]
+        _, results['query by name'] = measure(drive, client, lambda: [
+            client.find_child(store.ids[store.parent[index]], store.names[store.name[index]]) for index in sample])
+
+        speed_folder = store.path(store.parent[pngs[0]])
+        errors, results['download folder'] = measure(drive, client, lambda: download_tree(client, store, folder / 'down', speed_folder))
+        downloaded = sum(store.size[index] for index in store.children(store.resolve(speed_folder)))
+        results['download folder'].update(mb=downloaded / 2**20, mb_per_second=downloaded / 2**20 / results['download folder']['seconds'])
+        large_id = drive.create_file({}, {'name': 'large.bin', 'parents': [store.ids[store.roots[0]]]}, bytes(LARGE_UPLOAD_SIZE))[1]['id']
+        _, results['download large file'] = measure(drive, client, lambda: download_file(client, large_id, folder / 'large.bin'))
+        results['download large file']['mb_per_second'] = LARGE_UPLOAD_SIZE / 2**20 / results['download large file']['seconds']
+
+        uploads = []
+        for number in range(UPLOADS):
+            path = folder / f'upload{number:03d}.png'
+            path.write_bytes(bytes([number]) * UPLOAD_SIZE)
+            uploads.append((path, store.ids[store.roots[0]]))
+        (_, errors), results['upload small files'] = measure(drive, client, lambda: upload_files(client, uploads, store))
+        results['upload small files']['mb_per_second'] = UPLOADS * UPLOAD_SIZE / 2**20 / results['upload small files']['seconds']
+        large = folder / 'upload.bin'
+        large.write_bytes(bytes(LARGE_UPLOAD_SIZE))
+        _, results['upload large file'] = measure(drive, client, lambda: upload_files(client, [(large, store.ids[store.roots[0]])]))
+        results['upload large file']['mb_per_second'] = LARGE_UPLOAD_SIZE / 2**20 / results['upload large file']['seconds']
+
+        doomed = [store.ids[index] for index in pngs[-DELETES:]]
+        _, results['bulk delete'] = measure(drive, client, lambda: client.delete_many(doomed))
+        results['bulk delete']['items'] = len(doomed)
+
+        snapshot = folder / 'google_drive.snapshot'
+        write_snapshot(store, snapshot)
+        output = subprocess.run([sys.executable, '-c', SNAPSHOT_LOAD, str(snapshot), store.names[store.name[pngs[0]]]],
+                                capture_output=True, text=True, check=True).stdout
+        elapsed, peak_mb, _ = output.split()
+        results['snapshot load'] = {'seconds': float(elapsed), 'requests': 0, 'retries': 0, 'peak_rss_mb': float(peak_mb),
+                                    'mb': snapshot.stat().st_size / 2**20}
+    return results
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latest_run(scale: str, folder: Path = RESULTS):
+    """ The most recent saved run at scale, or None. """
+    for path in sorted(folder.glob('*.json'), reverse=True):
+        run = json.loads(path.read_text())
+        if run.get('scale') == scale:
+            return run
+    return None
+
+
+def compare(results: dict, baseline: dict = None, tolerance: float = TOLERANCE):
+    """
+    Prints results next to baseline's.
+
+    Returns:
+        list: the names of benchmarks more than tolerance (and NOISE seconds) slower than baseline.
+    """
+    before = baseline['results'] if baseline else {}
+    if baseline:
+        print(f'compared with {baseline["time"]} (commit {baseline["commit"]})')
+    print(f'{"benchmark":<22} {"seconds":>8} {"requests":>9} {"retries":>8} {"before":>8} {"change":>8}  other')
+    regressions = []
+    for name, result in results.items():
+        line = f'{name:<22} {result["seconds"]:>8.4f} {result["requests"]:>9} {result["retries"]:>8}'
+        if name in before:
+            seconds = before[name]['seconds']
+            change = result['seconds'] / seconds - 1 if seconds else 0.0
+            line += f' {seconds:>8.4f} {change:>+8.0%}'
+            if change > tolerance and result['seconds'] - seconds > NOISE:
+                regressions.append(name)
+                line += ' REGRESSION'
+        else:
+            line += f' {"":>8} {"":>8}'
+        others = {key: value for key, value in result.items() if key not in ('seconds', 'requests', 'retries')}
+        print(line + '  ' + ' '.join(f'{key}={value:.1f}' if isinstance(value, float) else f'{key}={value}' for key, value in others.items()))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', choices=SCALES, default='full')
+    parser.add_argument('--baseline', type=Path, help='a saved run to compare with, the latest at this scale by default')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='the slowdown reported as a regression, 0.25 is 25%%')
+    parser.add_argument('--no-save', action='store_true', help='do not save this run')
+    args = parser.parse_args()
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else latest_run(args.scale)
+    run = {'time': datetime.now().isoformat(timespec='seconds'), 'commit': commit(), 'python': platform.python_version(),
+           'machine': platform.machine(), 'scale': args.scale, 'results': run_suite(args.scale)}
+    regressions = compare(run['results'], baseline, args.tolerance)
+    if not args.no_save:
+        RESULTS.mkdir(exist_ok=True)
+        path = RESULTS / f'{run["time"].replace(":", "")}.json'
+        path.write_text(json.dumps(run, indent=2))
+        print(f'saved {path}')
+    if regressions:
+        print(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+        sys.exit(1)
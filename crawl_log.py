@@ -0,0 +1,246 @@
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from googleapiclient.errors import HttpError
+
+from scheduler import is_retryable
+from tree_snapshot import write_snapshot
+from tree_store import FOLDER_MIMETYPE, TreeStore
+
+LOG_SUFFIX = '.crawl'
+SYNC_EVERY = 100  # folder records between fsyncs
+
+
+def log_path(snapshot_path):
+    """ The crawl log is kept next to the snapshot it turns into, google_drive.snapshot -> google_drive.crawl """
+    return Path(snapshot_path).with_suffix(LOG_SUFFIX)
+
+
+class CrawlLog:
+    """
+    An append-only JSON Lines record of a crawl. The first line is the start folder, every line
+    after it one listed folder with the children it had:
+        {"root": {"id": ..., "name": ..., ...}}
+        {"folder": "<id>", "children": [{"id": ..., "name": ..., "mimeType": ..., "size": ...}, ...]}
+    A folder gets its line when it has been listed, so the frontier (the folders still to list) is
+    every folder that appears as a child but not yet as a folder, and reopening the log of an
+    interrupted crawl gives back the frontier it stopped at. A last line cut short by a crash is
+    dropped. Only folder ids are held in memory, not the items.
+
+    Args:
+        path: the log file, e.g. log_path('google_drive.snapshot').
+        sync_every: records between fsyncs; lines are flushed as they are written, so only a
+            machine crash can lose the records since the last fsync.
+    """
+
+    def __init__(self, path, sync_every: int = SYNC_EVERY):
+        self.path = Path(path)
+        self.sync_every = sync_every
+        self.root = None
+        self.folders = 0
+        self._seen = set()  # folder ids, so a folder with two parents is listed once
+        self._pending = {}  # the frontier, in discovery order
+        self._unsynced = 0
+        self._file = None
+        if self.path.exists():
+            self._replay()
+
+    @property
+    def frontier(self):
+        return list(self._pending)
+
+    @property
+    def finished(self):
+        return self.root is not None and not self._pending
+
+    def _records(self):
+        """ (record, end offset) for each complete line. """
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    return
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    return
+                offset += len(line)
+                yield record, offset
+
+    def _replay(self):
+        good = 0
+        for record, good in self._records():
+            if 'root' in record:
+                self._start(record['root'])
+            else:
+                self._listed(record['folder'], record['children'])
+        if good < self.path.stat().st_size:
+            print(f'{self.path}: dropping an incomplete last record')
+            with open(self.path, 'r+b') as f:
+                f.truncate(good)
+
+    def _start(self, root: dict):
+        self.root = root
+        self._seen.add(root['id'])
+        self._pending[root['id']] = None
+
+    def _listed(self, folder_id: str, children: list):
+        self._pending.pop(folder_id, None)
+        self.folders += 1
+        for child in children:
+            if child.get('mimeType') == FOLDER_MIMETYPE:
+                self._seen.add(child['id'])
+                self._pending[child['id']] = None
+
+    def _write(self, record: dict):
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        self._file.write(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def reset(self):
+        """ Empties the log for a new crawl. """
+        self.close()
+        self.path.write_bytes(b'')
+        self.root = None
+        self.folders = 0
+        self._seen.clear()
+        self._pending.clear()
+
+    def start(self, root: dict):
+        """ Logs the start folder, which becomes the frontier. """
+        self._write({'root': root})
+        self._start(root)
+
+    def append(self, folder_id: str, children: list):
+        """
+        Logs a folder's listing. Subfolders already seen under another parent are left out.
+
+        Returns:
+            list: the ids of the subfolders that joined the frontier.
+        """
+        children = [child for child in children if child.get('mimeType') != FOLDER_MIMETYPE or child['id'] not in self._seen]
+        self._write({'folder': folder_id, 'children': children})
+        self._listed(folder_id, children)
+        return [child['id'] for child in children if child.get('mimeType') == FOLDER_MIMETYPE]
+
+    def close(self):
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            self._unsynced = 0
+
+    def to_store(self):
+        """ Reads the logged tree into a TreeStore. A file logged under two folders stays under the first. """
+        store = TreeStore()
+        for record, _ in self._records():
+            if 'root' in record:
+                items, parent_id = [record['root']], None
+            else:
+                items, parent_id = record['children'], record['folder']
+            for item in items:
+                if item['id'] not in store:
+                    store.add(item['id'], item['name'], parent_id, item.get('mimeType', FOLDER_MIMETYPE),
+                              item.get('size'), item.get('md5Checksum'))
+        return store
+
+
+def stream_crawl(client, folder_name: str, path, concurrency: int = 8, sync_every: int = SYNC_EVERY):
+    """
+    Crawls folder_name into the CrawlLog at path, picking up from its frontier if it holds an
+    unfinished crawl of the same folder. A finished log is a crawl already consumed (or never
+    cleaned up) and is started over, so a run never returns a stale tree without listing anything.
+    A folder is listed as soon as its parent's listing is logged, with up to `concurrency` list
+    calls in flight and no wait for the rest of its level.
+
+    Returns:
+        CrawlLog: the finished log, or None if folder_name was not found.
+
+    Raises:
+        HttpError: a rate limit or server error the client's scheduler could not retry away.
+            Everything logged until then is kept, so running again resumes the crawl.
+    """
+    log = CrawlLog(path, sync_every)
+    if log.root is None or log.root['name'] != folder_name or log.finished:
+        folder_id = client.find_folder(folder_name)
+        if folder_id is None:
+            print(f"Folder '{folder_name}' not found at the highest level of your Drive.")
+            return None
+        if log.root is not None:
+            done = 'finished' if log.finished else 'unfinished'
+            print(f"{path} holds a {done} crawl of '{log.root['name']}', starting over")
+            log.reset()
+        log.start(client.get(folder_id))
+    elif log.frontier:
+        print(f"resuming the crawl of '{folder_name}': {log.folders} folders listed, {len(log.frontier)} to go")
+
+    def list_children(current_folder_id):
+        try:
+            return client.list_children(current_folder_id)
+        except HttpError as error:
+            if is_retryable(error):
+                raise
+            print(f"An error occurred while fetching descendants of folder ID '{current_folder_id}': {error}")
+            return []
+
+    metrics = client.scheduler.metrics
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            running = {pool.submit(list_children, folder_id): folder_id for folder_id in log.frontier}
+            try:
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for subfolder_id in log.append(running.pop(future), future.result()):
+                            running[pool.submit(list_children, subfolder_id)] = subfolder_id
+                        metrics.count('folders_listed')
+                    metrics.set('crawl_frontier', len(running))
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
+    finally:
+        log.close()
+    return log
+
+
+def crawl_to_snapshot(client, folder_name: str, snapshot_path, concurrency: int = 8):
+    """
+    Crawls folder_name through a CrawlLog next to snapshot_path, then writes the snapshot and
+    deletes the log. An interrupted run leaves the log behind and the next one resumes it.
+    For google_drive.json, use crawl_to_json.
+
+    Returns:
+        TreeStore: the tree, or None if folder_name was not found.
+    """
+    log = stream_crawl(client, folder_name, log_path(snapshot_path), concurrency)
+    if log is None:
+        return None
+    store = log.to_store()
+    write_snapshot(store, snapshot_path)
+    log.path.unlink()
+    return store
+
+
+def crawl_to_json(client, folder_name: str, json_path, concurrency: int = 8):
+    """
+    crawl_to_snapshot for google_drive.json: crawls through a CrawlLog next to json_path
+    (google_drive.crawl), writes the id_item/id_name/name_id Dictionary and deletes the log.
+
+    Returns:
+        Dictionary: the tree, or None if folder_name was not found.
+    """
+    log = stream_crawl(client, folder_name, log_path(json_path), concurrency)
+    if log is None:
+        return None
+    master_dict = log.to_store().to_master_dict()
+    master_dict.write(json_path)
+    log.path.unlink()
+    return master_dict
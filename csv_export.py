@@ -0,0 +1,109 @@
+import csv
+from array import array
+
+from tree_store import NONE
+
+CSV_PREFIX = 'https://drive.google.com/file/d/'
+CSV_SUFFIX = '/view?usp=drive_link'
+PNG_MIMETYPE = 'image/png'
+
+
+def image_date(name: str):
+    """ (yy, mm, dd) from an image name like 'loc000 -3 24 1 15.png', or None if it has none. """
+    try:
+        yy, mm, dd = (int(part) for part in name.rsplit('.', 1)[0].split()[2:5])
+    except ValueError:
+        return None
+    return yy, mm, dd
+
+
+def date_label(name: str):
+    """ The google_urls.csv date of an image name, m/d/20yy from the name's own digits, padding and all, as main.py wrote it. """
+    yy, mm, dd = name.rsplit('.', 1)[0].split()[2:5]
+    return f'{mm}/{dd}/20{yy}'
+
+
+def url_columns(store, under=None, type_name: str = None):
+    """
+    The speed folders of an images tree (<root>/<type>/<location>/<speed>/<image>.png) in
+    google_urls.csv order: by type, location and speed as a number. Columns are named
+    '<location> <speed>' for a single type_name, '<type> <location> <speed>' for all types.
+
+    Returns:
+        list: (column name, speed folder index)
+    """
+    root = store.roots[0] if under is None else store.resolve(under) if isinstance(under, str) else under
+    folders = []
+    for type_index in store.children(root):
+        type_ = store.names[store.name[type_index]]
+        if not store.is_folder(type_index) or type_name not in (None, type_):
+            continue
+        for location_index in store.children(type_index):
+            if not store.is_folder(location_index):
+                continue
+            location = store.names[store.name[location_index]]
+            for speed_index in store.children(location_index):
+                speed = store.names[store.name[speed_index]]
+                if store.is_folder(speed_index) and speed.lstrip('-').isdigit():
+                    folders.append(((type_, location, int(speed)), speed_index))
+    folders.sort()
+    return [(f'{location} {speed}' if type_name else f'{type_} {location} {speed}', index)
+            for (type_, location, speed), index in folders]
+
+
+def write_url_csv(store, path, under=None, type_name: str = None, prefix: str = CSV_PREFIX, suffix: str = CSV_SUFFIX):
+    """
+    Writes google_urls.csv straight from the tree: one row per image date (in date order, written
+    as date_label has it, so '24 01 05' gives 01/05/2024 and '24 1 5' gives 1/5/2024)
+    and one column per speed folder (see url_columns), holding prefix + file id + suffix of the
+    PNG for that date, or nothing. Each image is visited once to note its (date, column) cell
+    in typed arrays, the cells are pivoted into a preallocated date x column grid of image
+    indexes, and rows are written one at a time, so time is linear in the number of images and
+    no per-cell string is built before its row is written.
+
+    Args:
+        store: a TreeStore or SnapshotTree.
+        path: the CSV file to write.
+        under: the images folder as a path or index; the first root if None.
+        type_name: export only this type, e.g. 'currents'.
+
+    Returns:
+        tuple: (rows, columns) written, not counting the header and date column.
+    """
+    columns = url_columns(store, under, type_name)
+    png = store.mime_codes.get(PNG_MIMETYPE)
+    date_codes = {}
+    labels = {}  # date -> its label, from the first image with that date
+    cell_date, cell_column, cell_image = array('i'), array('i'), array('i')
+    for column, (_, folder) in enumerate(columns):
+        for index in store.children(folder):
+            if store.mime[index] != png:
+                continue
+            date = image_date(store.names[store.name[index]])
+            if date is None:
+                continue
+            if date not in date_codes:
+                date_codes[date] = len(date_codes)
+                labels[date] = date_label(store.names[store.name[index]])
+            cell_date.append(date_codes[date])
+            cell_column.append(column)
+            cell_image.append(index)
+
+    dates = sorted(date_codes)
+    row_of = array('i', [0]) * len(dates)
+    for row, date in enumerate(dates):
+        row_of[date_codes[date]] = row
+    width = len(columns)
+    grid = array('i', [NONE]) * (len(dates) * width)
+    for date_code, column, index in zip(cell_date, cell_column, cell_image):
+        grid[row_of[date_code] * width + column] = index
+    del cell_date, cell_column, cell_image
+
+    ids = store.ids
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['date'] + [name for name, _ in columns])
+        for row, date in enumerate(dates):
+            cells = grid[row * width:(row + 1) * width]
+            writer.writerow([labels[date]] + [f'{prefix}{ids[index]}{suffix}' if index != NONE else '' for index in cells])
+    return len(dates), width
@@ -0,0 +1,254 @@
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from googleapiclient.errors import HttpError
+
+from transfers import send
+
+MAX_DISTANCE = 6  # bits of 64 two difference hashes may differ by and still be the same picture
+BANDS = 4  # near_duplicate_groups splits hashes into this many bands
+BAND_BITS = 16
+THUMBNAIL_FIELDS = 'id, thumbnailLink'
+BATCH = 500  # thumbnails fetched and handed to a worker process at a time
+
+
+class PerceptualHashCache:
+    """
+    Difference hashes keyed by (file id, md5Checksum), saved as JSON, so a rerun only fetches
+    the thumbnails of files that are new or whose content changed.
+
+    Args:
+        path: the cache file, e.g. google_drive.phash.json next to google_drive.json.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.hashes = json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    @staticmethod
+    def key(file_id: str, md5: str):
+        return f'{file_id}:{md5}'
+
+    def get(self, key: str):
+        return self.hashes.get(key)
+
+    def update(self, hashes: dict):
+        self.hashes.update(hashes)
+
+    def write(self):
+        self.path.write_text(json.dumps(self.hashes))
+
+
+class DedupReport:
+    """
+    Duplicate files in a tree, each group's keeper first:
+        duplicates: groups of indexes with the same md5Checksum and size
+        near_duplicates: groups of image indexes whose thumbnails look the same
+        candidates: the ids of every identical copy but the keepers, ready for DriveClient.delete_many
+        reclaimable: the bytes deleting the candidates would free
+        near_candidates: the ids of every near duplicate but the keepers, to review: they are
+            different files, and are only deleted when asked for (see delete_duplicates)
+        near_reclaimable: the bytes deleting the near_candidates as well would free
+    """
+
+    def __init__(self, store, duplicates: list, near_duplicates: list):
+        self.store = store
+        self.duplicates = duplicates
+        self.near_duplicates = near_duplicates
+        extra = {index for group in duplicates for index in group[1:]}
+        near = {index for group in near_duplicates for index in group[1:]} - extra
+        self.candidates = [store.ids[index] for index in sorted(extra)]
+        self.reclaimable = sum(max(store.size[index], 0) for index in extra)
+        self.near_candidates = [store.ids[index] for index in sorted(near)]
+        self.near_reclaimable = sum(max(store.size[index], 0) for index in near)
+
+    def summary(self):
+        return (f'{len(self.duplicates)} sets of duplicates, {len(self.candidates)} files to delete, '
+                f'{self.reclaimable / 2**20:.1f} MB reclaimable; {len(self.near_duplicates)} sets of near duplicates, '
+                f'{len(self.near_candidates)} files to review, {self.near_reclaimable / 2**20:.1f} MB more')
+
+    def rows(self):
+        """ (group number, 'duplicate' or 'near', keep, path, id, size) for every file in a group. """
+        for kind, groups in (('duplicate', self.duplicates), ('near', self.near_duplicates)):
+            for number, group in enumerate(groups):
+                for position, index in enumerate(group):
+                    yield number, kind, position == 0, self.store.path(index), self.store.ids[index], self.store.size[index]
+
+
+def hash_images(images: list):
+    """
+    64-bit difference hashes of encoded images, None for any that cannot be decoded.
+    Runs in a worker process. Needs the optional Pillow package.
+    """
+    from PIL import Image
+    hashes = []
+    for data in images:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                pixels = list(image.convert('L').resize((9, 8), Image.Resampling.LANCZOS).getdata())
+        except (OSError, ValueError):
+            hashes.append(None)
+            continue
+        bits = 0
+        for row in range(8):
+            for column in range(8):
+                bits = bits << 1 | (pixels[row * 9 + column] > pixels[row * 9 + column + 1])
+        hashes.append(bits)
+    return hashes
+
+
+def fetch_thumbnail(client, file_id: str, link: str = None):
+    """ A file's thumbnail, or the file itself when Drive has not made one; None if neither can be had. """
+    try:
+        if link:
+            return send(client, client.service._http, link, 'GET', (200,))[1]
+        request = client.files.get_media(fileId=file_id, supportsAllDrives=True)
+        return send(client, request.http, request.uri, 'GET', (200,), headers=request.headers)[1]
+    except HttpError as error:
+        print(f"An error occurred while fetching the thumbnail of '{file_id}': {error}")
+        return None
+
+
+def perceptual_hashes(client, store, indexes: list, cache: PerceptualHashCache = None, workers: int = 8, hash_workers: int = None):
+    """
+    Difference hashes of the thumbnails of files in store, from cache where it has them. The rest
+    have their thumbnail links read in batch requests, their thumbnails fetched on `workers`
+    threads and hashed in a process pool of hash_workers, BATCH files at a time.
+
+    Returns:
+        dict: index -> hash, for every file whose thumbnail could be fetched and decoded.
+    """
+    hashes = {}
+    missing = []
+    for index in indexes:
+        key = PerceptualHashCache.key(store.ids[index], store.md5.get(index))
+        cached = cache.get(key) if cache is not None else None
+        if cached is None:
+            missing.append((index, key))
+        else:
+            hashes[index] = cached
+    if not missing:
+        return hashes
+
+    ids = [store.ids[index] for index, _ in missing]
+    results = client.execute_many({file_id: partial(client.files.get, fileId=file_id, fields=THUMBNAIL_FIELDS, supportsAllDrives=True)
+                                   for file_id in ids})
+    links = [(results[file_id][0] or {}).get('thumbnailLink') for file_id in ids]
+    print(f'hashing {len(missing)} thumbnails')
+    with ThreadPoolExecutor(max_workers=workers) as threads, ProcessPoolExecutor(max_workers=hash_workers) as processes:
+        batches = []
+        for start in range(0, len(missing), BATCH):
+            thumbnails = list(threads.map(partial(fetch_thumbnail, client), ids[start:start + BATCH], links[start:start + BATCH]))
+            batches.append((missing[start:start + BATCH], processes.submit(hash_images, [t or b'' for t in thumbnails])))
+        for batch, future in batches:
+            for (index, key), value in zip(batch, future.result()):
+                if value is not None:
+                    hashes[index] = value
+                    if cache is not None:
+                        cache.update({key: value})
+    return hashes
+
+
+def near_duplicate_groups(hashes: dict, max_distance: int = MAX_DISTANCE):
+    """
+    Groups items whose hashes differ in at most max_distance of their 64 bits, by multi-index
+    hashing: two such hashes differ in at most max_distance // 4 bits of one of their four 16-bit
+    bands, so each hash is only compared with the ones in that band's buckets within that
+    distance of its own, rather than with every other hash.
+    Groups are complete-linkage: every two members are that close, not just linked through a
+    chain of close pairs, so a run of slowly changing images (a ~ b ~ c) never puts a and c
+    together. Each group forms around the first item (in hashes order) with a close neighbour
+    still ungrouped, taking its neighbours nearest first when they are close to every member.
+
+    Returns:
+        list: groups of two or more keys of hashes.
+    """
+    keys = list(hashes)
+    values = [hashes[key] for key in keys]
+    neighbours = [{} for _ in keys]  # position -> {close position: distance}
+
+    flips = [0]
+    for _ in range(max_distance // BANDS):
+        flips = sorted({flip | 1 << bit for flip in flips for bit in range(BAND_BITS)} | set(flips))
+    mask = (1 << BAND_BITS) - 1
+    for band in range(BANDS):
+        shift = band * BAND_BITS
+        buckets = {}
+        for position, value in enumerate(values):
+            buckets.setdefault(value >> shift & mask, []).append(position)
+        for position, value in enumerate(values):
+            part = value >> shift & mask
+            for flip in flips:
+                for other in buckets.get(part ^ flip, ()):
+                    if other > position and other not in neighbours[position]:
+                        distance = (value ^ values[other]).bit_count()
+                        if distance <= max_distance:
+                            neighbours[position][other] = neighbours[other][position] = distance
+
+    grouped = [False] * len(keys)
+    groups = []
+    for position, close in enumerate(neighbours):
+        if grouped[position] or not close:
+            continue
+        members = [position]
+        for other in sorted(close, key=lambda other: (close[other], other)):
+            if not grouped[other] and all((values[other] ^ values[member]).bit_count() <= max_distance for member in members):
+                members.append(other)
+        if len(members) > 1:
+            for member in members:
+                grouped[member] = True
+            groups.append([keys[member] for member in members])
+    return groups
+
+
+def find_duplicates(store, under=None, client=None, cache: PerceptualHashCache = None, max_distance: int = MAX_DISTANCE,
+                    workers: int = 8, hash_workers: int = None):
+    """
+    Finds identical files by md5Checksum and size, and with a client, images that look the same
+    by the difference hashes of their thumbnails. An identical group keeps its first file in path
+    order; a near duplicate group keeps its largest file, e.g. the higher quality render.
+    The store needs md5Checksum, as sync_plan.drive_store lists it.
+
+    Args:
+        store: a TreeStore or SnapshotTree.
+        under: a path or index to search under, the whole store if None.
+        client: a DriveClient for the thumbnails, or None for exact duplicates only.
+        cache: a PerceptualHashCache, so thumbnails are fetched and hashed once per file content.
+        max_distance: the number of differing hash bits up to which images count as the same.
+
+    Returns:
+        DedupReport
+    """
+    duplicates = [sorted(group, key=store.path) for group in store.duplicates(under)]
+    near = []
+    if client is not None:
+        repeated = {index for group in duplicates for index in group[1:]}
+        nodes = store.walk() if under is None else store.walk(store.resolve(under) if isinstance(under, str) else under)
+        images = [index for index in nodes if index not in repeated
+                  and store.mimetypes[store.mime[index]].startswith('image/') and index in store.md5]
+        hashes = perceptual_hashes(client, store, images, cache, workers, hash_workers)
+        if cache is not None:
+            cache.write()
+        near = [sorted(group, key=lambda index: (-store.size[index], store.path(index)))
+                for group in near_duplicate_groups(hashes, max_distance)]
+    return DedupReport(store, duplicates, near)
+
+
+def delete_duplicates(client, report: DedupReport, store=None, master_dict=None, include_near: bool = False):
+    """
+    Deletes report.candidates with DriveClient.delete_many, then removes the ones deleted from
+    master_dict and store (if given). Near duplicates only look alike, so report.near_candidates
+    are deleted too only with include_near, once they have been reviewed.
+
+    Returns:
+        dict: file id -> HttpError for the deletes that failed.
+    """
+    results = client.delete_many(report.candidates + (report.near_candidates if include_near else []), master_dict)
+    if store is not None:
+        for file_id, error in results.items():
+            if error is None or error.resp.status == 404:
+                store.remove(file_id)
+    return {file_id: error for file_id, error in results.items() if error is not None}
@@ -0,0 +1,400 @@
+import json
+import os
+import threading
+import time
+from functools import partial
+from pathlib import Path
+
+from scheduler import RequestScheduler
+
+# googleapiclient, google.auth and tree_builder are imported where they are first needed, so
+# a run that never reaches the API (e.g. one answered from the cached tree) does not load them.
+
+SCOPES = ['https://www.googleapis.com/auth/drive']
+TOKEN_JSON = 'token.json'
+CLIENT_SECRETS_JSON = 'client_secrets.json'
+FOLDER_MIMETYPE = 'application/vnd.google-apps.folder'
+ITEM_FIELDS = 'id, name, mimeType, size'
+BATCH_SIZE = 100  # the most calls Drive accepts in one batch request
+CHANGE_FIELDS = f'nextPageToken, newStartPageToken, changes(fileId, removed, file({ITEM_FIELDS}, parents, trashed))'
+
+
+class DriveClient:
+    """
+    Thread-safe access to the Google Drive v3 API.
+
+    googleapiclient service objects (and the httplib2 connection under them) are not
+    thread-safe, so every thread that makes a call gets its own service from service_factory.
+    Every call goes through scheduler, which paces them and retries rate limit and server errors;
+    share one scheduler between clients that draw on the same quota.
+    With an id_cache, names and paths resolve from it where they can, and the client's own
+    creates, renames, moves and deletes are written through to it.
+    With a drive_id, the client works in that shared drive: queries are limited to it and
+    names resolve from its root. Every call sets supportsAllDrives, so files in shared drives
+    can be read and changed by id from any client.
+
+    Args:
+        service_factory: a callable returning a new Drive service object.
+        scheduler: a RequestScheduler, a new one with the default limits if None.
+        id_cache: an IdCache, or None to look every name up.
+        drive_id: a shared drive's id, or None for My Drive.
+    """
+
+    def __init__(self, service_factory, scheduler: RequestScheduler = None, id_cache=None, drive_id: str = None):
+        self._service_factory = service_factory
+        self._local = threading.local()
+        self.scheduler = RequestScheduler() if scheduler is None else scheduler
+        self.id_cache = id_cache
+        self.drive_id = drive_id
+
+    @classmethod
+    def from_credentials(cls, creds, scheduler: RequestScheduler = None, id_cache=None, drive_id: str = None):
+        return cls(partial(build_service, creds), scheduler, id_cache, drive_id)
+
+    @classmethod
+    def from_service_account(cls, key_path, subject: str = None, scopes: list = SCOPES, scheduler: RequestScheduler = None,
+                             id_cache=None, drive_id: str = None):
+        """ A client acting as a service account, or as subject through domain-wide delegation. """
+        return cls.from_credentials(load_service_account(key_path, subject, scopes), scheduler, id_cache, drive_id)
+
+    @classmethod
+    def from_token_file(cls, token_path=TOKEN_JSON, secrets_path=CLIENT_SECRETS_JSON, scopes: list = SCOPES,
+                        scheduler: RequestScheduler = None, id_cache=None, drive_id: str = None):
+        """
+        A client that reads (and if need be refreshes or creates) its credentials only when the
+        first call builds a service, so constructing it costs nothing and a run that never calls
+        the API never touches token.json or the auth libraries. See load_credentials.
+        """
+        lock = threading.Lock()
+        credentials = []
+
+        def factory():
+            with lock:
+                if not credentials:
+                    credentials.append(load_credentials(token_path, secrets_path, scopes))
+            return build_service(credentials[0])
+        return cls(factory, scheduler, id_cache, drive_id)
+
+    def for_drive(self, drive_id: str = None):
+        """ A client for another shared drive (or My Drive if None) with the same credentials, scheduler and id_cache. """
+        return DriveClient(self._service_factory, self.scheduler, self.id_cache, drive_id)
+
+    @property
+    def root_id(self):
+        """ Where top-level names resolve from: the shared drive, or 'root' for My Drive. """
+        return self.drive_id or 'root'
+
+    def _corpus(self):
+        """ The files.list and changes arguments that limit a query to this client's drive. """
+        if self.drive_id is None:
+            return {}
+        return {'corpora': 'drive', 'driveId': self.drive_id, 'includeItemsFromAllDrives': True, 'supportsAllDrives': True}
+
+    @property
+    def service(self):
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._local.service = self._service_factory()
+        return service
+
+    @property
+    def files(self):
+        """ This thread's service.files(); building one from the discovery document costs ~10 ms of CPU. """
+        files = getattr(self._local, 'files', None)
+        if files is None:
+            files = self._local.files = self.service.files()
+        return files
+
+    def execute(self, request):
+        """ Runs one googleapiclient HttpRequest through the scheduler. """
+        return self.scheduler.call(request.execute, method=request.methodId)
+
+    def get(self, file_id: str, fields: str = ITEM_FIELDS):
+        return self.execute(self.files.get(fileId=file_id, fields=fields, supportsAllDrives=True))
+
+    def list(self, q: str, fields: str = ITEM_FIELDS, page_size: int = 1000):
+        """
+        Runs a files().list query to completion, following nextPageToken.
+
+        Raises:
+            HttpError: the caller decides whether a failed query is fatal.
+        """
+        items = []
+        page_token = None
+        while True:
+            response = self.execute(self.files.list(q=q, spaces='drive', fields=f'nextPageToken, files({fields})',
+                                                    pageSize=page_size, pageToken=page_token, **self._corpus()))
+            items.extend(response.get('files', []))
+            self.scheduler.metrics.count('pages_fetched', method='drive.files.list')
+            self.scheduler.metrics.count('items_listed', len(response.get('files', [])), method='drive.files.list')
+            page_token = response.get('nextPageToken', None)
+            if not page_token:
+                return items
+
+    def list_children(self, folder_id: str, fields: str = ITEM_FIELDS):
+        return self.list(f"'{folder_id}' in parents and trashed=false", fields)
+
+    def list_all(self, fields: str = ITEM_FIELDS + ', parents'):
+        """ Every untrashed item in the Drive (or the client's shared drive), in pages of 1000. """
+        return self.list('trashed=false', fields)
+
+    def list_all_folders(self):
+        return self.list(f"mimeType = '{FOLDER_MIMETYPE}' and trashed=false", 'id, parents')
+
+    def find_folder(self, folder_name: str, parent_id: str = None):
+        """
+        Returns:
+            str: the ID of the first folder called folder_name directly under parent_id (root_id
+                if None), or None.
+        """
+        return self.find_child(self.root_id if parent_id is None else parent_id, folder_name, folder=True)
+
+    def find_child(self, parent_id: str, name: str, folder: bool = False):
+        """
+        The ID of the first item (or folder) called name directly under parent_id, or None.
+        Answered from id_cache when it knows, otherwise with one files().list call.
+        """
+        if self.id_cache is not None:
+            cached = self.id_cache.get(parent_id, name)
+            if cached is not None and (not folder or cached[1] == FOLDER_MIMETYPE):
+                return cached[0]
+        query = f"name = '{escape_query(name)}' and '{parent_id}' in parents and trashed=false"
+        if folder:
+            query += f" and mimeType = '{FOLDER_MIMETYPE}'"
+        found = self.execute(self.files.list(q=query, spaces='drive', fields='files(id, name, mimeType)', **self._corpus())).get('files', [])
+        if not found:
+            return None
+        self.remember(parent_id, name, found[0]['id'], found[0].get('mimeType'))
+        return found[0]['id']
+
+    def resolve_path(self, path: str, root_id: str = None):
+        """
+        The ID of the item at a '/' separated path under root_id (the client's root_id by default),
+        e.g. 'images 3.0/currents/loc000/-3', or None. Costs one list call per component id_cache
+        does not know, so none at all once the cache is warm.
+        """
+        parts = [part for part in path.strip('/').split('/') if part]
+        file_id = self.root_id if root_id is None else root_id
+        for depth, name in enumerate(parts):
+            file_id = self.find_child(file_id, name, folder=depth < len(parts) - 1)
+            if file_id is None:
+                return None
+        return file_id
+
+    def remember(self, parent_id: str, name: str, file_id: str, mime_type: str = None):
+        """ Records where an item is in id_cache, if there is one. """
+        if self.id_cache is not None:
+            self.id_cache.put(parent_id, name, file_id, mime_type)
+
+    def create_folder(self, folder_name: str, parent_id: str, fields: str = ITEM_FIELDS):
+        body = {'name': folder_name, 'mimeType': FOLDER_MIMETYPE, 'parents': [parent_id]}
+        folder = self.execute(self.files.create(body=body, fields=fields, supportsAllDrives=True))
+        self.remember(parent_id, folder_name, folder['id'], FOLDER_MIMETYPE)
+        return folder
+
+    def upload_file(self, file_path, parent_id: str, name: str = None, fields: str = ITEM_FIELDS):
+        """ Uploads a local file into parent_id in a single multipart request. """
+        from googleapiclient.http import MediaFileUpload
+        body = {'name': name or os.path.basename(file_path), 'parents': [parent_id]}
+        media = MediaFileUpload(str(file_path), resumable=False)
+        file = self.execute(self.files.create(body=body, media_body=media, fields=fields, supportsAllDrives=True))
+        self.remember(parent_id, body['name'], file['id'], file.get('mimeType'))
+        return file
+
+    def update_content(self, file_id: str, file_path, fields: str = ITEM_FIELDS):
+        """ Replaces a file's content, keeping its id, name and place. """
+        from googleapiclient.http import MediaFileUpload
+        media = MediaFileUpload(str(file_path), resumable=False)
+        return self.execute(self.files.update(fileId=file_id, media_body=media, fields=fields, supportsAllDrives=True))
+
+    def start_page_token(self):
+        """ The changes token for 'now'; list_changes(token) later returns everything changed since. """
+        corpus = {'driveId': self.drive_id, 'supportsAllDrives': True} if self.drive_id else {}
+        return self.execute(self.service.changes().getStartPageToken(**corpus))['startPageToken']
+
+    def list_changes(self, page_token: str, page_size: int = 1000):
+        """
+        Reads the changes feed from page_token to the present.
+
+        Returns:
+            tuple: (list of change resources, the start page token for the next refresh)
+        """
+        changes = []
+        while True:
+            response = self.execute(self.service.changes().list(pageToken=page_token, spaces='drive', includeRemoved=True,
+                                                                pageSize=page_size, fields=CHANGE_FIELDS, **self._corpus()))
+            changes.extend(response.get('changes', []))
+            self.scheduler.metrics.count('pages_fetched', method='drive.changes.list')
+            self.scheduler.metrics.count('items_listed', len(response.get('changes', [])), method='drive.changes.list')
+            if 'newStartPageToken' in response:
+                return changes, response['newStartPageToken']
+            page_token = response['nextPageToken']
+
+    def list_drives(self):
+        """ Every shared drive the account can see, as {'id', 'name'}, following nextPageToken. """
+        drives = []
+        page_token = None
+        while True:
+            response = self.execute(self.service.drives().list(pageSize=100, pageToken=page_token,
+                                                               fields='nextPageToken, drives(id, name)'))
+            drives.extend(response.get('drives', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return drives
+
+    def get_drive(self, drive_id: str = None):
+        """ A shared drive's {'id', 'name'}, the client's own if drive_id is None. """
+        return self.execute(self.service.drives().get(driveId=drive_id or self.drive_id, fields='id, name'))
+
+    def execute_many(self, requests: dict):
+        """
+        Sends calls in batch requests of up to 100, each paced by the scheduler as that many calls.
+        Sub-requests that fail with a rate limit or server error are retried in new batches on
+        their own, after the scheduler's backoff.
+
+        Args:
+            requests: request id -> a callable returning the HttpRequest, e.g. a file id -> its delete.
+
+        Returns:
+            dict: request id -> (response, None) or (None, HttpError)
+        """
+        results = {}
+        pending = list(requests)
+        attempt = 0
+        while pending:
+            retry = {}
+
+            def callback(request_id, response, exception):
+                delay = None if exception is None else self.scheduler.retry_delay(exception, attempt, 'batch')
+                if delay is None:
+                    results[request_id] = (response, exception)
+                else:
+                    retry[request_id] = delay
+
+            for start in range(0, len(pending), BATCH_SIZE):
+                batch = self.service.new_batch_http_request(callback=callback)
+                for request_id in pending[start:start + BATCH_SIZE]:
+                    batch.add(requests[request_id](), request_id=request_id)
+                self.scheduler.call(batch.execute, cost=len(pending[start:start + BATCH_SIZE]), method='batch')
+            if retry:
+                print(f'retrying {len(retry)} of {len(pending)} batched calls')
+                time.sleep(max(retry.values()))
+            pending = list(retry)
+            attempt += 1
+        return results
+
+    def delete_many(self, file_ids, master_dict=None):
+        """
+        Deletes files in batches of 100. Once every batch's results, retries included, have come
+        back, the files deleted (or already gone) are removed from master_dict (if given) and id_cache.
+        Folders are deleted with everything in them.
+
+        Returns:
+            dict: file id -> None if deleted, otherwise the HttpError
+        """
+        results = self.execute_many({file_id: partial(self._delete_request, file_id) for file_id in file_ids})
+        if self.id_cache is not None:
+            for file_id, (_, error) in results.items():
+                if error is None or error.resp.status == 404:
+                    self.id_cache.invalidate(file_id, children=True)
+        if master_dict is not None:
+            from tree_builder import detach, finish_master_dict, parent_index
+            parents = parent_index(master_dict)
+            for file_id, (_, error) in results.items():
+                if error is None or error.resp.status == 404:
+                    detach(master_dict, parents, file_id)
+            finish_master_dict(master_dict)
+        return {file_id: error for file_id, (_, error) in results.items()}
+
+    def update_many(self, updates: dict, master_dict=None):
+        """
+        Updates file metadata in batches of 100 and files the results into master_dict (if given).
+
+        Args:
+            updates: file id -> metadata body, e.g. {'name': 'new name'}. 'addParents' and
+                'removeParents' (comma separated ids) in the body move the file.
+
+        Returns:
+            dict: file id -> None if updated, otherwise the HttpError
+        """
+        results = self.execute_many({file_id: partial(self._update_request, file_id, body) for file_id, body in updates.items()})
+        if self.id_cache is not None:
+            for file_id, (file, error) in results.items():
+                if error is None:
+                    self.id_cache.invalidate(file_id)
+                    if not file.get('trashed'):
+                        for parent_id in file.get('parents', []):
+                            self.remember(parent_id, file['name'], file_id, file['mimeType'])
+        if master_dict is not None:
+            from tree_builder import apply_file, detach, finish_master_dict, parent_index
+            parents = parent_index(master_dict)
+            for file_id, (file, error) in results.items():
+                if error is None and file_id in master_dict['id_item']:
+                    if file.get('trashed') or apply_file(master_dict, parents, file) is None:
+                        detach(master_dict, parents, file_id)
+            finish_master_dict(master_dict)
+        return {file_id: error for file_id, (_, error) in results.items()}
+
+    def _delete_request(self, file_id: str):
+        return self.files.delete(fileId=file_id, supportsAllDrives=True)
+
+    def _update_request(self, file_id: str, body: dict):
+        body = dict(body)
+        moves = {key: body.pop(key) for key in ('addParents', 'removeParents') if key in body}
+        return self.files.update(fileId=file_id, body=body, fields=f'{ITEM_FIELDS}, parents, trashed', supportsAllDrives=True, **moves)
+
+
+def escape_query(value: str):
+    """ Escapes a string for use inside '...' in a Drive query. """
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+
+_discovery_document = None
+
+
+def discovery_document():
+    """
+    The Drive v3 discovery document bundled with googleapiclient, read and parsed once per
+    process; build() would read and parse it again for every service (one per thread).
+    """
+    global _discovery_document
+    if _discovery_document is None:
+        from googleapiclient.discovery_cache import get_static_doc
+        _discovery_document = json.loads(get_static_doc('drive', 'v3'))
+    return _discovery_document
+
+
+def build_service(creds):
+    """ A new Drive v3 service object, built from the cached discovery document without a network fetch. """
+    from googleapiclient.discovery import build_from_document
+    return build_from_document(discovery_document(), credentials=creds)
+
+
+def load_service_account(key_path, subject: str = None, scopes: list = SCOPES):
+    """
+    Service account credentials from its JSON key file; with subject (a user's email), acting as
+    that user through domain-wide delegation. Refreshed by google.auth as they expire.
+    """
+    from google.oauth2 import service_account
+    creds = service_account.Credentials.from_service_account_file(str(key_path), scopes=scopes)
+    return creds.with_subject(subject) if subject else creds
+
+
+def load_credentials(token_path=TOKEN_JSON, secrets_path=CLIENT_SECRETS_JSON, scopes: list = SCOPES):
+    """
+    Reads the OAuth credentials saved in token_path, refreshing them if they have expired,
+    or runs the browser consent flow with secrets_path if there are none (or they cannot be
+    refreshed). New or refreshed credentials are saved back to token_path.
+    """
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    creds = Credentials.from_authorized_user_file(str(token_path), scopes) if os.path.exists(token_path) else None
+    if creds is not None and creds.valid:
+        return creds
+    if creds is not None and creds.expired and creds.refresh_token:
+        creds.refresh(Request())
+    else:
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        creds = InstalledAppFlow.from_client_secrets_file(str(secrets_path), scopes).run_local_server(port=0)
+    Path(token_path).write_text(creds.to_json())
+    return creds
@@ -0,0 +1,240 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from googleapiclient.errors import HttpError
+
+from drive_client import (CLIENT_SECRETS_JSON, FOLDER_MIMETYPE, SCOPES, DriveClient, build_service, load_credentials,
+                          load_service_account)
+from scheduler import RequestScheduler
+from tree_store import NONE, TreeStore
+
+
+class CredentialPool:
+    """
+    The accounts a DrivePool works as, by name: OAuth users, each with their own token file, and
+    service accounts, optionally acting as a user through domain-wide delegation. An account's
+    credentials are loaded when its first call builds a service. Drive's quotas are per user and
+    per project, so every account gets its own RequestScheduler, named after it, under the
+    pool's project scheduler: each account is paced and backs off on its own, and all of them
+    together stay under the project's rate. stats() reports each account's counters.
+
+    Args:
+        scopes: the OAuth scopes every account asks for.
+        project: the RequestScheduler for the project's quota, a new one if None.
+        metrics: where the account schedulers record, metrics.METRICS if None.
+        limits: RequestScheduler arguments for every account's scheduler, e.g. rate=100.
+    """
+
+    def __init__(self, scopes: list = SCOPES, project: RequestScheduler = None, metrics=None, **limits):
+        self.scopes = scopes
+        self.project = RequestScheduler(metrics=metrics, name='project') if project is None else project
+        self.metrics = metrics
+        self.limits = limits
+        self.factories = {}
+        self.schedulers = {}
+
+    @property
+    def accounts(self):
+        return list(self.factories)
+
+    def add(self, account: str, service_factory):
+        """ Adds an account that builds its services with service_factory, e.g. FakeDrive.service. """
+        self.factories[account] = service_factory
+        self.schedulers[account] = RequestScheduler(metrics=self.metrics, name=account, parent=self.project, **self.limits)
+
+    def add_token_file(self, account: str, token_path, secrets_path=CLIENT_SECRETS_JSON):
+        """ Adds an OAuth user, see drive_client.load_credentials. """
+        self.add(account, _lazy(partial(load_credentials, token_path, secrets_path, self.scopes)))
+
+    def add_service_account(self, account: str, key_path, subject: str = None):
+        """ Adds a service account, acting as subject (a user's email) if given. """
+        self.add(account, _lazy(partial(load_service_account, key_path, subject, self.scopes)))
+
+    def client(self, account: str, drive_id: str = None, id_cache=None):
+        """ A DriveClient for an account's My Drive, or the shared drive drive_id, on the account's scheduler. """
+        return DriveClient(self.factories[account], self.schedulers[account], id_cache, drive_id)
+
+    def stats(self):
+        """ account -> its scheduler's stats(), plus 'project' for the shared pacing. """
+        stats = {account: scheduler.stats() for account, scheduler in self.schedulers.items()}
+        stats['project'] = self.project.stats()
+        return stats
+
+
+def _lazy(load):
+    """ A service factory that calls load() for credentials once, on the first service it builds. """
+    lock = threading.Lock()
+    credentials = []
+
+    def factory():
+        with lock:
+            if not credentials:
+                credentials.append(load())
+        return build_service(credentials[0])
+    return factory
+
+
+class DriveSource:
+    """
+    One tree in a DrivePool: the folder called folder_name at the top of client's drive (My Drive
+    or the client's shared drive), or with no folder_name the whole shared drive.
+    label is its root's name in the merged tree, the folder or drive name if None (set when it is crawled).
+    """
+
+    def __init__(self, client: DriveClient, folder_name: str = None, label: str = None):
+        if folder_name is None and client.drive_id is None:
+            raise ValueError('a My Drive source needs a folder_name')
+        self.client = client
+        self.folder_name = folder_name
+        self.label = label
+
+    def crawl(self, mode: str = 'crawl', concurrency: int = 8):
+        """
+        The source's tree. A whole shared drive is always read with a flat listing: corpora=drive
+        limits it to the drive, so every item listed is in the tree, at 1000 per call.
+
+        Returns:
+            TreeStore: the tree, with no items if the folder was not found.
+        """
+        from tree_builder import assemble_subtree, build_tree
+        if self.folder_name is not None:
+            return TreeStore.from_master_dict(build_tree(self.client, self.folder_name, mode, concurrency))
+        drive = self.client.get_drive()
+        items = self.client.list_all()
+        items.append({'id': drive['id'], 'name': drive['name'], 'mimeType': FOLDER_MIMETYPE})
+        return TreeStore.from_master_dict(assemble_subtree(items, drive['id']))
+
+
+class DrivePool:
+    """
+    Several trees, in one or more accounts and shared drives, crawled and worked on in parallel
+    as one. In the merged tree every source is a root named by its label, so paths read
+    '<label>/currents/loc000/-3/...'. A file reachable from two sources (e.g. a shared drive two
+    accounts are members of) is kept once, under the first. owners maps every file id to its
+    source, and calls on file ids go to that source's client.
+
+    Args:
+        sources: DriveSource list.
+        workers: the number of sources worked on at once, all of them if None.
+    """
+
+    def __init__(self, sources: list, workers: int = None):
+        self.sources = list(sources)
+        self.workers = workers or max(len(self.sources), 1)
+        self.store = None
+        self.owners = {}
+
+    @classmethod
+    def shared_drives(cls, credentials: CredentialPool, accounts: list = None, workers: int = None):
+        """ A pool of every shared drive the accounts (all of them if None) can see, each read by the first that can. """
+        sources = {}
+        for account in accounts or credentials.accounts:
+            client = credentials.client(account)
+            for drive in client.list_drives():
+                if drive['id'] not in sources:
+                    sources[drive['id']] = DriveSource(client.for_drive(drive['id']), label=drive['name'])
+        return cls(list(sources.values()), workers)
+
+    def map(self, function):
+        """
+        Runs function(source) for every source in parallel.
+
+        Returns:
+            list: (source, result) in source order, result None where function raised an HttpError.
+        """
+        def attempt(source):
+            try:
+                return function(source)
+            except HttpError as error:
+                print(f"An error occurred in '{source.label or source.folder_name or source.client.drive_id}': {error}")
+                return None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(zip(self.sources, pool.map(attempt, self.sources)))
+
+    def crawl(self, mode: str = 'crawl', concurrency: int = 8):
+        """
+        Crawls every source in parallel, each with up to `concurrency` list calls in flight, and
+        merges them into store.
+
+        Returns:
+            TreeStore: the merged tree.
+        """
+        store = TreeStore()
+        owners = {}
+        for source, tree in self.map(lambda source: source.crawl(mode, concurrency)):
+            if tree is None or not tree.roots:
+                continue
+            root = tree.roots[0]
+            label = source.label = source.label or tree.names[tree.name[root]]
+            if tree.ids[root] in store:
+                print(f"'{label}' is already in the tree as '{store.path(store.id_index[tree.ids[root]])}', skipping it")
+                continue
+            for index in tree.walk(root):
+                file_id = tree.ids[index]
+                if file_id in store:
+                    continue
+                parent = tree.parent[index]
+                size = tree.size[index]
+                store.add(file_id, label if index == root else tree.names[tree.name[index]],
+                          None if parent == NONE else tree.ids[parent], tree.mimetypes[tree.mime[index]],
+                          None if size == NONE else size, tree.md5.get(index))
+                owners[file_id] = source
+        self.store, self.owners = store, owners
+        return store
+
+    def client_for(self, file_id: str):
+        """ The client of the source file_id was crawled from. """
+        return self.owners[file_id].client
+
+    def delete_many(self, file_ids):
+        """
+        Deletes files through their own sources' clients, the sources in parallel, each in
+        batches of 100, and removes them, and everything under the folders among them, from
+        store and owners.
+
+        Returns:
+            dict: file id -> None if deleted, otherwise the error: the HttpError of its delete,
+                or of its source's client if that failed as a whole, or a LookupError for an id
+                the pool has not crawled
+        """
+        by_source = {}
+        results = {}
+        for file_id in file_ids:
+            source = self.owners.get(file_id)
+            if source is None:
+                results[file_id] = LookupError(f"'{file_id}' is not in any source of the pool")
+            else:
+                by_source.setdefault(source, []).append(file_id)
+
+        def delete(source):
+            doomed = by_source.get(source, [])
+            try:
+                return source.client.delete_many(doomed) if doomed else {}
+            except HttpError as error:
+                print(f"An error occurred in '{source.label or source.folder_name or source.client.drive_id}': {error}")
+                return {file_id: error for file_id in doomed}
+        for _, deleted in self.map(delete):
+            results.update(deleted)
+        for file_id, error in results.items():
+            if error is None or isinstance(error, HttpError) and error.resp.status == 404:
+                self._forget(file_id)
+        return results
+
+    def _forget(self, file_id: str):
+        """ Drops a deleted item and everything under it from owners and store. """
+        self.owners.pop(file_id, None)
+        if self.store is None or file_id not in self.store:
+            return
+        ids = self.store.ids
+        for index in self.store.walk(self.store.id_index[file_id]):
+            self.owners.pop(ids[index], None)
+        self.store.remove(file_id)
+
+    def stats(self):
+        """ The scheduler stats of each account the sources use, by scheduler name (or source label). """
+        stats = {}
+        for source in self.sources:
+            scheduler = source.client.scheduler
+            stats.setdefault(scheduler.name or source.label or source.folder_name, scheduler.stats())
+        return stats
@@ -0,0 +1,227 @@
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+from drive_client import FOLDER_MIMETYPE, escape_query
+from tree_store import NONE, TreeStore
+
+QUERY_FIELDS = 'id, name, mimeType, size, modifiedTime, parents'
+ANCESTOR_FIELDS = 'id, name, mimeType, parents'
+
+
+class TreeQuery:
+    """
+    A filter over Drive items that runs either on Drive or on a tree already in memory. to_q()
+    pushes down what the Drive query language can express (name, a name prefix, mimeType, folder
+    or not, modifiedTime); matches() is the exact check, including size, which files.list cannot
+    filter on, so find_matching asks for it in the fields and compares it locally.
+
+    Args:
+        name: the whole name, e.g. '.DS_Store'.
+        name_prefix: the start of the name, sent as name contains (which matches words starting
+            with it anywhere in the name) and checked exactly by matches().
+        mimetype: e.g. 'image/png'.
+        min_size, max_size: bounds on size in bytes, inclusive. Items without a size (folders,
+            Google Docs) never match a size bound.
+        modified_after, modified_before: datetimes (naive ones are UTC) or RFC 3339 strings.
+        folders: True for folders only, False for everything but folders, None for both.
+    """
+
+    def __init__(self, name: str = None, name_prefix: str = None, mimetype: str = None, min_size: int = None, max_size: int = None,
+                 modified_after=None, modified_before=None, folders: bool = None):
+        self.name = name
+        self.name_prefix = name_prefix
+        self.mimetype = mimetype
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_after = None if modified_after is None else _timestamp(modified_after)
+        self.modified_before = None if modified_before is None else _timestamp(modified_before)
+        self.folders = folders
+
+    def __repr__(self):
+        terms = ', '.join(f'{key}={value!r}' for key, value in vars(self).items() if value is not None)
+        return f'TreeQuery({terms})'
+
+    def to_q(self, parent_id: str = None):
+        """ The files.list q for everything but the size bounds, optionally only directly under parent_id. """
+        clauses = []
+        if self.name is not None:
+            clauses.append(f"name = '{escape_query(self.name)}'")
+        if self.name_prefix is not None:
+            clauses.append(f"name contains '{escape_query(self.name_prefix)}'")
+        if self.mimetype is not None:
+            clauses.append(f"mimeType = '{escape_query(self.mimetype)}'")
+        if self.folders is not None:
+            clauses.append(f"mimeType {'=' if self.folders else '!='} '{FOLDER_MIMETYPE}'")
+        if self.modified_after is not None:
+            clauses.append(f"modifiedTime > '{_rfc3339(self.modified_after)}'")
+        if self.modified_before is not None:
+            clauses.append(f"modifiedTime < '{_rfc3339(self.modified_before, round_up=True)}'")
+        if parent_id is not None:
+            clauses.append(f"'{parent_id}' in parents")
+        clauses.append('trashed=false')
+        return ' and '.join(clauses)
+
+    def matches(self, item: dict):
+        """ Whether a Drive item dictionary (with the QUERY_FIELDS the query uses) passes every filter. """
+        name, mimetype = item.get('name', ''), item.get('mimeType')
+        if self.name is not None and name != self.name:
+            return False
+        if self.name_prefix is not None and not name.startswith(self.name_prefix):
+            return False
+        if self.mimetype is not None and mimetype != self.mimetype:
+            return False
+        if self.folders is not None and (mimetype == FOLDER_MIMETYPE) != self.folders:
+            return False
+        if self.min_size is not None or self.max_size is not None:
+            if item.get('size') is None or not self._size_ok(int(item['size'])):
+                return False
+        if self.modified_after is not None or self.modified_before is not None:
+            if item.get('modifiedTime') is None:
+                return False
+            modified = _timestamp(item['modifiedTime'])
+            if self.modified_after is not None and modified <= self.modified_after:
+                return False
+            if self.modified_before is not None and modified >= self.modified_before:
+                return False
+        return True
+
+    def _size_ok(self, size: int):
+        return (self.min_size is None or size >= self.min_size) and (self.max_size is None or size <= self.max_size)
+
+    def select(self, store, under=None):
+        """
+        The indexes of the items in a TreeStore or SnapshotTree that match, optionally only those
+        under a path or index (none if it is not in the tree), starting from the name or mimetype
+        index when the query has one.
+
+        Raises:
+            ValueError: the query filters on modifiedTime, which trees do not keep.
+        """
+        if self.modified_after is not None or self.modified_before is not None:
+            raise ValueError('trees do not keep modifiedTime, use find_matching')
+        if self.name is not None:
+            candidates = store.find(self.name, under)
+        elif self.mimetype is not None:
+            candidates = store.find_mimetype(self.mimetype, under)
+        elif under is None:
+            candidates = store.walk()
+        else:
+            start = store.resolve(under) if isinstance(under, str) else under
+            candidates = [] if start is None else store.walk(start)
+        mimetypes, names, size = store.mimetypes, store.names, store.size
+        found = []
+        for index in candidates:
+            name, mimetype = names[store.name[index]], mimetypes[store.mime[index]]
+            if self.name is not None and name != self.name or self.name_prefix is not None and not name.startswith(self.name_prefix):
+                continue
+            if self.mimetype is not None and mimetype != self.mimetype:
+                continue
+            if self.folders is not None and (mimetype == FOLDER_MIMETYPE) != self.folders:
+                continue
+            if (self.min_size is not None or self.max_size is not None) and (size[index] == NONE or not self._size_ok(size[index])):
+                continue
+            found.append(index)
+        return found
+
+
+def _timestamp(value):
+    """ A datetime or RFC 3339 string as an aware datetime, UTC when it has no offset. """
+    moment = datetime.fromisoformat(value) if isinstance(value, str) else value
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _rfc3339(moment: datetime, round_up: bool = False):
+    """ moment in UTC to the second, as q takes it; rounded up for an upper bound, so the query keeps every match. """
+    moment = moment.astimezone(timezone.utc)
+    if round_up and moment.microsecond:
+        moment += timedelta(seconds=1)
+    return moment.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def find_matching(client, query: TreeQuery, under: str = None, fields: str = QUERY_FIELDS):
+    """
+    Runs a TreeQuery on Drive instead of crawling: one files.list query for the matching items,
+    in pages of 1000, then their missing ancestors, one level of the tree per round of batched
+    gets, each folder fetched once however many matches share it. A sweep for a few stray files
+    costs a few calls where a crawl lists every folder. Size bounds are checked as pages arrive,
+    so a query on size alone still lists every item of its mimetype, one page after another.
+
+    Args:
+        client: a DriveClient; its shared drive, or My Drive.
+        under: a '/' separated folder path from the top of the drive; matches elsewhere are
+            dropped (they are still listed and placed, Drive cannot query by ancestor).
+        fields: the item fields to list, at least QUERY_FIELDS.
+
+    Returns:
+        tuple: (a TreeStore holding the matches and the folders above them up to the top of the
+            drive, so store.path gives their full paths; the matches' indexes in it, in listing order)
+        (TreeStore(), []) if under is not found.
+
+    Raises:
+        HttpError: from the query; failed ancestor gets are printed and their matches dropped.
+    """
+    top = client.drive_id or client.get('root', 'id')['id']
+    under_id = None if under is None else client.resolve_path(under)
+    if under is not None and under_id is None:
+        return TreeStore(), []
+    found = [item for item in client.list(query.to_q(), fields) if query.matches(item)]
+
+    known = {item['id']: item for item in found}
+    missing = {item['parents'][0] for item in found if item.get('parents')} - known.keys() - {top}
+    while missing:
+        results = client.execute_many({file_id: partial(client.files.get, fileId=file_id, fields=ANCESTOR_FIELDS, supportsAllDrives=True)
+                                       for file_id in missing})
+        missing = set()
+        for file_id, (item, error) in results.items():
+            if error is not None:
+                if error.resp.status != 404:
+                    print(f'An error occurred: {error}')
+                continue
+            known[file_id] = item
+            if item.get('parents'):
+                missing.add(item['parents'][0])
+        missing -= known.keys() | {top}
+
+    store = TreeStore()
+    matches = []
+    for item in found:
+        chain = []
+        file_id = item['id']
+        while file_id != top and file_id not in store:
+            entry = known.get(file_id)
+            if entry is None or not entry.get('parents'):
+                break  # shared with the user, or an ancestor could not be read: it has no place in the tree
+            chain.append(entry)
+            file_id = entry['parents'][0]
+        else:
+            for entry in reversed(chain):
+                parent_id = entry['parents'][0]
+                store.add(entry['id'], entry['name'], None if parent_id == top else parent_id, entry['mimeType'],
+                          entry.get('size'), entry.get('md5Checksum'))
+            index = store.id_index[item['id']]
+            if under_id is None or item['id'] == under_id or any(store.ids[node] == under_id for node in _ancestors(store, index)):
+                matches.append(index)
+    return store, matches
+
+
+def _ancestors(store: TreeStore, index: int):
+    index = store.parent[index]
+    while index != NONE:
+        yield index
+        index = store.parent[index]
+
+
+def delete_matching(client, query: TreeQuery, under: str = None):
+    """
+    Finds the matches of a TreeQuery with find_matching and deletes them in batches of 100,
+    e.g. delete_matching(client, TreeQuery(name='.DS_Store'), 'images 3.0'). A match inside a
+    matching folder goes with the folder.
+
+    Returns:
+        dict: file id -> None if deleted, otherwise the HttpError
+    """
+    store, matches = find_matching(client, query, under)
+    chosen = set(matches)
+    doomed = [store.ids[index] for index in matches if not any(parent in chosen for parent in _ancestors(store, index))]
+    return client.delete_many(doomed)
+
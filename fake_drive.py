@@ -0,0 +1,628 @@
+import hashlib
+import json
+import operator
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timezone
+from itertools import count
+from urllib.parse import urlparse, parse_qs
+
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import build_http
+
+FOLDER_MIMETYPE = 'application/vnd.google-apps.folder'
+PNG_MIMETYPE = 'image/png'
+DRIVE_PATH = '/drive/v3/'
+UPLOAD_PATH = '/upload/drive/v3/'
+BATCH_PATH = '/batch/drive/v3'
+FOLDER_TIME = '2024-01-01T00:00:00.000Z'  # modifiedTime of the synthetic folders, each image's is its date
+
+
+def synthetic_images_tree(root_name: str = 'images 3.0', types=('currents', 'tides'), locations: int = 10,
+                          speeds=tuple(s * d for d in (-1, 1) for s in range(3, 11)), images: int = 427, id_prefix: str = 'id'):
+    """
+    Generates a flat list of Drive items shaped like the 'images 3.0' tree:
+    <root>/<type>/<location>/<signed speed>/<location speed yy mm dd>.png
+    Ids are id_prefix and a counter, give trees that share a FakeDrive different prefixes.
+
+    Returns:
+        list: Drive item dictionaries (id, name, mimeType, parents, size, modifiedTime), root folder first.
+    """
+    return list(iter_synthetic_images(root_name, types, locations, speeds, images, id_prefix))
+
+
+def iter_synthetic_images(root_name: str = 'images 3.0', types=('currents', 'tides'), locations: int = 10,
+                          speeds=tuple(s * d for d in (-1, 1) for s in range(3, 11)), images: int = 427, id_prefix: str = 'id'):
+    """ synthetic_images_tree one item at a time, parents before children, for trees too big to list. """
+    ids = count()
+
+    def item(name, parent, mimetype=FOLDER_MIMETYPE, size=None, modified=FOLDER_TIME):
+        item = {'id': f'{id_prefix}{next(ids):07d}', 'name': name, 'mimeType': mimetype, 'parents': [parent], 'modifiedTime': modified}
+        if size is not None:
+            item['size'] = str(size)
+        return item
+
+    root = item(root_name, 'root')
+    yield root
+    for type_name in types:
+        type_folder = item(type_name, root['id'])
+        yield type_folder
+        for loc in range(locations):
+            loc_name = f'loc{loc:03d}'
+            loc_folder = item(loc_name, type_folder['id'])
+            yield loc_folder
+            for speed in speeds:
+                speed_folder = item(str(speed), loc_folder['id'])
+                yield speed_folder
+                for day in range(images):
+                    yy, mm, dd = 24 + day // 336, 1 + (day // 28) % 12, 1 + day % 28
+                    yield item(f'{loc_name} {speed} {yy} {mm} {dd}.png', speed_folder['id'], PNG_MIMETYPE, 40000 + (day * 7919) % 20000,
+                               f'20{yy}-{mm:02d}-{dd:02d}T12:00:00.000Z')
+
+
+class FakeDrive:
+    """
+    A local stand-in for the Drive v3 files endpoints, served over HTTP so the real
+    googleapiclient code paths can be exercised without credentials.
+
+    Args:
+        items: Drive item dictionaries (id, name, mimeType, parents, size).
+        latency: seconds added to every request, to model the round-trip to Google.
+        max_page_size: cap on pageSize, the real API caps files.list at 1000.
+        jitter: up to this many more seconds, at random, added to each request's latency.
+        quota: calls (batch parts included) allowed per quota_window seconds; the rest are
+            answered 403 userRateLimitExceeded, like Drive's per-user limit. None for no limit.
+        error_rate: the fraction of calls answered with a server error from error_statuses.
+        seed: seeds jitter and error_rate, so runs are repeatable.
+
+    Set fail_next to answer that many upcoming calls (or batch parts) with 429 rateLimitExceeded,
+    and retry_after to send a Retry-After header (in seconds) with them. rejected counts the
+    calls turned away by any of these.
+    File content is kept for uploads; for seeded items it is synthesized from the id and size.
+    Resumable upload sessions live in sessions until their last byte arrives.
+    add_shared_drive seeds a shared drive. Its items carry a driveId and, as in Drive, are only
+    listed with includeItemsFromAllDrives (corpora=drive and driveId for just that drive) and
+    only found by id with supportsAllDrives.
+    """
+
+    def __init__(self, items=(), latency: float = 0.0, max_page_size: int = 1000, jitter: float = 0.0,
+                 quota: int = None, quota_window: float = 60.0, error_rate: float = 0.0,
+                 error_statuses=(500, 502, 503), seed: int = None):
+        self.items = {item['id']: dict(item, trashed=item.get('trashed', False)) for item in items}
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.jitter = jitter
+        self.quota = quota
+        self.quota_window = quota_window
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.request_count = 0
+        self.rejected = 0
+        self.change_log = []
+        self.fail_next = 0
+        self.retry_after = None
+        self.contents = {}
+        self.sessions = {}
+        self.drives = {}
+        self._ids = count()
+        self._random = random.Random(seed)
+        self._window_start = time.monotonic()
+        self._window_calls = 0
+        self._by_parent = None
+        self._listing = None  # (query key, matches) of the last files.list, so paging through it does not rescan items
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        handler = type('FakeDriveHandler', (_Handler,), {'drive': self})
+        self._server = _Server(('127.0.0.1', 0), handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def service(self):
+        """ A googleapiclient Drive service for this server, call once per thread. """
+        return fake_service(self.url)
+
+    def content(self, file_id: str, start: int = 0, end: int = None):
+        """ The bytes [start, end) of a file, synthesized for seeded items without building the whole file. """
+        content = self.contents.get(file_id)
+        if content is not None:
+            return content[start:end]
+        size = int(self.items[file_id].get('size', 0))
+        end = size if end is None else min(end, size)
+        if start >= end:
+            return b''
+        pattern = file_id.encode() + b'|'
+        offset = start % len(pattern)
+        return (pattern * ((offset + end - start) // len(pattern) + 1))[offset:offset + end - start]
+
+    def add_shared_drive(self, drive_id: str, name: str, items=()):
+        """ Seeds a shared drive; items whose parent is 'root' go at its top level. """
+        self.drives[drive_id] = name
+        for item in items:
+            parents = [drive_id if parent == 'root' else parent for parent in item.get('parents', [])]
+            self.items[item['id']] = dict(item, parents=parents, driveId=drive_id, trashed=item.get('trashed', False))
+            self._index(self.items[item['id']])
+
+    # scripted changes, each is recorded in the changes feed
+
+    def add(self, item: dict):
+        self._unindex(self.items.get(item['id']))
+        self.items[item['id']] = dict(item, trashed=item.get('trashed', False))
+        self._index(self.items[item['id']])
+        self._changed(item['id'])
+
+    def update(self, file_id: str, **fields):
+        item = self.items[file_id]
+        if 'parents' in fields:
+            self._unindex(item)
+        item.update(fields)
+        if 'parents' in fields:
+            self._index(item)
+        self._changed(file_id)
+
+    def trash(self, file_id: str):
+        self.update(file_id, trashed=True)
+
+    def remove(self, file_id: str):
+        self._unindex(self.items.pop(file_id))
+        self._changed(file_id)
+
+    def _changed(self, file_id: str):
+        self.change_log.append(file_id)
+
+    # the parent -> children index is built on first use and kept up to date from then on
+
+    def _index(self, item: dict):
+        if self._by_parent is not None:
+            for parent in item.get('parents', []):
+                self._by_parent.setdefault(parent, {})[item['id']] = item
+
+    def _unindex(self, item: dict):
+        if self._by_parent is not None and item is not None:
+            for parent in item.get('parents', []):
+                self._by_parent.get(parent, {}).pop(item['id'], None)
+
+    # request handling
+
+    def route(self, method: str, path: str, body: bytes = b'', headers=None):
+        """
+        Dispatches one Drive call, either a plain HTTP request or one part of a batch.
+
+        Args:
+            headers: the request headers, anything with a case-insensitive get().
+
+        Returns:
+            tuple: (HTTP status, JSON-able response body, or bytes for media, or None)
+        """
+        headers = headers or {}
+        url = urlparse(path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        with self._lock:
+            rejection = self._rejection()
+            if rejection is not None:
+                self.rejected += 1
+                return rejection
+            if url.path.startswith(UPLOAD_PATH):
+                return self.upload(method, url.path[len(UPLOAD_PATH):], params, headers, body)
+            path = url.path[len(DRIVE_PATH):] if url.path.startswith(DRIVE_PATH) else url.path
+            if method == 'GET' and path == 'changes/startPageToken':
+                return self.start_page_token()
+            if method == 'GET' and path == 'changes':
+                return self.list_changes(params)
+            if method == 'GET' and path == 'files':
+                return self.list_files(params)
+            if method == 'POST' and path == 'files':
+                return self.create_file(params, json.loads(body or b'{}'))
+            if method == 'GET' and path == 'drives':
+                return 200, {'kind': 'drive#driveList', 'drives': [{'id': key, 'name': value} for key, value in self.drives.items()]}
+            if method == 'GET' and path.startswith('drives/'):
+                drive_id = path[len('drives/'):]
+                if drive_id not in self.drives:
+                    return _error(404, 'notFound', f'Shared drive not found: {drive_id}')
+                return 200, {'kind': 'drive#drive', 'id': drive_id, 'name': self.drives[drive_id]}
+            if path.startswith('files/'):
+                file_id = path[len('files/'):]
+                if 'driveId' in self.items.get(file_id, {}) and params.get('supportsAllDrives') != 'true':
+                    return _error(404, 'notFound', f'File not found: {file_id}.')
+                if method == 'GET' and params.get('alt') == 'media':
+                    return self.get_media(file_id, headers.get('Range'))
+                if method == 'GET':
+                    return self.get_file(file_id, params)
+                if method == 'PATCH':
+                    return self.update_file(file_id, params, json.loads(body or b'{}'))
+                if method == 'DELETE':
+                    return self.delete_file(file_id)
+            return _error(404, 'notFound', f'Unknown path: {method} {url.path}')
+
+    def _rejection(self):
+        """ The error for a call that fail_next, the quota or error_rate turns away, or None. """
+        if self.fail_next:
+            self.fail_next -= 1
+            status, error = _error(429, 'rateLimitExceeded', 'Rate Limit Exceeded')
+            if self.retry_after is None:
+                return status, error
+            return status, _Raw(json.dumps(error).encode(), {'Retry-After': str(self.retry_after)}, 'application/json; charset=UTF-8')
+        if self.quota is not None:
+            now = time.monotonic()
+            if now - self._window_start >= self.quota_window:
+                self._window_start, self._window_calls = now, 0
+            self._window_calls += 1
+            if self._window_calls > self.quota:
+                return _error(403, 'userRateLimitExceeded', 'User Rate Limit Exceeded')
+        if self.error_rate and self._random.random() < self.error_rate:
+            status = self._random.choice(self.error_statuses)
+            return _error(status, 'backendError', HTTPStatus(status).phrase)
+        return None
+
+    def batch(self, content_type: str, body: bytes):
+        """
+        Answers a multipart/mixed batch request part by part, the way googleapiclient's
+        BatchHttpRequest expects: one application/http response per Content-ID.
+        """
+        message = BytesParser(policy=HTTP).parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+        boundary = f'batch_{uuid.uuid4().hex}'
+        parts = []
+        for part in message.iter_parts():
+            request = part.get_payload(decode=True).decode()
+            head, _, part_body = request.replace('\r\n', '\n').partition('\n\n')
+            method, path, _ = head.split('\n', 1)[0].split(' ', 2)
+            status, response = self.route(method, path, part_body.encode())
+            data = response.decode() if isinstance(response, bytes) else json.dumps(response) if response is not None else ''
+            content_id = part['Content-ID']
+            parts.append(f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id[1:]}\r\n\r\n'
+                         f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json; charset=UTF-8\r\n'
+                         f'Content-Length: {len(data)}\r\n\r\n{data}\r\n')
+        parts.append(f'--{boundary}--\r\n')
+        return ''.join(parts).encode(), f'multipart/mixed; boundary={boundary}'
+
+    def create_file(self, params: dict, body: dict, content: bytes = None):
+        file_id = f'new{next(self._ids):07d}'
+        item = {'id': file_id, 'name': body.get('name', 'Untitled'), 'parents': body.get('parents', ['root']),
+                'mimeType': body.get('mimeType', 'application/octet-stream'), 'modifiedTime': _now()}
+        parent_id = item['parents'][0]
+        drive_id = parent_id if parent_id in self.drives else self.items.get(parent_id, {}).get('driveId')
+        if drive_id is not None:
+            if params.get('supportsAllDrives') != 'true':
+                return _error(404, 'notFound', f'File not found: {parent_id}.')
+            item['driveId'] = drive_id
+        if content is not None:
+            item.update(size=str(len(content)), md5Checksum=hashlib.md5(content).hexdigest())
+            self.contents[file_id] = content
+        self.add(item)
+        return 200, _select(self.items[file_id], _fields(params.get('fields')) or {'id', 'name', 'mimeType'})
+
+    def upload(self, method: str, path: str, params: dict, headers, body: bytes):
+        """
+        uploadType=multipart (related metadata and media parts), uploadType=media, or
+        uploadType=resumable: a POST or PATCH with the metadata opens a session at the returned
+        Location, PUTs to it carry Content-Range chunks and are answered 308 with the Range
+        received so far, until the last chunk creates or updates the file.
+        """
+        if params.get('uploadType') == 'resumable':
+            if method == 'PUT':
+                return self.upload_chunk(params.get('upload_id'), headers.get('Content-Range', ''), body)
+            upload_id = uuid.uuid4().hex
+            self.sessions[upload_id] = {'method': method, 'path': path, 'params': params, 'data': bytearray(),
+                                        'metadata': json.loads(body or b'{}')}
+            if 'X-Upload-Content-Type' in headers:
+                self.sessions[upload_id]['metadata'].setdefault('mimeType', headers['X-Upload-Content-Type'])
+            location = f'{self.url}{UPLOAD_PATH}{path}?uploadType=resumable&upload_id={upload_id}'
+            return 200, _Raw(b'', {'Location': location})
+        metadata, content = {}, body
+        content_type = headers.get('Content-Type', 'application/json')
+        if params.get('uploadType') == 'multipart':
+            message = BytesParser(policy=HTTP).parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+            meta_part, media_part = list(message.iter_parts())
+            metadata = json.loads(meta_part.get_payload(decode=True) or b'{}')
+            content = media_part.get_payload(decode=True)
+            metadata.setdefault('mimeType', media_part.get_content_type())
+        return self.store_upload(method, path, params, metadata, content)
+
+    def store_upload(self, method: str, path: str, params: dict, metadata: dict, content: bytes):
+        if method == 'POST' and path == 'files':
+            return self.create_file(params, metadata, content)
+        if method == 'PATCH' and path.startswith('files/'):
+            file_id = path[len('files/'):]
+            if file_id not in self.items:
+                return _error(404, 'notFound', f'File not found: {file_id}.')
+            self.contents[file_id] = content
+            metadata.update(size=str(len(content)), md5Checksum=hashlib.md5(content).hexdigest())
+            return self.update_file(file_id, params, metadata)
+        return _error(404, 'notFound', f'Unknown upload path: {method} {path}')
+
+    def upload_chunk(self, upload_id: str, content_range: str, body: bytes):
+        session = self.sessions.get(upload_id)
+        if session is None:
+            return _error(404, 'notFound', f'No upload session {upload_id}.')
+        span, _, total = content_range.partition(' ')[2].partition('/')
+        data = session['data']
+        if span != '*' and int(span.partition('-')[0]) == len(data):
+            data += body
+        if total != '*' and len(data) == int(total):
+            del self.sessions[upload_id]
+            return self.store_upload(session['method'], session['path'], session['params'], session['metadata'], bytes(data))
+        return 308, _Raw(b'', {'Range': f'bytes=0-{len(data) - 1}'} if data else {})
+
+    def get_media(self, file_id: str, range_header: str = None):
+        """ The file content, or with a 'bytes=<first>-[<last>]' Range header a 206 with that slice. """
+        if file_id not in self.items:
+            return _error(404, 'notFound', f'File not found: {file_id}.')
+        if range_header is None:
+            return 200, self.content(file_id)
+        size = int(self.items[file_id].get('size') or len(self.contents.get(file_id, b'')))
+        first, _, last = range_header.partition('=')[2].partition('-')
+        first, last = int(first), min(int(last) if last else size - 1, size - 1)
+        if first >= size:
+            return 416, _Raw(b'', {'Content-Range': f'bytes */{size}'})
+        return 206, _Raw(self.content(file_id, first, last + 1), {'Content-Range': f'bytes {first}-{last}/{size}'})
+
+    def update_file(self, file_id: str, params: dict, body: dict):
+        item = self.items.get(file_id)
+        if item is None:
+            return _error(404, 'notFound', f'File not found: {file_id}.')
+        parents = [p for p in item.get('parents', []) if p not in params.get('removeParents', '').split(',')]
+        parents += [p for p in params.get('addParents', '').split(',') if p]
+        self.update(file_id, parents=parents, modifiedTime=_now(), **body)
+        return 200, _select(item, _fields(params.get('fields')) or {'id', 'name', 'mimeType'})
+
+    def delete_file(self, file_id: str):
+        if file_id not in self.items:
+            return _error(404, 'notFound', f'File not found: {file_id}.')
+        subtree = [file_id]
+        for current in subtree:
+            subtree.extend(child['id'] for child in self._children(current))
+        for current in subtree:
+            self.remove(current)
+        return 204, None
+
+    def list_files(self, params: dict):
+        parent, predicate = _parse_query(params.get('q', ''))
+        shared = params.get('includeItemsFromAllDrives') == 'true'
+        drive_id = params.get('driveId') if params.get('corpora') == 'drive' else None
+        if drive_id is not None and not (shared and params.get('supportsAllDrives') == 'true'):
+            return _error(403, 'teamDrivesParameterRequired', 'includeItemsFromAllDrives and supportsAllDrives must be true with driveId')
+        key = (params.get('q', ''), shared, drive_id, len(self.change_log), len(self.items))
+        if self._listing is not None and self._listing[0] == key:
+            matches = self._listing[1]
+        else:
+            candidates = self.items.values() if parent is None else self._children(parent)
+            matches = [item for item in candidates if predicate(item)
+                       and ('driveId' not in item if not shared else drive_id is None or item.get('driveId') == drive_id)]
+            self._listing = key, matches
+        page_size = min(int(params.get('pageSize', 100)), self.max_page_size)
+        start = int(params.get('pageToken', 0))
+        fields = _file_fields(params.get('fields'))
+        body = {'files': [_with_md5(self, item, fields) for item in matches[start:start + page_size]]}
+        if start + page_size < len(matches):
+            body['nextPageToken'] = str(start + page_size)
+        return 200, body
+
+    def _children(self, parent_id: str):
+        if self._by_parent is None:
+            self._by_parent = {}
+            for item in self.items.values():
+                self._index(item)
+        return list(self._by_parent.get(parent_id, {}).values())
+
+    def start_page_token(self):
+        return 200, {'kind': 'drive#startPageToken', 'startPageToken': str(len(self.change_log))}
+
+    def list_changes(self, params: dict):
+        start = int(params['pageToken'])
+        page_size = min(int(params.get('pageSize', 100)), self.max_page_size)
+        changes = []
+        for file_id in self.change_log[start:start + page_size]:
+            item = self.items.get(file_id)
+            change = {'kind': 'drive#change', 'changeType': 'file', 'fileId': file_id, 'removed': item is None}
+            if item is not None:
+                change['file'] = dict(item)
+            changes.append(change)
+        body = {'kind': 'drive#changeList', 'changes': changes}
+        if start + page_size < len(self.change_log):
+            body['nextPageToken'] = str(start + page_size)
+        else:
+            body['newStartPageToken'] = str(len(self.change_log))
+        return 200, body
+
+    def get_file(self, file_id: str, params: dict):
+        item = self.items.get(file_id)
+        if item is None and file_id == 'root':
+            item = {'id': 'root', 'name': 'My Drive', 'mimeType': FOLDER_MIMETYPE}
+        if item is None:
+            return _error(404, 'notFound', f'File not found: {file_id}.')
+        return 200, _with_md5(self, item, _fields(params.get('fields')))
+
+
+def fake_service(url: str):
+    """
+    Builds a googleapiclient Drive service pointed at a FakeDrive url, from the bundled discovery
+    document with its rootUrl replaced so plain, upload and batch URLs all go there.
+    Also usable from another process, e.g. to measure a client's memory without the server's.
+    """
+    document = json.loads(get_static_doc('drive', 'v3'))
+    document['rootUrl'] = url + '/'
+    return build_from_document(document, http=build_http())
+
+
+class _Raw(bytes):
+    """ A response body sent as it is, with extra response headers (Content-Range, Location, Range, Retry-After). """
+
+    def __new__(cls, data: bytes, headers: dict, content_type: str = 'application/octet-stream'):
+        raw = super().__new__(cls, data)
+        raw.headers = headers
+        raw.content_type = content_type
+        return raw
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default of 5 drops concurrent connects into a 1s SYN retry
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # a client that went away, e.g. a killed benchmark run
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    drive = None
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self):
+        drive = self.drive
+        with drive._lock:
+            drive.request_count += 1
+        delay = drive.latency + (drive._random.uniform(0, drive.jitter) if drive.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.startswith(BATCH_PATH):
+            data, content_type = drive.batch(self.headers['Content-Type'], body)
+            self._send(200, data, content_type)
+        else:
+            status, response = drive.route(self.command, self.path, body, self.headers)
+            if isinstance(response, _Raw):
+                self._send(status, response, response.content_type, response.headers)
+            elif isinstance(response, bytes):
+                self._send(status, response, 'application/octet-stream')
+            else:
+                self._send(status, json.dumps(response).encode() if response is not None else b'')
+
+    def _send(self, status: int, data: bytes, content_type: str = 'application/json; charset=UTF-8', headers: dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _handle
+
+
+def _now():
+    """ The current time as Drive writes modifiedTime. """
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _error(status: int, reason: str, message: str):
+    return status, {'error': {'code': status, 'message': message, 'errors': [{'reason': reason, 'message': message}]}}
+
+
+def _fields(fields: str):
+    return None if not fields else {f.strip() for f in fields.split(',')}
+
+
+def _file_fields(fields: str):
+    match = re.search(r'files\(([^)]*)\)', fields or '')
+    return _fields(match.group(1)) if match else None
+
+
+def _select(item: dict, fields):
+    return {k: v for k, v in item.items() if k != 'trashed' and (fields is None or k in fields)}
+
+
+def _with_md5(drive, item: dict, fields):
+    """ Seeded files get their md5Checksum computed from the synthesized content when it is asked for. """
+    if fields is not None and 'md5Checksum' in fields and 'size' in item and 'md5Checksum' not in item:
+        item['md5Checksum'] = hashlib.md5(drive.content(item['id'])).hexdigest()
+    return _select(item, fields)
+
+
+_STRING = r"'(?:[^'\\]|\\.)*'"
+_CLAUSE = re.compile(rf"^\s*(?:(?P<parent>{_STRING}) in parents|"
+                     rf"(?P<field>\w+)\s*(?P<op>!=|<=|>=|=|<|>|contains)\s*(?P<value>{_STRING}|true|false))\s*$")
+_COMPARISONS = {'=': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+
+def _clauses(q: str):
+    """ q split at its top-level 'and's; quoted strings, escaped quotes and all, are kept whole. """
+    clauses = ['']
+    for number, part in enumerate(re.split(f'({_STRING})', q)):
+        pieces = [part] if number % 2 else re.split(r'\s+and\s+', part)
+        clauses[-1] += pieces[0]
+        clauses.extend(pieces[1:])
+    return [clause for clause in clauses if clause.strip()]
+
+
+def _unquote(value: str):
+    return re.sub(r'\\(.)', r'\1', value[1:-1])
+
+
+def _timestamp(value: str):
+    """ An RFC 3339 time as an aware datetime, UTC when it has no offset, as Drive reads them. """
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _test(field: str, op: str, value):
+    """
+    A predicate for one 'field op value' clause. name contains matches words starting with
+    value, ignoring case, like Drive's; other fields contain value anywhere. Fields ending in
+    Time compare as times, missing fields never match an ordering or contains.
+    """
+    if op == 'contains':
+        if field == 'name':
+            pattern = re.compile(rf'(?:^|\W){re.escape(value)}', re.IGNORECASE)
+            return lambda item: pattern.search(item.get(field, '')) is not None
+        return lambda item: value in item.get(field, '')
+    compare = _COMPARISONS[op]
+    if op in ('=', '!='):
+        return lambda item: compare(item.get(field), value)
+    if field.endswith('Time'):
+        moment = _timestamp(value)
+        return lambda item: field in item and compare(_timestamp(item[field]), moment)
+    return lambda item: field in item and compare(item[field], value)
+
+
+def _parse_query(q: str):
+    """
+    Parses the subset of the Drive query language used by this project: clauses joined by 'and',
+    each "'<id>' in parents" or a field compared with =, !=, <, <=, >, >= or contains.
+
+    Returns:
+        tuple: (the parent id from an "'<id>' in parents" clause or None, a predicate over items)
+    """
+    parent = None
+    tests = []
+    for clause in _clauses(q):
+        match = _CLAUSE.match(clause)
+        if match is None:
+            raise ValueError(f'unsupported query clause: {clause}')
+        if match['parent'] is not None:
+            parent_id = _unquote(match['parent'])
+            parent = parent_id if parent is None else parent
+            tests.append(lambda item, p=parent_id: p in item.get('parents', []))
+            continue
+        value = match['value']
+        value = _unquote(value) if value.startswith("'") else value == 'true'
+        tests.append(_test(match['field'], match['op'], value))
+    return parent, lambda item: all(test(item) for test in tests)
@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+import time
+
+TTL = 24 * 60 * 60  # seconds an entry is trusted after it was fetched
+MAX_ENTRIES = 100_000
+EVICT_EVERY = 1000  # puts between size checks
+
+
+class IdCache:
+    """
+    A persistent (parent id, name) -> (id, mimeType) map in SQLite, so names and paths resolve
+    without a files().list call per component. Entries expire ttl seconds after they were
+    fetched, and beyond max_entries the least recently used are evicted.
+
+    DriveClient keeps it in step with its own creates, renames, moves and deletes; changes made
+    anywhere else are picked up once the entries involved expire.
+
+    Args:
+        path: the database file, e.g. google_drive.ids.sqlite next to google_drive.json, or ':memory:'.
+        ttl: seconds before an entry has to be fetched again.
+        max_entries: the size the cache is trimmed back to.
+    """
+
+    def __init__(self, path=':memory:', ttl: float = TTL, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS entries (parent_id TEXT NOT NULL, name TEXT NOT NULL, '
+                         'file_id TEXT NOT NULL, mime_type TEXT, fetched REAL NOT NULL, used REAL NOT NULL, '
+                         'PRIMARY KEY (parent_id, name))')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_file_id ON entries (file_id)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_parent_id ON entries (parent_id)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+        with self._lock:
+            self._evict()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def get(self, parent_id: str, name: str):
+        """
+        Returns:
+            tuple: (id, mimeType) of the item called name in parent_id, or None if unknown or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT file_id, mime_type, fetched FROM entries WHERE parent_id = ? AND name = ?',
+                                   (parent_id, name)).fetchone()
+            if row is not None and now - row[2] > self.ttl:
+                self._db.execute('DELETE FROM entries WHERE parent_id = ? AND name = ?', (parent_id, name))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute('UPDATE entries SET used = ? WHERE parent_id = ? AND name = ?', (now, parent_id, name))
+            self.hits += 1
+            return row[0], row[1]
+
+    def put(self, parent_id: str, name: str, file_id: str, mime_type: str = None):
+        now = time.time()
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                             (parent_id, name, file_id, mime_type, now, now))
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict()
+
+    def invalidate(self, file_id: str, children: bool = False):
+        """ Forgets where file_id is, e.g. after a rename or move, and with children, what is in it (after a delete). """
+        with self._lock:
+            self._db.execute('DELETE FROM entries WHERE file_id = ?', (file_id,))
+            if children:
+                self._db.execute('DELETE FROM entries WHERE parent_id = ?', (file_id,))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM entries')
+
+    def close(self):
+        self._db.close()
+
+    def _evict(self):
+        excess = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._db.execute('DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY used LIMIT ?)', (excess,))
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import mimetypes
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from tree_store import TreeStore
+
+DEFAULT_MIMETYPE = 'application/octet-stream'
+CHUNK_SIZE = 1 << 20
+HASH_BATCH = 64  # files per process pool task, to keep pickling overhead down
+_MIMETYPES = {}
+
+
+def guess_mimetype(name: str):
+    """ mimetypes.guess_type, memoized by extension since a mirror holds few distinct ones. """
+    extension = os.path.splitext(name)[1].lower()
+    mimetype = _MIMETYPES.get(extension)
+    if mimetype is None:
+        mimetype = _MIMETYPES[extension] = mimetypes.guess_type(name)[0] or DEFAULT_MIMETYPE
+    return mimetype
+
+
+def list_directory(path: str):
+    """
+    Returns:
+        list: (name, is_dir, size, inode, mtime_ns) for each entry, symlinks are not followed.
+    """
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if not is_dir and not entry.is_file(follow_symlinks=False):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            entries.append((entry.name, is_dir, stat.st_size, stat.st_ino, stat.st_mtime_ns))
+    return entries
+
+
+def md5_files(paths: list):
+    """ MD5 hex digests, as Drive reports them in md5Checksum. Runs in a worker process. """
+    digests = []
+    for path in paths:
+        digest = hashlib.md5()
+        with open(path, 'rb') as f:
+            while chunk := f.read(CHUNK_SIZE):
+                digest.update(chunk)
+        digests.append(digest.hexdigest())
+    return digests
+
+
+class HashCache:
+    """
+    MD5s keyed by (inode, size, mtime), saved as JSON, so a rescan only hashes files that changed.
+
+    Args:
+        path: the cache file, e.g. files.hashes.json next to files.json.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.hashes = json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    @staticmethod
+    def key(inode: int, size: int, mtime_ns: int):
+        return f'{inode}:{size}:{mtime_ns}'
+
+    def get(self, key: str):
+        return self.hashes.get(key)
+
+    def update(self, hashes: dict):
+        self.hashes.update(hashes)
+
+    def prune(self, keys):
+        """ Drops entries for files that no longer exist in this form. """
+        self.hashes = {k: v for k, v in self.hashes.items() if k in keys}
+
+    def write(self):
+        self.path.write_text(json.dumps(self.hashes))
+
+
+def scan_tree(start_path, workers: int = 16, checksums: bool = False, hash_cache: HashCache = None, hash_workers: int = None):
+    """
+    Scans a local folder into a TreeStore with a thread pool of os.scandir calls. A directory's
+    subdirectories are queued as soon as it is listed, so there is no per-level barrier.
+    Item ids are paths from the start folder's name, the same as TreeStore.path().
+
+    Args:
+        start_path: the folder to scan.
+        workers: the number of directories listed at once.
+        checksums: compute md5Checksum for every file, in a process pool.
+        hash_cache: reuse and record MD5s by (inode, size, mtime).
+        hash_workers: process pool size, os.cpu_count() by default.
+    """
+    start_path = os.path.abspath(start_path)
+    root_name = os.path.basename(start_path)
+    store = TreeStore()
+    store.add(root_name, root_name)
+    files = []  # (index, folder path, cache key)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(list_directory, start_path): (start_path, root_name)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                folder_path, folder_id = pending.pop(future)
+                try:
+                    entries = future.result()
+                except OSError as error:
+                    print(f'An error occurred while scanning {folder_path}: {error}')
+                    continue
+                for name, is_dir, size, inode, mtime_ns in entries:
+                    file_id = f'{folder_id}/{name}'
+                    if is_dir:
+                        store.add(file_id, name, folder_id)
+                        full_path = os.path.join(folder_path, name)
+                        pending[pool.submit(list_directory, full_path)] = (full_path, file_id)
+                    elif checksums:
+                        index = store.add(file_id, name, folder_id, guess_mimetype(name), size)
+                        files.append((index, folder_path, HashCache.key(inode, size, mtime_ns)))
+                    else:
+                        store.add(file_id, name, folder_id, guess_mimetype(name), size)
+
+    if checksums:
+        add_checksums(store, files, hash_cache, hash_workers)
+    return store
+
+
+def add_checksums(store: TreeStore, files: list, hash_cache: HashCache = None, hash_workers: int = None):
+    """ Fills store.md5 for files, hashing in a process pool only what the cache does not know. """
+    missing = []
+    for index, folder_path, key in files:
+        md5 = hash_cache.get(key) if hash_cache is not None else None
+        if md5 is None:
+            missing.append((index, os.path.join(folder_path, store.names[store.name[index]]), key))
+        else:
+            store.md5[index] = md5
+    print(f'hashing {len(missing)} of {len(files)} files')
+
+    if missing:
+        batches = [missing[i:i + HASH_BATCH] for i in range(0, len(missing), HASH_BATCH)]
+        with ProcessPoolExecutor(max_workers=hash_workers) as pool:
+            for batch, digests in zip(batches, pool.map(md5_files, [[f[1] for f in batch] for batch in batches])):
+                for (index, _, key), md5 in zip(batch, digests):
+                    store.md5[index] = md5
+                    if hash_cache is not None:
+                        hash_cache.update({key: md5})
+
+    if hash_cache is not None:
+        hash_cache.prune({key for _, _, key in files})
+        hash_cache.write()
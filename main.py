@@ -1,8 +1,12 @@
+import argparse
+import cProfile
+import pstats
 from pathlib import Path
-from tt_file_tools.file_tools import GoogleDriveTree, OSFileTree
-import os
 
-from tt_google_drive.google_drive import GoogleDrive
+from drive_client import DriveClient
+from metrics import METRICS
+from tree_refresh import load_tree
+from tree_store import TreeStore
 
 # Define the scopes required for Google Drive API access.
 # 'https://www.googleapis.com/auth/drive' gives full access to Google Drive.
@@ -19,34 +23,33 @@ FILE_MIMETYPE = 'application/vnd.google-apps.file'
 IMAGES_FOLDER = 'images 3.0'
 FILES_FOLDER = '/users/jason/fair currents/find_test'
 GOOGLE_URLS_CSV = 'google_urls.csv'
+PROFILE_FUNCTIONS = 20  # the slowest functions --profile lists
 
 
-if __name__ == '__main__':
+def main(client: DriveClient = None):
+    """
+    Loads the images tree and deletes the .DS_Store files in it. Every Drive call goes through
+    client's RequestScheduler, so metrics.METRICS records them.
 
-    # # build dictionary
-    # if os.path.exists(DRIVE_JSON):
-    #     drive_tree = GoogleDriveTree(json_source=DRIVE_JSON)
-    # else:
-    #     drive_tree = GoogleDriveTree(start_path=IMAGES_FOLDER)
-    #     drive_tree.write(DRIVE_JSON)
+    Args:
+        client: a DriveClient, one reading token.json if None.
+    """
+    client = DriveClient.from_token_file() if client is None else client
 
-    # build dictionary
-    if os.path.exists(FILE_JSON):
-        drive_tree = OSFileTree(json_source=FILE_JSON)
-    else:
-        drive_tree = OSFileTree(start_path=FILES_FOLDER)
-        drive_tree.write(FILE_JSON)
+    # build dictionary, or bring the cached one up to date from the changes feed
+    master_dict = load_tree(client, IMAGES_FOLDER, DRIVE_JSON)
 
     # delete .DS_Store files from Mac
     file_name = '.DS_Store'
     print(f'\nchecking for {file_name} files, Mac artifact')
-    keys = drive_tree.find_keys(file_name)
-    for key in keys:
-        drive_tree.drive.delete_file(key[1]['id'])
-        drive_tree.del_key(key[0])
-        drive_tree.drive.delete_file(service, key[0].rsplit('/', 1)[0], key[1]['_id'])
-    #     master_dict.write(DRIVE_JSON)
-    #
+    store = TreeStore.from_master_dict(master_dict)
+    keys = [store.ids[index] for index in store.find(file_name)]
+    if keys:
+        for file_id, error in client.delete_many(keys, master_dict).items():
+            if error is not None:
+                print(f"An error occurred deleting '{file_id}': {error}")
+        master_dict.write(DRIVE_JSON)
+
     # # list locations
     # print(f'locations available on Google Drive')
     # for type in TYPE_DICT.keys():
@@ -116,3 +119,21 @@ if __name__ == '__main__':
     # image_frame['date'] = image_frame['date'].apply(lambda x: f'{x.split('/')[1]}/{x.split('/')[2]}/20{x.split('/')[0]}')
     # image_frame.reset_index(drop=True, inplace=True)
     # image_frame.write(GOOGLE_URLS_CSV)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', action='store_true',
+                        help='print the API call metrics and the slowest functions when done')
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        main()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            print(f'\n{METRICS.summary()}\n')
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(PROFILE_FUNCTIONS)
@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # upper bounds, in seconds
+
+
+class Histogram:
+    """ Counts of observed values per bucket (value <= upper bound), plus their sum and maximum. """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float):
+        """ The upper bound of the bucket holding the q-th quantile, or the maximum for the last bucket. """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {'buckets': list(self.buckets), 'counts': list(self.counts), 'count': self.count, 'sum': self.sum, 'max': self.max}
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms for Drive calls and the code around them. Each metric is a
+    name plus labels, e.g. observe('api_latency_seconds', 0.2, method='drive.files.list').
+    Values are kept in memory; report() sends a snapshot of them to every sink.
+
+    What the client code records:
+        api_calls, api_errors (by status), api_retries, backoff_seconds: counters per method
+        api_latency_seconds: a histogram per method, one observation per attempt
+        queue_wait_seconds: a histogram of the time calls waited for the scheduler
+        queue_depth, in_flight: gauges of calls waiting for and holding a scheduler slot
+        pages_fetched, items_listed: counters per list method
+        bytes_received, bytes_sent: counters of media transferred
+        folders_listed, crawl_frontier: a counter and a gauge for crawls in progress
+
+    Args:
+        sinks: objects with a write(snapshot) method, e.g. LoggingSink, JsonLinesSink, PrometheusSink.
+        interval: seconds between automatic reports, made by whichever thread records next;
+            None to report only when report() is called.
+    """
+
+    def __init__(self, sinks=(), interval: float = None):
+        self.sinks = list(sinks)
+        self.interval = interval
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._next_report = time.monotonic() + interval if interval else None
+
+    @staticmethod
+    def _key(name: str, labels: dict):
+        return name, tuple(sorted(labels.items()))
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._tick()
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+        self._tick()
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+        self._tick()
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """ Observes the seconds the with block took. """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """ Every metric as plain data: {'time', 'counters', 'gauges', 'histograms'}, each a list of {name, labels, value}. """
+        with self._lock:
+            def rows(metrics, value):
+                return [{'name': name, 'labels': dict(labels), 'value': value(metric)} for (name, labels), metric in sorted(metrics.items())]
+            return {'time': time.time(), 'counters': rows(self._counters, lambda v: v), 'gauges': rows(self._gauges, lambda v: v),
+                    'histograms': rows(self._histograms, Histogram.to_dict)}
+
+    def summary(self):
+        return format_summary(self.snapshot())
+
+    def report(self):
+        snapshot = self.snapshot()
+        for sink in self.sinks:
+            sink.write(snapshot)
+
+    def _tick(self):
+        if self._next_report is None or time.monotonic() < self._next_report:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_report:
+                return
+            self._next_report = now + self.interval
+        self.report()
+
+
+def _labels(labels: dict):
+    return ','.join(f'{key}={value}' for key, value in labels.items())
+
+
+def format_summary(snapshot: dict):
+    """ A metrics snapshot as a text table: latency percentiles per method, then counters and gauges. """
+    lines = [f'{"latency":<52} {"calls":>7} {"mean s":>8} {"p50 s":>8} {"p95 s":>8} {"max s":>8}']
+    for row in snapshot['histograms']:
+        histogram = Histogram(row['value']['buckets'])
+        histogram.counts, histogram.count = row['value']['counts'], row['value']['count']
+        histogram.sum, histogram.max = row['value']['sum'], row['value']['max']
+        label = f'{row["name"]} {_labels(row["labels"])}'.strip()
+        lines.append(f'{label:<52} {histogram.count:>7} {histogram.sum / max(histogram.count, 1):>8.3f} '
+                     f'{histogram.quantile(0.5):>8.3f} {histogram.quantile(0.95):>8.3f} {histogram.max:>8.3f}')
+    for kind in ('counters', 'gauges'):
+        for row in snapshot[kind]:
+            label = f'{row["name"]} {_labels(row["labels"])}'.strip()
+            value = row['value']
+            lines.append(f'{label:<52} {value:>16.3f}' if isinstance(value, float) and not value.is_integer() else f'{label:<52} {int(value):>16}')
+    return '\n'.join(lines)
+
+
+class LoggingSink:
+    """ Logs each report as a summary table at level, through logger (the 'drive.metrics' logger by default). """
+
+    def __init__(self, logger=None, level: int = None):
+        import logging
+        self.logger = logger or logging.getLogger('drive.metrics')
+        self.level = logging.INFO if level is None else level
+
+    def write(self, snapshot: dict):
+        self.logger.log(self.level, 'metrics\n%s', format_summary(snapshot))
+
+
+class JsonLinesSink:
+    """ Appends each report to path as one JSON line, for later analysis or comparing runs. """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def write(self, snapshot: dict):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(snapshot) + '\n')
+
+
+class PrometheusSink:
+    """
+    Rewrites path with each report in the Prometheus text format, for node_exporter's textfile
+    collector: counters get a _total suffix, histograms the usual _bucket, _sum and _count series.
+    The file is replaced atomically, so a scrape never sees half of it.
+    """
+
+    def __init__(self, path, prefix: str = 'gdrive_'):
+        self.path = Path(path)
+        self.prefix = prefix
+
+    @staticmethod
+    def _labels(labels: dict, **extra):
+        labels = dict(labels, **extra)
+        if not labels:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+        return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+    def write(self, snapshot: dict):
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        for row in snapshot['counters']:
+            name = f'{self.prefix}{row["name"]}_total'
+            declare(name, 'counter')
+            lines.append(f'{name}{self._labels(row["labels"])} {row["value"]}')
+        for row in snapshot['gauges']:
+            name = f'{self.prefix}{row["name"]}'
+            declare(name, 'gauge')
+            lines.append(f'{name}{self._labels(row["labels"])} {row["value"]}')
+        for row in snapshot['histograms']:
+            name = f'{self.prefix}{row["name"]}'
+            declare(name, 'histogram')
+            histogram = row['value']
+            cumulative = 0
+            for bound, count in zip(histogram['buckets'] + ['+Inf'], histogram['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{self._labels(row["labels"], le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{self._labels(row["labels"])} {histogram["sum"]}')
+            lines.append(f'{name}_count{self._labels(row["labels"])} {histogram["count"]}')
+        temporary = self.path.with_name(self.path.name + '.tmp')
+        temporary.write_text('\n'.join(lines) + '\n')
+        os.replace(temporary, self.path)
+
+
+METRICS = Metrics()  # what a RequestScheduler records to unless it is given its own
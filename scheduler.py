@@ -0,0 +1,293 @@
+import random
+import threading
+import time
+from collections import Counter, deque
+
+from metrics import METRICS
+
+# asyncio, email.utils and googleapiclient are imported where they are used: every client
+# module imports this one, and together they would add tens of milliseconds to startup.
+
+RATE = 200.0  # calls per second, Drive's default quota is 12,000 queries per minute per user
+BURST = 100
+MAX_CONCURRENCY = 100
+MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 32.0
+THROTTLE_STATUSES = {429}
+RETRY_STATUSES = THROTTLE_STATUSES | {500, 502, 503, 504}
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+
+def is_throttle(error):
+    """ A 429, or the 403 Drive sends for rate limits. """
+    status = error.resp.status
+    if status in THROTTLE_STATUSES:
+        return True
+    details = error.error_details if isinstance(error.error_details, list) else []
+    return status == 403 and any(d.get('reason') in RATE_LIMIT_REASONS for d in details if isinstance(d, dict))
+
+
+def is_retryable(error):
+    """ Rate limiting and server errors are worth retrying, anything else will fail the same way again. """
+    return error.resp.status in RETRY_STATUSES or is_throttle(error)
+
+
+def retry_after(error):
+    """ The seconds asked for by a Retry-After header (a number or an HTTP date), or None. """
+    value = error.resp.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            from email.utils import parsedate_to_datetime
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+class RequestScheduler:
+    """
+    Paces and retries Drive calls for every thread, batch and event loop that shares it:
+        token bucket: calls start at `rate` per second on average, with bursts of up to `burst`
+        AIMD concurrency: the number of calls in flight is capped by `limit`, which grows by one
+            after `limit` successes in a row and halves (at most once per second) on a rate limit
+        retries: rate limit and server errors are retried up to max_retries times after a jittered
+            exponential backoff, or the Retry-After the server asked for if that is longer;
+            a Retry-After also holds back every other call for that long. Transport errors (a reset
+            connection, a timeout) are not retried: the call may already have taken effect, so
+            they go straight to the caller
+
+    counters counts calls, throttled, retries, failures and backoff_seconds; stats() adds the
+    current in_flight and limit. metrics gets the same per API method, with the latency of each
+    attempt, the time calls waited to start and the depth of that queue (see metrics.Metrics).
+
+    Drive's quotas are per user and per project: give each account its own scheduler, named so
+    its metrics are labelled account=<name>, and the same parent, whose token bucket every
+    call also draws from. The parent only paces; each account backs off and limits concurrency
+    on its own.
+
+    Args:
+        rate: calls per second.
+        burst: calls that may start at once after an idle spell.
+        max_concurrency: the ceiling (and starting value) of the in-flight limit.
+        min_concurrency: the floor of the in-flight limit.
+        max_retries: how many times a failed call is resent.
+        metrics: a metrics.Metrics to record to, metrics.METRICS if None.
+        name: the account this scheduler paces, for metric labels.
+        parent: a RequestScheduler whose rate also applies, e.g. the project's.
+    """
+
+    def __init__(self, rate: float = RATE, burst: int = BURST, max_concurrency: int = MAX_CONCURRENCY,
+                 min_concurrency: int = 1, max_retries: int = MAX_RETRIES, base_delay: float = BASE_DELAY,
+                 max_delay: float = MAX_DELAY, metrics=None, name: str = None, parent=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.waiting = 0
+        self.counters = Counter()
+        self.metrics = METRICS if metrics is None else metrics
+        self.name = name
+        self.parent = parent
+        self.labels = {'account': name} if name else {}
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        self._successes = 0
+        self._last_cut = 0.0
+        self._lock = threading.Lock()
+        self._slot_free = threading.Condition(self._lock)
+        self._async_waiters = deque()  # (event loop, future) of coroutines waiting for a slot
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, in_flight=self.in_flight, limit=self.limit)
+
+    # pacing
+
+    def _queued(self, change: int):
+        """ Counts calls waiting for a token or a slot, and records that and, as one leaves, in_flight. """
+        with self._lock:
+            self.waiting += change
+            waiting, in_flight = self.waiting, self.in_flight
+        self.metrics.set('queue_depth', waiting, **self.labels)
+        if change < 0:
+            self.metrics.set('in_flight', in_flight, **self.labels)
+
+    def _reserve(self, cost: int = 1):
+        """ Takes cost tokens from the bucket and the parent's, returns the seconds to wait before starting. """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate) - cost
+            self._updated = now
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            wait = max(wait, self._resume_at - now)
+        return wait if self.parent is None else max(wait, self.parent._reserve(cost))
+
+    def _enter(self):
+        with self._lock:
+            while self.in_flight >= self.limit:
+                self._slot_free.wait()
+            self.in_flight += 1
+
+    async def _enter_async(self):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+    def _leave(self):
+        with self._lock:
+            self.in_flight -= 1
+            in_flight = self.in_flight
+            free = self.limit - in_flight
+            self._slot_free.notify(free)
+            while free > 0 and self._async_waiters:
+                loop, future = self._async_waiters.popleft()
+                if not future.done():
+                    loop.call_soon_threadsafe(_wake, future)
+                    free -= 1
+        self.metrics.set('in_flight', in_flight, **self.labels)
+
+    # outcomes
+
+    def _attempted(self, method: str, cost: int, started: float, error=None):
+        """ Records an attempt at a call that started at perf_counter() started. """
+        self.metrics.observe('api_latency_seconds', time.perf_counter() - started, method=method, **self.labels)
+        self.metrics.count('api_calls', cost, method=method, **self.labels)
+        if error is not None:
+            self.metrics.count('api_errors', method=method, status=str(error.resp.status), **self.labels)
+
+    def _succeeded(self):
+        with self._lock:
+            self.counters['calls'] += 1
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_concurrency:
+                self.limit += 1
+                self._successes = 0
+                self._slot_free.notify()
+
+    def retry_delay(self, error, attempt: int, method: str = None):
+        """
+        Records a failed call and decides whether to try it again.
+        method labels the retry and its backoff in metrics.
+
+        Returns:
+            float: the seconds to wait before retry number attempt + 1, or None to give up.
+        """
+        throttled = is_throttle(error)
+        with self._lock:
+            self.counters['calls'] += 1
+            self._successes = 0
+            now = time.monotonic()
+            if throttled:
+                self.counters['throttled'] += 1
+                if now - self._last_cut >= 1.0:
+                    self.limit = max(self.min_concurrency, self.limit // 2)
+                    self._last_cut = now
+            if attempt >= self.max_retries or not is_retryable(error):
+                self.counters['failures'] += 1
+                return None
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            asked = retry_after(error)
+            if asked is not None:
+                delay = max(delay, asked)
+                self._resume_at = max(self._resume_at, now + asked)
+            self.counters['retries'] += 1
+            self.counters['backoff_seconds'] += delay
+        self.metrics.count('api_retries', method=method, **self.labels)
+        self.metrics.count('backoff_seconds', delay, method=method, **self.labels)
+        return delay
+
+    # running calls
+
+    def call(self, function, cost: int = 1, method: str = None):
+        """
+        Runs function() once a token and an in-flight slot are free, retrying rate limit and
+        server errors. cost is the number of API calls it makes, e.g. the size of a batch;
+        method names it in metrics, e.g. 'drive.files.list'.
+
+        Raises:
+            HttpError: the last error, once it is not retryable or the retries are used up.
+        """
+        from googleapiclient.errors import HttpError
+        attempt = 0
+        while True:
+            queued = time.perf_counter()
+            self._queued(1)
+            try:
+                wait = self._reserve(cost)
+                if wait > 0:
+                    time.sleep(wait)
+                self._enter()
+            finally:
+                self._queued(-1)
+            started = time.perf_counter()
+            self.metrics.observe('queue_wait_seconds', started - queued, **self.labels)
+            try:
+                result = function()
+            except HttpError as error:
+                self._attempted(method, cost, started, error)
+                delay = self.retry_delay(error, attempt, method)
+                if delay is None:
+                    raise
+            else:
+                self._attempted(method, cost, started)
+                self._succeeded()
+                return result
+            finally:
+                self._leave()
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, function, cost: int = 1, method: str = None):
+        """ call() for a coroutine function, waiting without blocking the event loop. """
+        import asyncio
+        from googleapiclient.errors import HttpError
+        attempt = 0
+        while True:
+            queued = time.perf_counter()
+            self._queued(1)
+            try:
+                wait = self._reserve(cost)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self._enter_async()
+            finally:
+                self._queued(-1)
+            started = time.perf_counter()
+            self.metrics.observe('queue_wait_seconds', started - queued, **self.labels)
+            try:
+                result = await function()
+            except HttpError as error:
+                self._attempted(method, cost, started, error)
+                delay = self.retry_delay(error, attempt, method)
+                if delay is None:
+                    raise
+            else:
+                self._attempted(method, cost, started)
+                self._succeeded()
+                return result
+            finally:
+                self._leave()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
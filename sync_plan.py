@@ -0,0 +1,237 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.errors import HttpError
+
+from drive_client import ITEM_FIELDS
+from transfers import UploadSessions, upload_files
+from tree_store import NONE, TreeStore
+
+SYNC_FIELDS = f'{ITEM_FIELDS}, parents, md5Checksum'
+
+
+class SyncPlan:
+    """
+    The changes that make a Drive folder match a local one, by relative path:
+        folders: local folders missing on Drive, parents before children
+        creates: local files missing on Drive
+        updates: (path, drive id) of files whose size or md5 differ
+        moves: (drive id, old path, new path) of Drive files whose content turned up at another path
+        deletes: (drive id, path) of Drive items with no local counterpart, topmost only; a
+            folder whose files all move elsewhere is among them, deleted once they are out, and
+            a folder holding Google-native files is kept, with the rest of its contents listed
+    """
+
+    def __init__(self):
+        self.folders = []
+        self.creates = []
+        self.updates = []
+        self.moves = []
+        self.deletes = []
+
+    def __len__(self):
+        return len(self.folders) + len(self.creates) + len(self.updates) + len(self.moves) + len(self.deletes)
+
+    def summary(self):
+        return (f'{len(self.folders)} folders, {len(self.creates)} creates, {len(self.updates)} updates, '
+                f'{len(self.moves)} moves, {len(self.deletes)} deletes')
+
+
+def relative_entries(store: TreeStore, root: int):
+    """
+    Returns:
+        list: (relative path, index) for everything under root, sorted by path; the root itself is ''.
+    """
+    entries = [('', root)]
+    for path, index in entries:
+        prefix = f'{path}/' if path else ''
+        entries.extend((prefix + store.names[store.name[child]], child) for child in store.children(index))
+    entries.sort(key=lambda entry: entry[0].split('/'))
+    return entries
+
+
+def same_content(local: TreeStore, l_index: int, drive: TreeStore, d_index: int):
+    if local.size[l_index] != drive.size[d_index]:
+        return False
+    local_md5, drive_md5 = local.md5.get(l_index), drive.md5.get(d_index)
+    return local_md5 is None or drive_md5 is None or local_md5 == drive_md5
+
+
+def plan_sync(local: TreeStore, drive: TreeStore, local_root: int = None, drive_root: int = None):
+    """
+    Diffs a local tree (scan_tree, ideally with checksums) against a Drive tree in one merge pass
+    over both sides sorted by relative path. Files only on Drive whose size and md5 match a file
+    only present locally become moves instead of a delete plus an upload.
+    Drive items without a size (Google Docs and other native files) are never deleted, nor are
+    the folders holding them, whose other contents are deleted one by one instead.
+    """
+    local_root = local.roots[0] if local_root is None else local_root
+    drive_root = drive.roots[0] if drive_root is None else drive_root
+    local_entries = relative_entries(local, local_root)
+    drive_entries = relative_entries(drive, drive_root)
+    plan = SyncPlan()
+    local_only = []
+    drive_only = []
+
+    i = j = 0
+    while i < len(local_entries) or j < len(drive_entries):
+        l_key = local_entries[i][0].split('/') if i < len(local_entries) else None
+        d_key = drive_entries[j][0].split('/') if j < len(drive_entries) else None
+        if d_key is None or (l_key is not None and l_key < d_key):
+            local_only.append(local_entries[i])
+            i += 1
+        elif l_key is None or d_key < l_key:
+            drive_only.append(drive_entries[j])
+            j += 1
+        else:
+            (path, l_index), (_, d_index) = local_entries[i], drive_entries[j]
+            if local.is_folder(l_index) != drive.is_folder(d_index):
+                local_only.append(local_entries[i])
+                drive_only.append(drive_entries[j])
+            elif not local.is_folder(l_index) and not same_content(local, l_index, drive, d_index):
+                plan.updates.append((path, drive.ids[d_index]))
+            i += 1
+            j += 1
+
+    movable = {}
+    for path, d_index in drive_only:
+        md5 = drive.md5.get(d_index)
+        if md5 is not None:
+            movable.setdefault((drive.size[d_index], md5), []).append((path, d_index))
+    moved = set()
+    for path, l_index in local_only:
+        if local.is_folder(l_index):
+            plan.folders.append(path)
+            continue
+        candidates = movable.get((local.size[l_index], local.md5.get(l_index)))
+        if candidates:
+            old_path, d_index = candidates.pop()
+            moved.add(d_index)
+            plan.moves.append((drive.ids[d_index], old_path, path))
+        else:
+            plan.creates.append(path)
+
+    native = {path for path, d_index in drive_only if not drive.is_folder(d_index) and drive.size[d_index] == NONE}
+    holding = {path.rsplit('/', depth)[0] for path in native for depth in range(1, path.count('/') + 1)}
+    deleted = None
+    for path, d_index in drive_only:
+        if deleted is not None and path.startswith(deleted + '/'):
+            continue
+        if d_index in moved or path in native or path in holding:
+            continue
+        plan.deletes.append((drive.ids[d_index], path))
+        if drive.is_folder(d_index):
+            deleted = path
+    return plan
+
+
+def drive_store(client, folder_name: str):
+    """ The Drive side of a sync with md5Checksum, from one flat listing of the Drive. """
+    folder_id = client.find_folder(folder_name)
+    if folder_id is None:
+        print(f"Folder '{folder_name}' not found at the highest level of your Drive.")
+        return TreeStore()
+    return TreeStore.from_drive_items(client.list_all(SYNC_FIELDS), folder_id)
+
+
+def execute_plan(client, plan: SyncPlan, local_path, drive: TreeStore, drive_root: int = None, workers: int = 8,
+                 sessions: UploadSessions = None):
+    """
+    Carries out a SyncPlan: folders first (one level at a time), then moves, uploads and content
+    updates, then deletes. Moves and deletes go out in batches, large uploads through resumable
+    sessions kept in sessions. drive is kept in step with Drive. A path whose folder could not
+    be created is skipped and reported with that folder's error; a folder being deleted is kept
+    while a file that failed to move out of it is still inside, and reported with the move's error.
+
+    Returns:
+        dict: path or drive id -> HttpError, for every step that failed or was skipped
+    """
+    drive_root = drive.roots[0] if drive_root is None else drive_root
+    folder_ids = {path: drive.ids[index] for path, index in relative_entries(drive, drive_root) if drive.is_folder(index)}
+    errors = {}
+
+    def folder_of(path):
+        return path.rsplit('/', 1)[0] if '/' in path else ''
+
+    def parent_id(path):
+        return folder_ids.get(folder_of(path))
+
+    def placed(paths):
+        """ The paths whose folder exists on Drive; the others are recorded with the error that kept it from being created. """
+        kept = []
+        for path in paths:
+            if parent_id(path) is not None:
+                kept.append(path)
+                continue
+            folder = folder_of(path)
+            while folder and folder not in errors:
+                folder = folder_of(folder)
+            errors[path] = errors.get(folder) or LookupError(f"no Drive folder for '{folder_of(path)}'")
+        return kept
+
+    def run(function, paths):
+        def attempt(path):
+            try:
+                return path, function(path), None
+            except HttpError as error:
+                return path, None, error
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(attempt, placed(paths)))
+
+    by_depth = {}
+    for path in plan.folders:
+        by_depth.setdefault(path.count('/'), []).append(path)
+    for depth in sorted(by_depth):
+        for path, folder, error in run(lambda p: client.create_folder(os.path.basename(p), parent_id(p)), by_depth[depth]):
+            if error is not None:
+                errors[path] = error
+                continue
+            drive.add(folder['id'], folder['name'], parent_id(path))
+            folder_ids[path] = folder['id']
+
+    moves = {}
+    stuck = {}  # drive id -> the error of a move that left the file where it was
+    for file_id, old_path, new_path in plan.moves:
+        if placed([new_path]):
+            moves[file_id] = {'name': os.path.basename(new_path), 'addParents': parent_id(new_path),
+                              'removeParents': parent_id(old_path)}
+        else:
+            stuck[file_id] = errors[new_path]
+    for file_id, error in client.update_many(moves).items():
+        if error is not None:
+            errors[file_id] = stuck[file_id] = error
+            continue
+        item = drive.get(file_id)
+        drive.remove(file_id)
+        drive.add(file_id, moves[file_id]['name'], moves[file_id]['addParents'], item['mimeType'],
+                  item.get('size'), item.get('md5Checksum'))
+
+    creates = {os.path.join(local_path, path): path for path in placed(plan.creates)}
+    _, upload_errors = upload_files(client, [(file_path, parent_id(path)) for file_path, path in creates.items()],
+                                    drive, sessions, workers, SYNC_FIELDS)
+    errors.update((creates[file_path], error) for file_path, error in upload_errors.items())
+
+    updates = dict(plan.updates)
+    for path, file, error in run(lambda p: client.update_content(updates[p], os.path.join(local_path, p), fields=SYNC_FIELDS), updates):
+        if error is not None:
+            errors[path] = error
+            continue
+        index = drive.index(file['id'])
+        drive.size[index] = int(file.get('size', NONE))
+        if file.get('md5Checksum'):
+            drive.md5[index] = file['md5Checksum']
+
+    deletes = []
+    for file_id, _ in plan.deletes:
+        inside = [drive.ids[index] for index in drive.walk(drive.index(file_id))] if file_id in drive else []
+        kept = next((stuck[inside_id] for inside_id in inside if inside_id in stuck), None)
+        if kept is None:
+            deletes.append(file_id)
+        else:
+            errors[file_id] = kept
+    for file_id, error in client.delete_many(deletes).items():
+        if error is not None and error.resp.status != 404:
+            errors[file_id] = error
+        else:
+            drive.remove(file_id)
+    return errors
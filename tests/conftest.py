@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # the modules live at the repository root
+
+from fake_drive import FakeDrive, synthetic_images_tree  # noqa: E402
+
+
+@pytest.fixture
+def drive():
+    """ A FakeDrive holding a small synthetic 'images 3.0' tree. """
+    with FakeDrive(synthetic_images_tree(locations=1, images=10)) as drive:
+        yield drive
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('httpx')
+
+from async_client import AsyncDriveClient, crawl_folder  # noqa: E402
+from drive_client import DriveClient  # noqa: E402
+from fake_drive import FOLDER_MIMETYPE, FakeDrive, synthetic_images_tree  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from scheduler import RequestScheduler  # noqa: E402
+from transfers import part_path  # noqa: E402
+
+FILE = {'id': 'file', 'name': 'file.bin', 'mimeType': 'application/octet-stream', 'parents': ['root'], 'size': '50000'}
+
+
+def run(drive, work, drive_id=None):
+    async def main():
+        async with AsyncDriveClient(root_url=drive.url, scheduler=RequestScheduler(metrics=Metrics()), drive_id=drive_id) as client:
+            return await work(client)
+    return asyncio.run(main())
+
+
+def test_shared_drive_items_are_reachable(tmp_path):
+    with FakeDrive() as drive:
+        drive.add_shared_drive('team', 'team', [FILE])
+
+        async def work(client):
+            folder = await client.create_folder('new', 'team')
+            return await client.get('file'), folder, await client.download_file('file', tmp_path / 'file.bin')
+
+        item, folder, fetched = run(drive, work)
+
+        assert item['id'] == 'file'
+        assert drive.items[folder['id']]['driveId'] == 'team'
+        assert fetched == 50000 and (tmp_path / 'file.bin').read_bytes() == drive.content('file')
+
+
+def test_shared_drive_folders_are_listed_and_crawled():
+    tree_builder = pytest.importorskip('tree_builder')  # the async crawl fills the same tt_dictionary Dictionary tree_builder does
+    with FakeDrive() as drive:
+        drive.add_shared_drive('team', 'team', synthetic_images_tree(locations=1, images=3, id_prefix='tm'))
+        expected = tree_builder.crawl_folder(DriveClient(drive.service, RequestScheduler(metrics=Metrics()), drive_id='team'), 'images 3.0')
+
+        async def work(client):
+            return await client.list_children('tm0000000'), await crawl_folder(client, 'images 3.0')
+
+        children, crawled = run(drive, work, drive_id='team')
+        assert sorted(child['name'] for child in children) == ['currents', 'tides']
+        assert len(crawled['id_item']) == len(drive.items)
+        assert crawled == expected
+
+        async def by_id(client):
+            return await client.list_children('tm0000000')
+
+        assert run(drive, by_id) == children  # a My Drive client lists a shared drive folder it has the id of
+
+
+def test_an_item_with_two_parents_is_crawled_once():
+    tree_builder = pytest.importorskip('tree_builder')
+    with FakeDrive(synthetic_images_tree(locations=1, images=2)) as drive:
+        first, second = [item['id'] for item in drive.items.values() if item['name'] in ('3', '4')][:2]
+        drive.add({'id': 'shared', 'name': 'shared', 'mimeType': FOLDER_MIMETYPE, 'parents': [first, second]})
+        drive.add({'id': 'inside', 'name': 'inside.png', 'mimeType': 'image/png', 'parents': ['shared'], 'size': '5'})
+        expected = tree_builder.crawl_folder(DriveClient(drive.service, RequestScheduler(metrics=Metrics())), 'images 3.0')
+        folders = sum(item['mimeType'] == FOLDER_MIMETYPE for item in drive.items.values())
+        requests = drive.request_count
+
+        crawled = run(drive, lambda client: crawl_folder(client, 'images 3.0'))
+
+        assert crawled == expected
+        assert drive.request_count - requests == folders + 2  # finding and getting the start folder, then one list per folder
+
+
+def test_concurrent_downloads_replace_a_stale_part(tmp_path):
+    files = [dict(FILE, id=f'file{number}', name=f'file{number}.bin') for number in range(4)]
+    with FakeDrive(files) as drive:
+        part_path(tmp_path / 'file0.bin').write_bytes(b'x' * 50000)
+
+        async def work(client):
+            return await asyncio.gather(*(client.download_file(item['id'], tmp_path / item['name'], 2**12) for item in files))
+
+        assert run(drive, work) == [50000] * 4
+        for item in files:
+            assert (tmp_path / item['name']).read_bytes() == drive.content(item['id'])
+
+
+def test_an_empty_file_downloads_without_a_part(tmp_path):
+    with FakeDrive([dict(FILE, size='0')]) as drive:
+        async def work(client):
+            return await client.download_file('file', tmp_path / 'file.bin')
+
+        assert run(drive, work) == 0
+        assert (tmp_path / 'file.bin').read_bytes() == b''
+        assert not part_path(tmp_path / 'file.bin').exists()
@@ -0,0 +1,30 @@
+import pytest
+
+from crawl_log import crawl_to_json, log_path, stream_crawl
+from drive_client import DriveClient
+from metrics import Metrics
+from scheduler import RequestScheduler
+
+
+def test_a_finished_log_is_crawled_again(drive, tmp_path):
+    client = DriveClient(drive.service, RequestScheduler(metrics=Metrics()))
+    path = tmp_path / 'images.crawl'
+    first = stream_crawl(client, 'images 3.0', path).to_store()
+    new_id = drive.create_file({}, {'name': 'new.png', 'parents': [first.ids[first.roots[0]]]}, b'png')[1]['id']
+    requests = drive.request_count
+
+    second = stream_crawl(client, 'images 3.0', path).to_store()
+
+    assert drive.request_count > requests
+    assert new_id in second and len(second) == len(first) + 1
+
+
+def test_crawl_to_json_removes_its_log(drive, tmp_path):
+    pytest.importorskip('tt_dictionary')  # to_master_dict builds a tt_dictionary Dictionary
+    client = DriveClient(drive.service, RequestScheduler(metrics=Metrics()))
+    json_path = tmp_path / 'google_drive.json'
+
+    master_dict = crawl_to_json(client, 'images 3.0', json_path)
+
+    assert json_path.exists() and not log_path(json_path).exists()
+    assert 'images 3.0' in master_dict
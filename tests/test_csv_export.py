@@ -0,0 +1,19 @@
+import csv
+
+from csv_export import write_url_csv
+from tree_store import TreeStore
+
+
+def test_dates_keep_the_padding_of_the_image_names(tmp_path):
+    store = TreeStore()
+    store.add('root', 'images 3.0')
+    store.add('type', 'currents', 'root')
+    store.add('loc', 'loc000', 'type')
+    store.add('speed', '-3', 'loc')
+    store.add('late', 'loc000 -3 24 11 02.png', 'speed', 'image/png', 1)
+    store.add('early', 'loc000 -3 24 01 05.png', 'speed', 'image/png', 1)
+    path = tmp_path / 'google_urls.csv'
+
+    assert write_url_csv(store, path, type_name='currents', prefix='<', suffix='>') == (2, 1)
+
+    assert list(csv.reader(path.read_text().splitlines())) == [['date', 'loc000 -3'], ['01/05/2024', '<early>'], ['11/02/2024', '<late>']]
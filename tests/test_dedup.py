@@ -0,0 +1,25 @@
+from dedup import DedupReport, near_duplicate_groups
+from tree_store import TreeStore
+
+
+def test_a_chain_of_close_hashes_is_not_one_group():
+    chain = {'a': 0, 'b': 0b111, 'c': 0b111111, 'd': 0b111111111}  # each 3 bits from the next, a and d 9 apart
+
+    groups = near_duplicate_groups(chain, 6)
+
+    assert groups == [['a', 'b', 'c']]  # d is close to b and c, but not to a
+    for group in groups:
+        assert all((chain[x] ^ chain[y]).bit_count() <= 6 for x in group for y in group)
+
+
+def test_only_exact_copies_are_delete_candidates():
+    store = TreeStore()
+    store.add('root', 'imgs')
+    for file_id in ('a', 'a copy', 'b', 'b similar'):
+        store.add(file_id, f'{file_id}.png', 'root', 'image/png', 100)
+    a, a_copy, b, b_similar = (store.index(file_id) for file_id in ('a', 'a copy', 'b', 'b similar'))
+
+    report = DedupReport(store, [[a, a_copy]], [[b, b_similar]])
+
+    assert report.candidates == ['a copy'] and report.reclaimable == 100
+    assert report.near_candidates == ['b similar'] and report.near_reclaimable == 100
@@ -0,0 +1,61 @@
+from functools import partial
+
+from drive_client import DriveClient
+from fake_drive import PNG_MIMETYPE
+from metrics import Metrics
+from scheduler import RequestScheduler
+
+
+def fast_scheduler(**kwargs):
+    return RequestScheduler(base_delay=0.01, max_delay=0.02, metrics=Metrics(), **kwargs)
+
+
+def png_ids(drive, count):
+    return [item['id'] for item in drive.items.values() if item['mimeType'] == PNG_MIMETYPE][:count]
+
+
+def test_delete_many_retries_only_throttled_parts(drive):
+    client = DriveClient(drive.service, fast_scheduler())
+    doomed = png_ids(drive, 150)
+    drive.fail_next = 30
+    requests = drive.request_count
+
+    results = client.delete_many(doomed)
+
+    assert results == {file_id: None for file_id in doomed}
+    assert not any(file_id in drive.items for file_id in doomed)
+    assert client.scheduler.counters['throttled'] == 30
+    assert drive.request_count - requests == 3  # two batches, then one more for the 30 throttled parts
+
+
+def test_delete_many_gives_up_after_max_retries(drive):
+    client = DriveClient(drive.service, fast_scheduler(max_retries=1))
+    doomed = png_ids(drive, 3)
+    drive.fail_next = 10**6
+
+    results = client.delete_many(doomed)
+
+    assert [error.resp.status for error in results.values()] == [429] * 3
+    assert all(file_id in drive.items for file_id in doomed)
+
+
+def test_update_many_reports_each_item(drive):
+    client = DriveClient(drive.service, fast_scheduler())
+    file_id = png_ids(drive, 1)[0]
+
+    results = client.update_many({file_id: {'name': 'renamed.png'}, 'missing': {'name': 'x'}})
+
+    assert results[file_id] is None
+    assert results['missing'].resp.status == 404
+    assert drive.items[file_id]['name'] == 'renamed.png'
+
+
+
+def test_execute_many_pairs_each_request_with_its_result(drive):
+    client = DriveClient(drive.service, fast_scheduler())
+    file_id = png_ids(drive, 1)[0]
+
+    results = client.execute_many({key: partial(client.files.get, fileId=key, fields='id, name') for key in (file_id, 'missing')})
+
+    assert results[file_id] == ({'id': file_id, 'name': drive.items[file_id]['name']}, None)
+    assert results['missing'][0] is None and results['missing'][1].resp.status == 404
@@ -0,0 +1,54 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+pytest.importorskip('tt_dictionary')  # DriveSource.crawl builds its tree with tree_builder
+
+from drive_pool import CredentialPool, DrivePool, DriveSource  # noqa: E402
+from fake_drive import synthetic_images_tree  # noqa: E402
+from metrics import Metrics  # noqa: E402
+
+
+@pytest.fixture
+def pool(drive):
+    drive.add_shared_drive('team', 'team', synthetic_images_tree(locations=1, images=10, id_prefix='tm'))
+    credentials = CredentialPool(metrics=Metrics())
+    credentials.add('user', drive.service)
+    pool = DrivePool([DriveSource(credentials.client('user'), 'images 3.0', 'mine'),
+                      DriveSource(credentials.client('user', 'team'), 'images 3.0', 'team')])
+    pool.crawl()
+    return pool
+
+
+def test_unknown_ids_are_reported(pool):
+    png = pool.store.ids[pool.store.find_mimetype('image/png')[0]]
+
+    results = pool.delete_many(['nowhere', png])
+
+    assert results[png] is None
+    assert isinstance(results['nowhere'], LookupError)
+
+
+def test_deleting_a_folder_forgets_everything_under_it(drive, pool):
+    folder = pool.store.resolve('mine/currents')
+    under = [pool.store.ids[index] for index in pool.store.walk(folder)]
+
+    assert pool.delete_many([pool.store.ids[folder]]) == {under[0]: None}
+
+    assert not any(file_id in pool.owners or file_id in pool.store for file_id in under)
+    assert pool.store.resolve('team/currents') is not None
+
+
+def test_a_failed_source_reports_each_of_its_ids(pool):
+    mine, team = pool.sources
+    error = HttpError(httplib2.Response({'status': '401'}), b'{}')
+
+    def fail(file_ids):
+        raise error
+    team.client.delete_many = fail
+    doomed = [pool.store.ids[pool.store.resolve(f'{label}/currents/loc000')] for label in ('mine', 'team')]
+
+    results = pool.delete_many(doomed)
+
+    assert results == {doomed[0]: None, doomed[1]: error}
+    assert doomed[1] in pool.owners and doomed[1] in pool.store
@@ -0,0 +1,28 @@
+from drive_query import TreeQuery
+from tree_store import FOLDER_MIMETYPE, TreeStore
+
+
+def tree():
+    store = TreeStore()
+    store.add('root', 'top')
+    store.add('a', 'a', 'root')
+    store.add('small', 'small.png', 'a', 'image/png', 10)
+    store.add('large', 'large.png', 'a', 'image/png', 1000)
+    store.add('ds', '.DS_Store', 'a', 'application/octet-stream', 6148)
+    return store
+
+
+def test_select_filters_by_name_mimetype_and_size():
+    store = tree()
+
+    assert store.ids[TreeQuery(name='.DS_Store').select(store)[0]] == 'ds'
+    assert [store.ids[index] for index in TreeQuery(mimetype='image/png', min_size=100).select(store)] == ['large']
+    assert [store.ids[index] for index in TreeQuery(folders=True).select(store, 'top/a')] == ['a']
+    assert TreeQuery(mimetype=FOLDER_MIMETYPE, min_size=1).select(store) == []
+
+
+def test_select_under_a_missing_path_finds_nothing():
+    store = tree()
+
+    for query in (TreeQuery(name='.DS_Store'), TreeQuery(mimetype='image/png'), TreeQuery(min_size=1)):
+        assert query.select(store, 'top/missing') == []
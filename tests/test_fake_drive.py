@@ -0,0 +1,51 @@
+import time
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from crawl_log import stream_crawl
+from drive_client import DriveClient
+from fake_drive import FakeDrive, synthetic_images_tree
+from metrics import Metrics
+from scheduler import RequestScheduler
+
+
+def client(drive, **limits):
+    return DriveClient(drive.service, RequestScheduler(base_delay=0.01, max_delay=0.05, metrics=Metrics(), **limits))
+
+
+def paths(store):
+    return sorted(store.path(index) for index in store.walk())
+
+
+def test_a_crawl_retries_through_injected_429s_and_server_errors(tmp_path):
+    items = synthetic_images_tree(locations=1, images=3)
+    with FakeDrive(items, error_rate=0.2, error_statuses=(500, 503), seed=1) as drive:
+        drive.fail_next, drive.retry_after = 2, 0.2
+        faulty = client(drive, max_retries=10)
+        start = time.perf_counter()
+
+        store = stream_crawl(faulty, 'images 3.0', tmp_path / 'faulty.crawl').to_store()
+
+        assert time.perf_counter() - start >= 0.2  # the Retry-After was waited out
+        assert drive.rejected > 2 and faulty.scheduler.counters['retries'] == drive.rejected
+        assert faulty.scheduler.counters['throttled'] == 2
+        drive.error_rate = 0.0
+        assert paths(store) == paths(stream_crawl(client(drive), 'images 3.0', tmp_path / 'clean.crawl').to_store())
+
+
+def test_the_quota_turns_calls_away_until_its_window_resets(drive):
+    drive.quota, drive.quota_window = 3, 0.3
+    file_id = next(iter(drive.items))
+    impatient = client(drive, max_retries=0)
+    for _ in range(3):
+        impatient.get(file_id)
+
+    with pytest.raises(HttpError) as raised:
+        impatient.get(file_id)
+
+    assert raised.value.resp.status == 403 and b'userRateLimitExceeded' in raised.value.content
+    assert drive.rejected == 1
+    patient = client(drive, max_retries=20)
+    assert patient.get(file_id)['id'] == file_id  # retried until the window reset
+    assert patient.scheduler.counters['retries'] == drive.rejected - 1
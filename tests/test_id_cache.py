@@ -0,0 +1,49 @@
+import time
+
+from drive_client import DriveClient
+from id_cache import EVICT_EVERY, IdCache
+from metrics import Metrics
+from scheduler import RequestScheduler
+
+
+def test_entries_persist_until_they_expire(tmp_path):
+    path = tmp_path / 'ids.sqlite'
+    cache = IdCache(path, ttl=0.2)
+    cache.put('root', 'images 3.0', 'folder', 'application/vnd.google-apps.folder')
+    cache.close()
+
+    cache = IdCache(path, ttl=0.2)
+    assert cache.get('root', 'images 3.0') == ('folder', 'application/vnd.google-apps.folder')
+    time.sleep(0.3)
+    assert cache.get('root', 'images 3.0') is None
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 0)
+
+
+def test_the_least_recently_used_are_evicted_every_evict_every_puts(tmp_path):
+    cache = IdCache(tmp_path / 'ids.sqlite', max_entries=2)
+    for number in range(EVICT_EVERY - 1):
+        cache.put('root', f'name{number}', f'id{number}')
+    assert len(cache) == EVICT_EVERY - 1  # not trimmed between checks
+    cache.get('root', 'name0')
+
+    cache.put('root', 'last', 'last')
+
+    assert len(cache) == 2
+    assert cache.get('root', 'name0') == ('id0', None) and cache.get('root', 'last') == ('last', None)
+
+
+def test_deletes_and_updates_through_the_client_invalidate(drive, tmp_path):
+    cache = IdCache(tmp_path / 'ids.sqlite')
+    client = DriveClient(drive.service, RequestScheduler(metrics=Metrics()), cache)
+    folder = client.resolve_path('images 3.0/currents/loc000')
+    speed = client.resolve_path('images 3.0/currents/loc000/-3')
+    image = dict(next(item for item in drive.items.values() if item.get('parents') == [speed]))
+    assert client.resolve_path(f"images 3.0/currents/loc000/-3/{image['name']}") == image['id']
+
+    assert client.update_many({image['id']: {'name': 'renamed.png'}}) == {image['id']: None}
+    assert cache.get(speed, image['name']) is None
+    assert cache.get(speed, 'renamed.png') == (image['id'], image['mimeType'])
+
+    assert client.delete_many([speed]) == {speed: None}
+    assert cache.get(folder, '-3') is None and cache.get(speed, 'renamed.png') is None
+    assert cache.get('root', 'images 3.0') is not None
@@ -0,0 +1,50 @@
+import hashlib
+import os
+
+from local_scan import HashCache, scan_tree
+
+
+def key(path):
+    stat = os.stat(path)
+    return HashCache.key(stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def scan(folder, cache_path):
+    return scan_tree(folder, checksums=True, hash_cache=HashCache(cache_path), hash_workers=1)
+
+
+def test_scan_tree_ids_sizes_and_checksums(tmp_path):
+    (tmp_path / 'top' / 'sub').mkdir(parents=True)
+    (tmp_path / 'top' / 'a.png').write_bytes(b'png')
+    (tmp_path / 'top' / 'sub' / 'b.txt').write_bytes(b'text!')
+
+    store = scan_tree(tmp_path / 'top', checksums=True, hash_workers=1)
+
+    assert sorted(store.path(index) for index in store.walk()) == ['top', 'top/a.png', 'top/sub', 'top/sub/b.txt']
+    b = store.index('top/sub/b.txt')
+    assert (store.size[b], store.mimetypes[store.mime[b]]) == (5, 'text/plain')
+    assert store.md5[b] == hashlib.md5(b'text!').hexdigest()
+
+
+def test_the_hash_cache_hashes_only_changed_files_and_prunes_the_rest(tmp_path, capsys):
+    folder, cache_path = tmp_path / 'top', tmp_path / 'top.hashes.json'
+    folder.mkdir()
+    same, touched, removed = folder / 'same.bin', folder / 'touched.bin', folder / 'removed.bin'
+    for path in (same, touched, removed):
+        path.write_bytes(path.name.encode())
+    scan(folder, cache_path)
+    old_key = key(touched)
+    assert set(HashCache(cache_path).hashes) == {key(same), old_key, key(removed)}
+
+    assert len(scan(folder, cache_path).md5) == 3  # every file, all from the cache
+    assert capsys.readouterr().out.splitlines()[-1] == 'hashing 0 of 3 files'
+
+    touched.write_bytes(b'new content')
+    os.utime(touched, ns=(os.stat(touched).st_atime_ns, os.stat(touched).st_mtime_ns + 10**9))
+    removed.unlink()
+    store = scan(folder, cache_path)
+
+    assert capsys.readouterr().out.splitlines()[-1] == 'hashing 1 of 2 files'
+    assert store.md5[store.index('top/touched.bin')] == hashlib.md5(b'new content').hexdigest()
+    assert HashCache(cache_path).hashes == {key(same): hashlib.md5(b'same.bin').hexdigest(),
+                                            key(touched): hashlib.md5(b'new content').hexdigest()}
@@ -0,0 +1,69 @@
+import json
+import logging
+
+import pytest
+
+from metrics import JsonLinesSink, LoggingSink, Metrics, PrometheusSink
+
+
+@pytest.fixture
+def metrics():
+    """ Two counts, an error count, a gauge and a two-bucket latency histogram. """
+    metrics = Metrics()
+    metrics.count('api_calls', method='drive.files.list')
+    metrics.count('api_calls', method='drive.files.list')
+    metrics.count('api_errors', method='drive.files.get', status=429)
+    metrics.set('in_flight', 3)
+    for seconds in (0.005, 0.02, 0.5):
+        metrics.observe('api_latency_seconds', seconds, buckets=(0.01, 0.1), method='drive.files.get')
+    return metrics
+
+
+def test_json_lines_gets_one_snapshot_per_report(metrics, tmp_path):
+    metrics.sinks.append(JsonLinesSink(tmp_path / 'metrics.jsonl'))
+
+    metrics.report()
+    metrics.count('api_calls', method='drive.files.list')
+    metrics.report()
+
+    first, second = [json.loads(line) for line in (tmp_path / 'metrics.jsonl').read_text().splitlines()]
+    assert first['counters'] == [{'name': 'api_calls', 'labels': {'method': 'drive.files.list'}, 'value': 2},
+                                 {'name': 'api_errors', 'labels': {'method': 'drive.files.get', 'status': 429}, 'value': 1}]
+    assert first['gauges'] == [{'name': 'in_flight', 'labels': {}, 'value': 3}]
+    assert first['histograms'] == [{'name': 'api_latency_seconds', 'labels': {'method': 'drive.files.get'},
+                                    'value': {'buckets': [0.01, 0.1], 'counts': [1, 1, 1], 'count': 3, 'sum': 0.525, 'max': 0.5}}]
+    assert second['counters'][0]['value'] == 3
+
+
+def test_prometheus_exposition(metrics, tmp_path):
+    path = tmp_path / 'drive.prom'
+    metrics.sinks.append(PrometheusSink(path))
+
+    metrics.report()
+
+    assert path.read_text() == '''\
+# TYPE gdrive_api_calls_total counter
+gdrive_api_calls_total{method="drive.files.list"} 2
+# TYPE gdrive_api_errors_total counter
+gdrive_api_errors_total{method="drive.files.get",status="429"} 1
+# TYPE gdrive_in_flight gauge
+gdrive_in_flight 3
+# TYPE gdrive_api_latency_seconds histogram
+gdrive_api_latency_seconds_bucket{method="drive.files.get",le="0.01"} 1
+gdrive_api_latency_seconds_bucket{method="drive.files.get",le="0.1"} 2
+gdrive_api_latency_seconds_bucket{method="drive.files.get",le="+Inf"} 3
+gdrive_api_latency_seconds_sum{method="drive.files.get"} 0.525
+gdrive_api_latency_seconds_count{method="drive.files.get"} 3
+'''
+    assert not path.with_name('drive.prom.tmp').exists()
+
+
+def test_logging_sink_logs_the_summary(metrics, caplog):
+    metrics.sinks.append(LoggingSink())
+
+    with caplog.at_level(logging.INFO, logger='drive.metrics'):
+        metrics.report()
+
+    [record] = caplog.records
+    assert record.getMessage() == f'metrics\n{metrics.summary()}'
+    assert 'api_calls method=drive.files.list' in record.getMessage()
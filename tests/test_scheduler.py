@@ -0,0 +1,105 @@
+import time
+from email.utils import formatdate
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from drive_client import DriveClient
+from metrics import Metrics
+from scheduler import RequestScheduler, retry_after
+
+
+def http_error(status: int, **headers):
+    return HttpError(httplib2.Response(dict(headers, status=str(status))), b'{}')
+
+
+def scheduler(**kwargs):
+    return RequestScheduler(base_delay=0.01, max_delay=0.02, metrics=Metrics(), **kwargs)
+
+
+def test_retry_after_seconds_and_http_date():
+    assert retry_after(http_error(429, **{'retry-after': '2.5'})) == 2.5
+    assert 8 < retry_after(http_error(429, **{'retry-after': formatdate(time.time() + 10, usegmt=True)})) <= 10
+    assert retry_after(http_error(429)) is None
+
+
+def test_retry_after_holds_back_the_retry(drive):
+    client = DriveClient(drive.service, scheduler())
+    file_id = next(iter(drive.items))
+    drive.retry_after = 0.3
+    drive.fail_next = 1
+    start = time.perf_counter()
+
+    assert client.get(file_id)['id'] == file_id
+
+    assert time.perf_counter() - start >= 0.3
+    assert client.scheduler.stats()['retries'] == 1
+
+
+def test_aimd_halves_the_limit_once_a_second_and_recovers():
+    pacer = scheduler(max_concurrency=8)
+    throttled = http_error(429)
+
+    assert pacer.retry_delay(throttled, 0) is not None
+    assert pacer.retry_delay(throttled, 0) is not None
+    assert pacer.limit == 4  # the second rate limit within a second does not cut again
+
+    for _ in range(4):
+        pacer.call(lambda: None)
+    assert pacer.limit == 5
+    for _ in range(5 + 6 + 7):
+        pacer.call(lambda: None)
+    assert pacer.limit == 8
+    for _ in range(20):
+        pacer.call(lambda: None)
+    assert pacer.limit == 8  # never above max_concurrency
+
+
+def test_throttled_calls_are_retried_against_the_fake(drive):
+    client = DriveClient(drive.service, scheduler(max_concurrency=8))
+    folder_id = next(iter(drive.items))
+    drive.fail_next = 3
+
+    assert client.list_children(folder_id)
+
+    stats = client.scheduler.stats()
+    assert (stats['throttled'], stats['retries'], stats['in_flight']) == (3, 3, 0)
+    assert stats['limit'] == 4
+
+
+def test_server_errors_are_retried_until_max_retries(drive):
+    client = DriveClient(drive.service, scheduler(max_retries=2))
+    drive.error_rate, drive.error_statuses = 1.0, (503,)
+
+    with pytest.raises(HttpError) as raised:
+        client.get(next(iter(drive.items)))
+
+    assert raised.value.resp.status == 503
+    assert client.scheduler.counters['retries'] == 2
+    assert client.scheduler.counters['failures'] == 1
+
+
+def test_client_errors_are_not_retried(drive):
+    client = DriveClient(drive.service, scheduler())
+
+    with pytest.raises(HttpError):
+        client.get('missing')
+
+    assert client.scheduler.counters['retries'] == 0
+
+
+def test_transport_errors_are_not_retried():
+    pacer = scheduler()
+    attempts = []
+
+    def fail():
+        attempts.append(1)
+        raise ConnectionResetError('connection reset by peer')
+
+    with pytest.raises(ConnectionResetError):
+        pacer.call(fail)
+
+    assert len(attempts) == 1
+    assert pacer.stats()['in_flight'] == 0
+    assert pacer.counters['retries'] == 0
@@ -0,0 +1,69 @@
+"""
+plan_sync on TreeStores, and execute_plan against a FakeDrive seeded with a small images tree
+that the local folder under tmp_path is synced to.
+"""
+from drive_client import DriveClient
+from fake_drive import FakeDrive, synthetic_images_tree
+from local_scan import scan_tree
+from metrics import Metrics
+from scheduler import RequestScheduler
+from sync_plan import drive_store, execute_plan, plan_sync
+from tree_store import TreeStore
+
+ROOT = 'images 3.0'
+
+
+def sync(drive, local, max_retries=5, fail_next=0):
+    """ Plans and runs a sync, turning away the first fail_next calls of the run. """
+    client = DriveClient(drive.service, RequestScheduler(base_delay=0.01, max_delay=0.02, max_retries=max_retries, metrics=Metrics()))
+    store = drive_store(client, ROOT)
+    plan = plan_sync(scan_tree(local, checksums=True), store)
+    drive.fail_next = fail_next
+    return client, plan, execute_plan(client, plan, local, store)
+
+
+def test_a_folder_emptied_by_moves_is_deleted(tmp_path):
+    items = synthetic_images_tree(ROOT, types=('currents',), locations=1, speeds=(3,), images=2)
+    with FakeDrive(items) as drive:
+        names = {item['id']: item['name'] for item in items}
+        local = tmp_path / ROOT / 'moved'
+        local.mkdir(parents=True)
+        for item in items:
+            if item['mimeType'] == 'image/png':
+                (local / item['name']).write_bytes(drive.content(item['id']))
+
+        client, plan, errors = sync(drive, tmp_path / ROOT)
+
+        assert errors == {}
+        assert len(plan.moves) == 2
+        assert [path for _, path in plan.deletes] == ['currents']
+        left = sorted(names.get(item['id'], item['name']) for item in drive.items.values())
+        assert left == sorted([ROOT, 'moved'] + [name for name in names.values() if name.endswith('.png')])
+
+
+def test_paths_under_a_folder_that_failed_are_reported(tmp_path):
+    with FakeDrive(synthetic_images_tree(ROOT, types=('currents',), locations=1, speeds=(3,), images=1)) as drive:
+        local = tmp_path / ROOT / 'new' / 'sub'
+        local.mkdir(parents=True)
+        (local / 'a.bin').write_bytes(b'a' * 10)
+        (tmp_path / ROOT / 'new' / 'b.bin').write_bytes(b'b' * 10)
+        _, plan, errors = sync(drive, tmp_path / ROOT, max_retries=0, fail_next=1)  # creating 'new' fails
+
+        assert plan.folders == ['new', 'new/sub']
+        assert set(errors) >= {'new', 'new/sub', 'new/sub/a.bin', 'new/b.bin'}
+        assert errors['new/sub/a.bin'] is errors['new']
+
+
+def test_a_folder_holding_a_google_doc_is_kept():
+    local, drive = TreeStore(), TreeStore()
+    local.add('root', ROOT)
+    drive.add('root', ROOT)
+    drive.add('old', 'old', 'root')
+    drive.add('doc', 'notes', 'old', 'application/vnd.google-apps.document')
+    drive.add('png', 'a.png', 'old', 'image/png', 10)
+    drive.add('sub', 'sub', 'old')
+    drive.add('deep', 'b.png', 'sub', 'image/png', 10)
+
+    plan = plan_sync(local, drive)
+
+    assert plan.deletes == [('png', 'old/a.png'), ('sub', 'old/sub')]
@@ -0,0 +1,85 @@
+import pytest
+
+from drive_client import DriveClient
+from fake_drive import FakeDrive
+from metrics import Metrics
+from scheduler import RequestScheduler
+from transfers import download_file, download_tree, part_path, upload_files
+from tree_store import TreeStore
+
+ITEM = {'id': 'file', 'name': 'file.bin', 'mimeType': 'application/octet-stream', 'parents': ['root'], 'size': '100000'}
+
+
+@pytest.fixture
+def client():
+    with FakeDrive([ITEM]) as drive:
+        yield drive, DriveClient(drive.service, RequestScheduler(metrics=Metrics()))
+
+
+@pytest.mark.parametrize('stale', [b'x' * 100000, b'x' * 150000], ids=['same size', 'oversized'])
+def test_a_stale_part_is_discarded(client, tmp_path, stale):
+    drive, client = client
+    target = tmp_path / 'file.bin'
+    part_path(target).write_bytes(stale)
+
+    assert download_file(client, 'file', target, chunk_size=2**16) == 100000
+
+    assert target.read_bytes() == drive.content('file')
+
+
+def test_a_complete_part_is_kept(client, tmp_path):
+    drive, client = client
+    target = tmp_path / 'file.bin'
+    part_path(target).write_bytes(drive.content('file'))
+    requests = drive.request_count
+
+    assert download_file(client, 'file', target) == 0
+
+    assert target.read_bytes() == drive.content('file')
+    assert drive.request_count - requests == 2  # the ranged GET past the end, then the size and md5 check
+
+
+def test_a_partial_part_is_resumed(client, tmp_path):
+    drive, client = client
+    target = tmp_path / 'file.bin'
+    part_path(target).write_bytes(drive.content('file')[:30000])
+
+    assert download_file(client, 'file', target) == 70000
+
+    assert target.read_bytes() == drive.content('file')
+
+
+def test_a_part_of_an_older_version_is_fetched_again(client, tmp_path):
+    drive, client = client
+    target = tmp_path / 'file.bin'
+    part_path(target).write_bytes(b'x' * 30000)
+
+    assert download_file(client, 'file', target, size=100000) == 170000
+
+    assert target.read_bytes() == drive.content('file')
+
+
+def test_an_unreadable_file_does_not_stop_the_other_uploads(client, tmp_path):
+    drive, client = client
+    present, missing = tmp_path / 'present.bin', tmp_path / 'missing.bin'
+    present.write_bytes(b'data')
+    tree = TreeStore()
+    tree.add('root', 'My Drive')
+
+    files, errors = upload_files(client, [(missing, 'root'), (present, 'root')], tree)
+
+    assert list(files) == [present] and drive.content(files[present]['id']) == b'data'
+    assert list(errors) == [missing] and isinstance(errors[missing], FileNotFoundError)
+    assert files[present]['id'] in tree
+
+
+def test_download_tree_reports_a_missing_folder(client, tmp_path, capsys):
+    _, client = client
+    store = TreeStore()
+    store.add('root', 'My Drive')
+
+    assert download_tree(client, store, tmp_path, 'My Drive/nowhere') == {}
+    assert download_tree(client, TreeStore(), tmp_path) == {}
+
+    assert capsys.readouterr().out == "Folder 'My Drive/nowhere' not found in the tree.\nThe tree is empty.\n"
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,57 @@
+import pytest
+
+from drive_client import DriveClient
+from fake_drive import FOLDER_MIMETYPE, FakeDrive, synthetic_images_tree
+from metrics import Metrics
+from scheduler import RequestScheduler
+
+pytest.importorskip('tt_dictionary')  # the trees are tt_dictionary Dictionaries
+
+from tree_builder import build_tree, choose_build_mode, crawl_folder  # noqa: E402
+
+ROOT = 'images 3.0'
+
+
+@pytest.fixture
+def client():
+    """ A client on the images tree, with a trashed PNG in it and a folder beside it the builds must leave out. """
+    items = synthetic_images_tree(ROOT, locations=2, images=3)
+    speed = next(item for item in items if item['name'] == '-3')
+    items += [{'id': 'trashed', 'name': 'trashed.png', 'mimeType': 'image/png', 'parents': [speed['id']], 'size': '5', 'trashed': True},
+              {'id': 'other', 'name': 'other', 'mimeType': FOLDER_MIMETYPE, 'parents': ['root']},
+              {'id': 'stray', 'name': 'stray.png', 'mimeType': 'image/png', 'parents': ['other'], 'size': '5'}]
+    with FakeDrive(items) as drive:
+        yield drive, DriveClient(drive.service, RequestScheduler(metrics=Metrics()))
+
+
+def test_the_crawl_lists_every_folder_once(client):
+    drive, client = client
+    folders = sum(item['mimeType'] == FOLDER_MIMETYPE and item['id'] != 'other' for item in drive.items.values())
+    images = sum(item['mimeType'] == 'image/png' and not item['trashed'] and item['id'] != 'stray' for item in drive.items.values())
+
+    master_dict = crawl_folder(client, ROOT)
+
+    assert len(master_dict['id_item']) == folders + images
+    assert 'trashed' not in master_dict['id_item'] and 'stray' not in master_dict['id_item']
+    assert sorted(master_dict[ROOT]) == ['currents', 'id', 'tides']
+    speed = master_dict[ROOT]['currents']['loc001']['-3']
+    assert sorted(speed) == sorted(['id'] + [item['name'] for item in drive.items.values() if item['parents'] == [speed['id']]])
+    counters = client.scheduler.metrics.snapshot()['counters']
+    assert [row['value'] for row in counters if row['name'] == 'folders_listed'] == [folders]
+
+
+@pytest.mark.parametrize('mode', ['flat', 'auto'])
+def test_every_mode_builds_the_same_tree(client, mode):
+    drive, client = client
+    first, second = [item['id'] for item in drive.items.values() if item['name'] in ('3', '4')][:2]
+    drive.add({'id': 'shared', 'name': 'shared.png', 'mimeType': 'image/png', 'parents': [first, second],
+               'size': '5'})  # in two folders, filed under the first the crawl reaches
+
+    assert build_tree(client, ROOT, mode) == crawl_folder(client, ROOT)
+
+
+def test_auto_crawls_a_small_subtree_of_a_large_drive(client):
+    _, client = client
+
+    assert choose_build_mode(client, ROOT) == 'flat'
+    assert choose_build_mode(client, ROOT, items_per_folder=10**4) == 'crawl'
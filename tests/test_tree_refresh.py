@@ -0,0 +1,29 @@
+import pytest
+
+from drive_client import DriveClient
+from fake_drive import PNG_MIMETYPE
+from metrics import Metrics
+from scheduler import RequestScheduler
+
+pytest.importorskip('tt_dictionary')  # the cached tree is a tt_dictionary Dictionary
+
+from tree_builder import crawl_folder  # noqa: E402
+from tree_refresh import refresh_tree  # noqa: E402
+
+
+def test_refresh_applies_scripted_changes(drive):
+    client = DriveClient(drive.service, RequestScheduler(base_delay=0.01, max_delay=0.02, metrics=Metrics()))
+    token = client.start_page_token()
+    master_dict = crawl_folder(client, 'images 3.0')
+    renamed, trashed = [item['id'] for item in drive.items.values() if item['mimeType'] == PNG_MIMETYPE][:2]
+    drive.update(renamed, name='renamed.png')
+    drive.trash(trashed)
+    requests = drive.request_count
+
+    count, token = refresh_tree(client, master_dict, token)
+
+    assert count == 2
+    assert drive.request_count - requests == 1
+    assert master_dict['id_name'][renamed] == 'renamed.png'
+    assert trashed not in master_dict['id_item']
+    assert refresh_tree(client, master_dict, token)[0] == 0
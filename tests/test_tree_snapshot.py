@@ -0,0 +1,43 @@
+import pytest
+
+from tree_snapshot import open_snapshot, write_snapshot
+from tree_store import NONE, TreeStore
+
+
+def rows(store):
+    """ Every item of a tree as (id, name, parent id, mimetype, size, md5, path), in walk order. """
+    return [(store.ids[index], store.names[store.name[index]], None if store.parent[index] == NONE else store.ids[store.parent[index]],
+             store.mimetypes[store.mime[index]], store.size[index], store.md5.get(index), store.path(index)) for index in store.walk()]
+
+
+def test_a_snapshot_reads_back_the_tree(tmp_path):
+    store = TreeStore()
+    store.add('root', 'images 3.0')
+    store.add('type', 'currents', 'root')
+    store.add('gone', 'gone', 'root')
+    store.add('a', 'a.png', 'type', 'image/png', 10, 'md5a')
+    store.add('b', 'b.png', 'type', 'image/png', 20)
+    store.add('c', 'a.png', 'gone', 'image/png', 30, 'md5c')
+    store.add('doc', 'notes', 'root', 'application/vnd.google-apps.document')
+    store.add('other', 'other root')
+    store.remove('gone')  # leaves tombstones the snapshot drops
+    path = tmp_path / 'tree.snapshot'
+
+    write_snapshot(store, path)
+    snapshot = open_snapshot(path)
+
+    assert rows(snapshot) == rows(store)
+    assert len(snapshot) == len(store) == 6
+    assert [snapshot.path(index) for index in snapshot.find('a.png')] == ['images 3.0/currents/a.png']
+    assert snapshot.path(snapshot.index('b')) == 'images 3.0/currents/b.png' and 'c' not in snapshot
+    assert rows(snapshot.to_store()) == rows(store)
+    with pytest.raises(TypeError):
+        snapshot.add('x', 'x')
+
+
+def test_an_empty_tree_round_trips(tmp_path):
+    write_snapshot(TreeStore(), tmp_path / 'empty.snapshot')
+
+    snapshot = open_snapshot(tmp_path / 'empty.snapshot')
+
+    assert len(snapshot) == 0 and snapshot.roots == [] and list(snapshot.walk()) == []
@@ -0,0 +1,48 @@
+from tree_store import FOLDER_MIMETYPE, TreeStore
+
+
+def two_parent_items():
+    return [{'id': 'root', 'name': 'top', 'mimeType': FOLDER_MIMETYPE},
+            {'id': 'a', 'name': 'a', 'mimeType': FOLDER_MIMETYPE, 'parents': ['root']},
+            {'id': 'b', 'name': 'b', 'mimeType': FOLDER_MIMETYPE, 'parents': ['root']},
+            {'id': 'shared', 'name': 'shared', 'mimeType': FOLDER_MIMETYPE, 'parents': ['a', 'b']},
+            {'id': 'leaf', 'name': 'leaf.png', 'mimeType': 'image/png', 'parents': ['shared'], 'size': '10'}]
+
+
+def test_item_with_two_parents_is_kept_once():
+    store = TreeStore.from_drive_items(two_parent_items(), 'root')
+
+    assert len(store) == 5
+    assert store.path(store.index('leaf')) == 'top/a/shared/leaf.png'
+    assert [store.path(index) for index in store.find('leaf.png')] == ['top/a/shared/leaf.png']
+    assert list(store.children(store.index('b'))) == []
+
+
+def test_add_of_a_known_id_returns_its_index():
+    store = TreeStore()
+    store.add('root', 'top')
+    first = store.add('x', 'x', 'root', 'image/png', 1)
+
+    assert store.add('x', 'x again', 'root', 'image/png', 2) == first
+    assert len(store) == 2 and store.size[first] == 1
+
+
+def test_remove_after_a_two_parent_item():
+    store = TreeStore.from_drive_items(two_parent_items(), 'root')
+
+    store.remove('shared')
+
+    assert 'shared' not in store and 'leaf' not in store
+    assert store.find('leaf.png') == []
+    store.remove('a')
+    assert [store.path(index) for index in store.walk()] == ['top', 'top/b']
+
+
+def test_lookups_under_a_missing_path_find_nothing():
+    store = TreeStore.from_drive_items(two_parent_items(), 'root')
+
+    assert store.find('leaf.png', under='top/missing') == []
+    assert store.find_mimetype('image/png', under='nowhere') == []
+    assert store.span('nowhere') == (0, 0)
+    assert store.find('leaf.png', under='top/a') == [store.index('leaf')]
+    assert store.duplicates(under='nowhere') == []
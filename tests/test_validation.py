@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip('pandas')
+
+from tree_store import TreeStore  # noqa: E402
+from validation import validate  # noqa: E402
+
+LIMITS = {'currents': {'size': 150, 'z': 3.0}, 'tides': {'z': 2.5}}
+
+
+@pytest.fixture
+def store():
+    """
+    An images tree with five PNGs per speed folder but one deliberate anomaly of each kind:
+    currents/loc000/3 holds four, currents/loc000/-3 has one over the 150 byte limit, and
+    tides/loc000/3 has one three standard deviations from the tides average.
+    """
+    sizes = {('currents', '-3'): [100, 100, 100, 100, 160], ('currents', '3'): [100, 100, 100, 100],
+             ('tides', '-3'): [100, 100, 100, 100, 100], ('tides', '3'): [100, 100, 100, 100, 400]}
+    store = TreeStore()
+    store.add('root', 'images 3.0')
+    for (type_name, speed), folder_sizes in sizes.items():
+        location = f'{type_name}/loc000'
+        store.add(type_name, type_name, 'root')
+        store.add(location, 'loc000', type_name)
+        store.add(f'{location}/{speed}', speed, location)
+        store.add(f'{location}/{speed}/.DS_Store', '.DS_Store', f'{location}/{speed}', 'application/octet-stream', 6148)
+        for number, size in enumerate(folder_sizes):
+            store.add(f'{location}/{speed}/{number}', f'loc000 {speed} 24 01 0{number + 1}.png', f'{location}/{speed}', 'image/png', size)
+    return store
+
+
+def test_each_anomaly_is_reported_once(store):
+    report = validate(store, limits=LIMITS, expected=5)
+
+    assert not report and (report.folders, report.images) == (4, 19)
+    assert report.counts.to_dict('records') == [{'type': 'currents', 'location': 'loc000', 'speed': 3.0, 'count': 4}]
+    assert report.oversized.to_dict('records') == [{'path': 'currents/loc000/-3/loc000 -3 24 01 05.png', 'id': 'currents/loc000/-3/4',
+                                                   'type': 'currents', 'size': 160, 'limit': 150}]
+    assert report.outliers.to_dict('records') == [{'path': 'tides/loc000/3/loc000 3 24 01 05.png', 'id': 'tides/loc000/3/4',
+                                                  'type': 'tides', 'size': 400, 'average': 130, 'z': 3.0, 'limit': 2.5}]
+
+
+def test_a_clean_tree_passes(store):
+    store.add('currents/loc000/3/extra', 'loc000 3 24 01 05.png', 'currents/loc000/3', 'image/png', 100)
+    store.remove('currents/loc000/-3/4')
+    store.add('currents/loc000/-3/small', 'loc000 -3 24 01 05.png', 'currents/loc000/-3', 'image/png', 100)
+    store.remove('tides/loc000/3/4')
+    store.add('tides/loc000/3/calm', 'loc000 3 24 01 05.png', 'tides/loc000/3', 'image/png', 100)
+
+    report = validate(store, limits=LIMITS, expected=5)
+
+    assert report, report.summary()
+
+
+def test_a_missing_images_folder_raises(store):
+    with pytest.raises(ValueError):
+        validate(store, 'nowhere')
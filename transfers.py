@@ -0,0 +1,334 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload
+
+from drive_client import ITEM_FIELDS
+from tree_store import NONE, TreeStore
+
+# tree_builder (and the tt_dictionary Dictionary it builds) is imported only where a Dictionary
+# tree is filed into, so TreeStore-only callers such as sync_plan and dedup do not need it.
+
+CHUNK_SIZE = 4 * 2**20  # bytes per ranged GET or first resumable PUT, roughly the memory each transfer holds
+PART_SUFFIX = '.part'
+SIMPLE_UPLOAD_LIMIT = 5 * 2**20  # files up to this size go up in one multipart request
+CHUNK_ALIGN = 256 * 2**10  # resumable chunks must be multiples of 256 KiB
+MAX_CHUNK = 64 * 2**20
+CHUNK_SECONDS = 2.0  # resumable chunks are sized to take about this long at the measured rate
+
+
+def part_path(destination):
+    """ Downloads land in <destination>.part and are renamed into place once complete. """
+    destination = Path(destination)
+    return destination.with_name(destination.name + PART_SUFFIX)
+
+
+def download_file(client, file_id: str, destination, chunk_size: int = CHUNK_SIZE, size: int = None):
+    """
+    Streams a file to disk in ranged GETs of chunk_size, appending each chunk to
+    <destination>.part, which is renamed to destination when the last byte is in.
+    A .part file left by an interrupted download is resumed from its current length, and once
+    the rest is in, the .part is checked against the file's size and md5Checksum: one left by an
+    older version of the file (or holding its first bytes) is discarded and fetched again.
+    Replaces the io.BytesIO download, which held the whole file in memory (twice, with getvalue()).
+
+    Args:
+        client: a DriveClient.
+        file_id: the ID of a file with binary content (Google Docs have to be exported instead).
+        destination: the local path to save to.
+        chunk_size: the bytes requested per call.
+        size: the file size if known, which saves the request past the end of the file.
+
+    Returns:
+        int: the number of bytes fetched, 0 if the .part file was already complete.
+
+    Raises:
+        HttpError: the .part file is kept, so calling again resumes.
+    """
+    part = part_path(destination)
+    offset = part.stat().st_size if part.exists() else 0
+    if size is not None and offset > size:  # left over from an older version of the file
+        part.unlink()
+        offset = 0
+    request = client.files.get_media(fileId=file_id, supportsAllDrives=True)
+    fetched = 0
+    resumed, checked = offset > 0, False
+    with open(part, 'ab') as f:
+        while True:
+            response = None
+            if size is None or offset < size:
+                headers = dict(request.headers, range=f'bytes={offset}-{offset + chunk_size - 1}')
+                response, content = send(client, request.http, request.uri, 'GET', (200, 206, 416), headers=headers)
+            if response is None or response.status == 416:  # offset is at (or past) the end, nothing left to fetch
+                if checked or response is None and not resumed:
+                    break
+                checked = True
+                f.flush()
+                if part_matches(part, offset, client.get(file_id, 'size, md5Checksum')):
+                    break
+                f.truncate(0)
+                offset, size = 0, None
+                continue
+            if response.status == 200:  # the range was ignored and this is the whole file
+                f.seek(0)
+                f.truncate()
+                offset, size, resumed = 0, len(content), False
+            else:
+                size = int(response.get('content-range', '*/0').rsplit('/', 1)[1])
+            f.write(content)
+            offset += len(content)
+            fetched += len(content)
+            if not content:
+                break
+    os.replace(part, destination)
+    return fetched
+
+
+def part_matches(part, length: int, remote: dict):
+    """ Whether a .part file of length bytes is the whole of remote: the same size and, if Drive has one, md5Checksum. """
+    if int(remote.get('size', -1)) != length:
+        return False
+    if 'md5Checksum' not in remote:
+        return True
+    md5 = hashlib.md5()
+    with open(part, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            md5.update(block)
+    return md5.hexdigest() == remote['md5Checksum']
+
+
+def download_tree(client, store: TreeStore, destination, under=None, workers: int = 8, chunk_size: int = CHUNK_SIZE):
+    """
+    Pulls a whole subtree to destination, recreating its folders, with up to `workers` files
+    downloading at once. Files already on disk with the right size are skipped, and
+    interrupted downloads resume, so a failed pull can simply be run again.
+    Items without a size (Google Docs and other native files) have no content to download.
+
+    Args:
+        client: a DriveClient.
+        store: the Drive tree, e.g. from drive_store or TreeStore.from_master_dict.
+        destination: the local folder that takes the place of the subtree root.
+        under: a path or index in store, the first root if None.
+        workers: the number of concurrent downloads.
+
+    Returns:
+        dict: relative path -> HttpError, for every file that failed; empty, after saying so, if
+            under is not in store
+    """
+    if under is None:
+        root = store.roots[0] if store.roots else None
+    else:
+        root = store.resolve(under) if isinstance(under, str) else under
+    if root is None:
+        print('The tree is empty.' if under is None else f"Folder '{under}' not found in the tree.")
+        return {}
+    destination = Path(destination)
+    root_path = store.path(root)
+    jobs = []
+    for index in store.walk(root):
+        path = store.path(index)[len(root_path) + 1:]
+        target = destination / path
+        if store.is_folder(index):
+            target.mkdir(parents=True, exist_ok=True)
+        elif store.size[index] != NONE and not (target.exists() and target.stat().st_size == store.size[index]):
+            jobs.append((path, store.ids[index], target, store.size[index]))
+
+    def attempt(job):
+        path, file_id, target, size = job
+        try:
+            download_file(client, file_id, target, chunk_size, size)
+            return path, None
+        except HttpError as error:
+            return path, error
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return {path: error for path, error in pool.map(attempt, jobs) if error is not None}
+
+
+class UploadSessions:
+    """
+    Open resumable upload sessions by parent id and local path, saved as JSON so an interrupted
+    upload carries on from the bytes Drive already has on the next run. A session is only reused
+    while the local file is unchanged (size and mtime).
+
+    Args:
+        path: the sessions file, or None to keep them for this run only.
+    """
+
+    def __init__(self, path=None):
+        self.path = None if path is None else Path(path)
+        self.sessions = json.loads(self.path.read_text()) if self.path is not None and self.path.exists() else {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(file_path, parent_id: str):
+        return f'{parent_id}:{os.path.abspath(file_path)}'
+
+    def get(self, file_path, parent_id: str, stat: os.stat_result):
+        """ The session URI for this version of the file, or None. """
+        session = self.sessions.get(self.key(file_path, parent_id))
+        if session is None or session['size'] != stat.st_size or session['mtime_ns'] != stat.st_mtime_ns:
+            return None
+        return session['uri']
+
+    def put(self, file_path, parent_id: str, stat: os.stat_result, uri: str):
+        with self._lock:
+            self.sessions[self.key(file_path, parent_id)] = {'uri': uri, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            self.write()
+
+    def drop(self, file_path, parent_id: str):
+        with self._lock:
+            if self.sessions.pop(self.key(file_path, parent_id), None) is not None:
+                self.write()
+
+    def write(self):
+        if self.path is not None:
+            self.path.write_text(json.dumps(self.sessions))
+
+
+def adapt_chunk_size(chunk_size: int, seconds: float):
+    """
+    The next resumable chunk size: the bytes that take CHUNK_SECONDS at the rate just measured,
+    at most double or half the last chunk, in multiples of 256 KiB up to MAX_CHUNK.
+    """
+    target = chunk_size * CHUNK_SECONDS / max(seconds, 0.001)
+    target = min(max(target, chunk_size / 2), chunk_size * 2)
+    return int(min(max(target // CHUNK_ALIGN * CHUNK_ALIGN, CHUNK_ALIGN), MAX_CHUNK))
+
+
+def upload_resumable(client, file_path, parent_id: str, name: str = None, fields: str = ITEM_FIELDS,
+                     sessions: UploadSessions = None, chunk_size: int = CHUNK_SIZE):
+    """
+    Uploads a file through a resumable session, in chunks sized by adapt_chunk_size.
+    The session is recorded in sessions as soon as it is opened and dropped when the file is
+    created, so after a failure the same call asks Drive how much it has and sends the rest.
+
+    Returns:
+        dict: the new file's metadata (fields).
+
+    Raises:
+        HttpError: the session is kept, calling again resumes it.
+    """
+    file_path = Path(file_path)
+    stat = file_path.stat()
+    size = stat.st_size
+    sessions = UploadSessions() if sessions is None else sessions
+    media = MediaFileUpload(str(file_path), resumable=True)
+    body = {'name': name or file_path.name, 'parents': [parent_id]}
+    request = client.files.create(body=body, media_body=media, fields=fields, supportsAllDrives=True)
+    http = request.http
+
+    offset = None
+    uri = sessions.get(file_path, parent_id, stat)
+    if uri is not None:
+        response, content = send(client, http, uri, 'PUT', (200, 201, 308, 404, 410),
+                                 headers={'Content-Range': f'bytes */{size}', 'Content-Length': '0'})
+        if response.status in (200, 201):
+            sessions.drop(file_path, parent_id)
+            return _created(client, parent_id, body['name'], json.loads(content))
+        if response.status == 308:
+            offset = _received(response)
+    if offset is None:  # no session, or it expired (404, 410)
+        headers = dict(request.headers, **{'X-Upload-Content-Type': media.mimetype(), 'X-Upload-Content-Length': str(size)})
+        response, _ = send(client, http, request.uri, request.method, (200,), body=request.body, headers=headers)
+        uri = response['location']
+        sessions.put(file_path, parent_id, stat, uri)
+        offset = 0
+
+    with open(file_path, 'rb') as f:
+        while True:
+            f.seek(offset)
+            data = f.read(chunk_size)
+            content_range = f'bytes {offset}-{offset + len(data) - 1}/{size}' if data else f'bytes */{size}'
+            start = time.perf_counter()
+            response, content = send(client, http, uri, 'PUT', (200, 201, 308), body=data,
+                                     headers={'Content-Range': content_range, 'Content-Length': str(len(data))})
+            if response.status in (200, 201):
+                sessions.drop(file_path, parent_id)
+                return _created(client, parent_id, body['name'], json.loads(content))
+            offset = _received(response)
+            chunk_size = adapt_chunk_size(chunk_size, time.perf_counter() - start)
+
+
+def send(client, http, uri: str, method: str, expected: tuple, **kwargs):
+    """
+    One raw httplib2 request through client.scheduler, for the media calls googleapiclient
+    has no HttpRequest for. Any status not in expected raises an HttpError, which the scheduler
+    retries if it is a rate limit or server error. The bytes sent and received are counted
+    in the scheduler's metrics.
+    """
+    metrics = client.scheduler.metrics
+
+    def request():
+        response, content = http.request(uri, method, **kwargs)
+        metrics.count('bytes_sent', len(kwargs.get('body') or b''))
+        metrics.count('bytes_received', len(content or b''))
+        if response.status not in expected:
+            raise HttpError(response, content, uri=uri)
+        return response, content
+    return client.scheduler.call(request, method=f'media.{method.lower()}')
+
+
+def _created(client, parent_id: str, name: str, file: dict):
+    client.remember(parent_id, name, file['id'], file.get('mimeType'))
+    return file
+
+
+def _received(response):
+    """ The byte count Drive has, from the Range header of a 308 (none at all if it is missing). """
+    return int(response['range'].rsplit('-', 1)[1]) + 1 if 'range' in response else 0
+
+
+def upload_files(client, uploads, tree=None, sessions: UploadSessions = None, workers: int = 8, fields: str = ITEM_FIELDS):
+    """
+    Uploads many files with a pool of `workers`. Files up to SIMPLE_UPLOAD_LIMIT go up in a
+    single multipart request, larger ones through upload_resumable. Each new file is filed into
+    tree as soon as its upload finishes.
+
+    Args:
+        client: a DriveClient.
+        uploads: (local path, parent id) pairs.
+        tree: the cached tree to add new files to, a TreeStore or an id_item/id_name/name_id Dictionary.
+        sessions: where resumable sessions are kept, pass an UploadSessions with a path to resume across runs.
+        fields: the metadata returned for each file, it needs at least name and mimeType for tree.
+
+    Returns:
+        tuple: (local path -> new file metadata, local path -> the HttpError, or the OSError of a
+            local file that could not be read)
+    """
+    sessions = UploadSessions() if sessions is None else sessions
+    parents = None
+    if tree is not None and not isinstance(tree, TreeStore):
+        from tree_builder import add_item, finish_master_dict, parent_index
+        parents = parent_index(tree)
+    files, errors = {}, {}
+
+    def upload(file_path, parent_id):
+        if os.path.getsize(file_path) <= SIMPLE_UPLOAD_LIMIT:
+            return client.upload_file(file_path, parent_id, fields=fields)
+        return upload_resumable(client, file_path, parent_id, fields=fields, sessions=sessions)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(upload, file_path, parent_id): (file_path, parent_id) for file_path, parent_id in uploads}
+        for future in as_completed(futures):
+            file_path, parent_id = futures[future]
+            try:
+                file = files[file_path] = future.result()
+            except (HttpError, OSError) as error:
+                errors[file_path] = error
+                continue
+            if isinstance(tree, TreeStore):
+                if parent_id in tree:
+                    tree.add(file['id'], file['name'], parent_id, file['mimeType'], file.get('size'), file.get('md5Checksum'))
+            elif tree is not None and parent_id in tree['id_item']:
+                parent = parents[file['id']] = tree['id_item'][parent_id]  # parent_index maps an id to the Dictionary holding it
+                add_item(tree, parent, file)
+    if parents is not None:
+        finish_master_dict(tree)
+    return files, errors
@@ -0,0 +1,314 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+
+from googleapiclient.errors import HttpError
+
+from tt_dictionary.dictionary import Dictionary
+
+from scheduler import is_retryable
+
+FOLDER_MIMETYPE = 'application/vnd.google-apps.folder'
+INDEX_KEYS = ('name_id', 'id_item', 'id_name')
+PAGE_SIZE = 1000
+ITEMS_PER_FOLDER = 100  # used to estimate the size of a flat listing from the folder count
+
+
+def new_master_dict():
+    master_dict = Dictionary()
+    master_dict['name_id'] = None
+    master_dict['id_item'] = Dictionary()
+    master_dict['id_name'] = Dictionary()
+    return master_dict
+
+
+def add_item(master_dict, parent_dict, item: dict):
+    """
+    Files an item the way build_dict_from_folder does: the name becomes the key under its parent,
+    folders drop their mimeType, files keep it.
+
+    Returns:
+        Dictionary: the stored item, which is also the container for its children.
+    """
+    item = Dictionary(item)
+    name = item.pop('name')
+    item.pop('parents', None)
+    if item.get('mimeType') == FOLDER_MIMETYPE:
+        item.pop('mimeType')
+    master_dict['id_name'][item['id']] = name
+    master_dict['id_item'][item['id']] = item
+    parent_dict[name] = item
+    return item
+
+
+def finish_master_dict(master_dict):
+    master_dict['name_id'] = master_dict['id_name'].reverse()
+    return master_dict
+
+
+def parent_index(master_dict):
+    """
+    Walks the tree once and re-links id_item to the tree nodes (a JSON round trip leaves
+    them as separate copies).
+
+    Returns:
+        dict: id -> the Dictionary holding that item, master_dict itself for the start folder.
+    """
+    parents = {}
+    stack = []
+    master_dict['id_item'] = Dictionary()
+    master_dict['id_name'] = Dictionary(master_dict['id_name'])
+    for name in master_dict:
+        if name not in INDEX_KEYS:
+            parents[master_dict[name]['id']] = master_dict
+            stack.append(master_dict[name])
+    while stack:
+        node = stack.pop()
+        master_dict['id_item'][node['id']] = node
+        for child in node.values():
+            if isinstance(child, dict):
+                parents[child['id']] = node
+                stack.append(child)
+    return parents
+
+
+def detach(master_dict, parents: dict, file_id: str):
+    """ Removes an item and everything under it from the tree and the id maps. """
+    parent = parents.get(file_id)
+    if parent is None:
+        return
+    item = master_dict['id_item'][file_id]
+    name = master_dict['id_name'][file_id]
+    if parent.get(name) is item:
+        parent.pop(name)
+    stack = [item]
+    while stack:
+        node = stack.pop()
+        master_dict['id_item'].pop(node['id'], None)
+        master_dict['id_name'].pop(node['id'], None)
+        parents.pop(node['id'], None)
+        stack.extend(child for child in node.values() if isinstance(child, dict))
+
+
+def place(master_dict, parents: dict, file: dict, parent_dict):
+    """
+    Files a changed item under parent_dict, as a new item or by renaming/moving the existing one.
+
+    Returns:
+        bool: True if the item is a folder new to the tree, whose contents still need listing.
+    """
+    file_id = file['id']
+    metadata = {k: v for k, v in file.items() if k in ('id', 'name', 'mimeType', 'size')}
+    item = master_dict['id_item'].get(file_id)
+    if item is None:
+        add_item(master_dict, parent_dict, metadata)
+        parents[file_id] = parent_dict
+        return file.get('mimeType') == FOLDER_MIMETYPE
+
+    old_parent = parents[file_id]
+    old_name = master_dict['id_name'][file_id]
+    if old_parent.get(old_name) is item:
+        old_parent.pop(old_name)
+    if file.get('mimeType') != FOLDER_MIMETYPE:
+        item.update({k: v for k, v in metadata.items() if k in ('mimeType', 'size')})
+    parent_dict[file['name']] = item
+    master_dict['id_name'][file_id] = file['name']
+    parents[file_id] = parent_dict
+    return False
+
+
+def apply_file(master_dict, parents: dict, file: dict):
+    """
+    Brings one item in the tree in line with its current metadata. The start folder can only be
+    renamed, anything else is renamed, moved or added under its parent.
+
+    Returns:
+        bool: True for a folder new to the tree, False otherwise, None if its parent is not in the tree.
+    """
+    file_id = file['id']
+    if parents.get(file_id) is master_dict:
+        old_name = master_dict['id_name'][file_id]
+        master_dict[file['name']] = master_dict.pop(old_name)
+        master_dict['id_name'][file_id] = file['name']
+        return False
+    parent_id = next((p for p in file.get('parents', []) if p in master_dict['id_item']), None)
+    if parent_id is None:
+        return None
+    return place(master_dict, parents, file, master_dict['id_item'][parent_id])
+
+
+def crawl_folder(client, folder_name: str, concurrency: int = 8):
+    """
+    Breadth-first replacement for build_dict_from_folder. Each level of the tree is listed
+    with up to `concurrency` files().list calls in flight, so crawl time is bound by
+    tree depth x round-trip latency rather than folder count x round-trip latency.
+
+    Args:
+        client: a DriveClient.
+        folder_name: the name of a top-level folder in My Drive.
+        concurrency: the maximum number of list requests in flight.
+
+    Returns:
+        dict: the same id_item/id_name/name_id Dictionary build_dict_from_folder returns.
+    """
+    master_dict = new_master_dict()
+    folder_id = client.find_folder(folder_name)
+    if folder_id is None:
+        print(f"Folder '{folder_name}' not found at the highest level of your Drive.")
+        return finish_master_dict(master_dict)
+
+    try:
+        root = add_item(master_dict, master_dict, client.get(folder_id))
+    except HttpError as error:
+        print(f"Error fetching metadata for start folder ID '{folder_id}': {error}")
+        return finish_master_dict(master_dict)
+
+    crawl_subtrees(client, master_dict, [(folder_id, root)], concurrency)
+    return finish_master_dict(master_dict)
+
+
+def crawl_subtrees(client, master_dict, frontier: list, concurrency: int = 8):
+    """
+    Lists the descendants of each (folder id, folder Dictionary) in frontier, level by level,
+    filing them into master_dict. Items already in id_item are left where they are.
+    A folder that can no longer be listed (deleted or unshared mid-crawl) is skipped, but rate
+    limit and server errors the client's scheduler could not retry away are raised, rather than
+    leaving the tree without that subtree.
+    """
+    def list_children(current_folder_id):
+        try:
+            return client.list_children(current_folder_id)
+        except HttpError as error:
+            if is_retryable(error):
+                raise
+            print(f"An error occurred while fetching descendants of folder ID '{current_folder_id}': {error}")
+            return []
+
+    metrics = client.scheduler.metrics
+    level = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while frontier:
+            print(f'{2 * level * " "}level {level}: {len(frontier)} folders')
+            metrics.set('crawl_frontier', len(frontier))
+            next_frontier = []
+            for (_, folder_dict), children in zip(frontier, pool.map(list_children, [f[0] for f in frontier])):
+                metrics.count('folders_listed')
+                for child in children:
+                    if child['id'] in master_dict['id_item']:
+                        continue
+                    is_folder = child.get('mimeType') == FOLDER_MIMETYPE
+                    stored = add_item(master_dict, folder_dict, child)
+                    if is_folder:
+                        next_frontier.append((stored['id'], stored))
+            frontier = next_frontier
+            level += 1
+    metrics.set('crawl_frontier', 0)
+
+
+def flat_build(client, folder_name: str):
+    """
+    Builds the tree from a flat listing of the whole Drive: every item is fetched in pages of 1000
+    and the subtree under folder_name is assembled locally from the parents links.
+    API calls scale with items / 1000 rather than with the number of folders.
+
+    Returns:
+        dict: the same id_item/id_name/name_id Dictionary crawl_folder returns.
+    """
+    master_dict = new_master_dict()
+    folder_id = client.find_folder(folder_name)
+    if folder_id is None:
+        print(f"Folder '{folder_name}' not found at the highest level of your Drive.")
+        return finish_master_dict(master_dict)
+
+    try:
+        items = client.list_all()
+    except HttpError as error:
+        print(f"An error occurred while fetching files: {error}")
+        return finish_master_dict(master_dict)
+    print(f'Got {len(items)} files from Google Drive.')
+
+    return assemble_subtree(items, folder_id)
+
+
+def assemble_subtree(items: list, folder_id: str):
+    """
+    Assembles the id_item/id_name/name_id Dictionary for the subtree under folder_id
+    from a flat list of items carrying their parents. An item with several parents is filed
+    once, under the first one reached, as crawl_subtrees does.
+    """
+    master_dict = new_master_dict()
+    children = {}
+    root = None
+    for item in items:
+        if item['id'] == folder_id:
+            root = item
+        for parent in item.get('parents', []):
+            children.setdefault(parent, []).append(item)
+    if root is None:
+        return finish_master_dict(master_dict)
+
+    frontier = deque([(folder_id, add_item(master_dict, master_dict, root))])
+    while frontier:
+        current_folder_id, folder_dict = frontier.popleft()
+        for child in children.get(current_folder_id, []):
+            if child['id'] in master_dict['id_item']:
+                continue
+            stored = add_item(master_dict, folder_dict, child)
+            if child.get('mimeType') == FOLDER_MIMETYPE:
+                frontier.append((stored['id'], stored))
+
+    return finish_master_dict(master_dict)
+
+
+def choose_build_mode(client, folder_name: str, items_per_folder: int = ITEMS_PER_FOLDER):
+    """
+    Estimates the API calls of both build modes from a folder-only listing of the Drive.
+    A crawl makes at least one list call per folder in the subtree; a flat listing makes one call
+    per 1000 items in the whole Drive, estimated as folders x items_per_folder.
+
+    Returns:
+        str: 'flat' or 'crawl'
+    """
+    folder_id = client.find_folder(folder_name)
+    if folder_id is None:
+        return 'crawl'
+    try:
+        folders = client.list_all_folders()
+    except HttpError as error:
+        print(f"An error occurred while estimating the size of '{folder_name}': {error}")
+        return 'crawl'
+
+    children = {}
+    for folder in folders:
+        for parent in folder.get('parents', []):
+            children.setdefault(parent, []).append(folder['id'])
+    subtree_folders = 0
+    frontier = [folder_id]
+    while frontier:
+        subtree_folders += 1
+        frontier.extend(children.get(frontier.pop(), []))
+
+    crawl_calls = subtree_folders
+    flat_calls = ceil(len(folders) * (1 + items_per_folder) / PAGE_SIZE)
+    mode = 'flat' if flat_calls < crawl_calls else 'crawl'
+    print(f"'{folder_name}': {subtree_folders} of {len(folders)} folders, crawl ~{crawl_calls} calls, flat ~{flat_calls} calls, using {mode}")
+    return mode
+
+
+def build_tree(client, folder_name: str, mode: str = 'auto', concurrency: int = 8):
+    """
+    Builds the id_item/id_name/name_id Dictionary for folder_name.
+
+    Args:
+        client: a DriveClient.
+        folder_name: the name of a top-level folder in My Drive.
+        mode: 'crawl', 'flat' or 'auto' to pick from the estimated tree size.
+        concurrency: the maximum number of list requests in flight while crawling.
+    """
+    if mode == 'auto':
+        mode = choose_build_mode(client, folder_name)
+    if mode == 'flat':
+        return flat_build(client, folder_name)
+    if mode == 'crawl':
+        return crawl_folder(client, folder_name, concurrency)
+    raise ValueError(f"unknown build mode '{mode}'")
@@ -0,0 +1,94 @@
+import os
+from pathlib import Path
+
+from googleapiclient.errors import HttpError
+
+from tt_dictionary.dictionary import Dictionary
+
+from tree_builder import apply_file, build_tree, crawl_subtrees, detach, finish_master_dict, parent_index
+
+
+def token_path(json_path):
+    """ The changes start page token is saved next to the JSON, google_drive.json -> google_drive.token """
+    return Path(json_path).with_suffix('.token')
+
+
+def read_token(json_path):
+    path = token_path(json_path)
+    return path.read_text().strip() if path.exists() else None
+
+
+def write_token(json_path, token: str):
+    token_path(json_path).write_text(token)
+
+
+def apply_changes(client, master_dict, changes: list, concurrency: int = 8):
+    """
+    Applies adds, renames, moves, trashes and deletes from the changes feed to master_dict.
+    Only folders that are new to the tree are listed, to pick up contents moved in with them.
+    """
+    parents = parent_index(master_dict)
+    new_folders = []
+    pending = changes
+    while pending:
+        deferred = []
+        for change in pending:
+            file_id = change['fileId']
+            file = change.get('file')
+            if change.get('removed') or file is None or file.get('trashed'):
+                detach(master_dict, parents, file_id)
+                continue
+            new_folder = apply_file(master_dict, parents, file)
+            if new_folder is None:
+                deferred.append(change)
+            elif new_folder:
+                new_folders.append((file_id, master_dict['id_item'][file_id]))
+        if len(deferred) == len(pending):
+            # nothing left can be placed, so these are outside the tree (or were moved out of it)
+            for change in deferred:
+                detach(master_dict, parents, change['fileId'])
+            break
+        pending = deferred
+
+    new_folders = [(file_id, folder) for file_id, folder in new_folders if file_id in master_dict['id_item']]
+    if new_folders:
+        crawl_subtrees(client, master_dict, new_folders, concurrency)
+    return finish_master_dict(master_dict)
+
+
+def refresh_tree(client, master_dict, page_token: str, concurrency: int = 8):
+    """
+    Brings a cached tree up to date from the changes feed.
+
+    Returns:
+        tuple: (the number of changes applied, the page token for the next refresh)
+    """
+    changes, new_token = client.list_changes(page_token)
+    apply_changes(client, master_dict, changes, concurrency)
+    return len(changes), new_token
+
+
+def load_tree(client, folder_name: str, json_path, mode: str = 'auto', concurrency: int = 8):
+    """
+    Loads the cached tree at json_path and refreshes it from the changes feed, or builds it
+    from scratch if there is no cache or saved token (or the token is no longer valid).
+    The token is taken before a full build, so changes made during the crawl are replayed next time.
+    """
+    token = read_token(json_path)
+    if os.path.exists(json_path) and token is not None:
+        master_dict = Dictionary(json_source=json_path)
+        try:
+            count, token = refresh_tree(client, master_dict, token, concurrency)
+            print(f'applied {count} changes to {json_path}')
+            if count:
+                master_dict.write(json_path)
+            write_token(json_path, token)
+            return master_dict
+        except HttpError as error:
+            print(f"An error occurred while reading the changes feed, rebuilding: {error}")
+
+    token = client.start_page_token()
+    master_dict = build_tree(client, folder_name, mode, concurrency)
+    master_dict.write(json_path)
+    write_token(json_path, token)
+    return master_dict
@@ -0,0 +1,249 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from tree_store import NONE, TreeStore
+
+MAGIC = b'GDTS'
+VERSION = 2  # 2 adds the md5 string table
+HEADER = struct.Struct('<4sII')  # magic, version, length of the JSON section table that follows
+ALIGN = 8
+
+
+def write_snapshot(store: TreeStore, path):
+    """
+    Writes a TreeStore as a columnar snapshot: one raw array per column plus string tables,
+    laid out so open_snapshot can memory-map it and answer queries without parsing the file.
+
+    Nodes are renumbered in pre-order, which makes a node's index its enter number and lets
+    the subtree of node i be the index range [i, leave[i]).
+    """
+    order = []
+    for root in store.roots:
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(reversed(list(store.children(node))))
+    new_index = {old: new for new, old in enumerate(order)}
+    count = len(order)
+
+    names = sorted({store.names[store.name[old]] for old in order})
+    name_code = {name: code for code, name in enumerate(names)}
+    mimetypes = store.mimetypes
+
+    parent = array('i', [NONE]) * count
+    first_child = array('i', [NONE]) * count
+    next_sibling = array('i', [NONE]) * count
+    leave = array('i', range(1, count + 1))
+    name = array('i', [0]) * count
+    mime = array('B', [0]) * count
+    size = array('q', [NONE]) * count
+    for new, old in enumerate(order):
+        old_parent = store.parent[old]
+        parent[new] = NONE if old_parent == NONE else new_index[old_parent]
+        children = [new_index[child] for child in store.children(old)]
+        if children:
+            first_child[new] = children[0]
+            for before, after in zip(children, children[1:]):
+                next_sibling[before] = after
+        name[new] = name_code[store.names[store.name[old]]]
+        mime[new] = store.mime[old]
+        size[new] = store.size[old]
+    for new in range(count - 1, -1, -1):
+        if parent[new] != NONE:
+            leave[parent[new]] = max(leave[parent[new]], leave[new])
+
+    name_head, next_same_name = _chains(name, len(names))
+    mime_head, next_same_mime = _chains(mime, len(mimetypes))
+    ids = [store.ids[old] for old in order]
+    id_sorted = array('i', sorted(range(count), key=ids.__getitem__))
+    id_offsets, id_blob = _string_table(ids)
+    name_offsets, name_blob = _string_table(names)
+    md5_offsets, md5_blob = _string_table(store.md5.get(old, '') for old in order)
+
+    sections = {'parent': parent, 'first_child': first_child, 'next_sibling': next_sibling, 'leave': leave,
+                'name': name, 'mime': mime, 'size': size, 'name_head': name_head, 'next_same_name': next_same_name,
+                'mime_head': mime_head, 'next_same_mime': next_same_mime, 'id_sorted': id_sorted,
+                'id_offsets': id_offsets, 'id_blob': id_blob, 'name_offsets': name_offsets, 'name_blob': name_blob,
+                'md5_offsets': md5_offsets, 'md5_blob': md5_blob}
+    table = {'byteorder': sys.byteorder, 'nodes': count, 'mimetypes': mimetypes,
+             'roots': [new_index[root] for root in store.roots], 'sections': {}}
+    offset = 0
+    for key, column in sections.items():
+        table['sections'][key] = [offset, column.typecode, len(column)]
+        offset += _aligned(len(column) * column.itemsize)
+    meta = json.dumps(table).encode()
+    start = _aligned(HEADER.size + len(meta))
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(meta)))
+        f.write(meta)
+        f.write(b'\0' * (start - HEADER.size - len(meta)))
+        for column in sections.values():
+            data = column.tobytes()
+            f.write(data)
+            f.write(b'\0' * (_aligned(len(data)) - len(data)))
+
+
+def open_snapshot(path):
+    """ Memory-maps a snapshot. Nothing is decoded until a query needs it. """
+    return SnapshotTree(path)
+
+
+class SnapshotTree(TreeStore):
+    """
+    A read-only TreeStore over a memory-mapped snapshot. The columns are memoryviews into the
+    file and ids and names are decoded on access, so opening the file costs the same for any
+    tree size. Lookups by id and name binary-search the sorted tables.
+    Use to_store() for a mutable copy, and to_master_dict() to export the JSON shape.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_length = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} tree snapshot')
+        table = json.loads(self._mmap[HEADER.size:HEADER.size + meta_length])
+        if table['byteorder'] != sys.byteorder:
+            raise ValueError(f'{path} was written on a {table["byteorder"]}-endian machine')
+        start = _aligned(HEADER.size + meta_length)
+        view = memoryview(self._mmap)
+        columns = {}
+        for key, (offset, typecode, length) in table['sections'].items():
+            itemsize = array(typecode).itemsize
+            columns[key] = view[start + offset:start + offset + length * itemsize].cast(typecode)
+
+        for key in ('parent', 'first_child', 'next_sibling', 'name', 'mime', 'size',
+                    'name_head', 'next_same_name', 'mime_head', 'next_same_mime'):
+            setattr(self, key, columns[key])
+        self.ids = _StringTable(columns['id_offsets'], columns['id_blob'])
+        self.names = _StringTable(columns['name_offsets'], columns['name_blob'])
+        self.id_index = _SortedLookup(self.ids, columns['id_sorted'])
+        self.name_codes = _SortedLookup(self.names)
+        self.md5 = _OptionalStrings(_StringTable(columns['md5_offsets'], columns['md5_blob']))
+        self.mimetypes = table['mimetypes']
+        self.mime_codes = {mimetype: code for code, mimetype in enumerate(self.mimetypes)}
+        self.roots = table['roots']
+        self._enter = _Identity()
+        self._exit = columns['leave']
+
+    def add(self, *args, **kwargs):
+        raise TypeError('a snapshot is read-only, use to_store() for a mutable copy')
+
+    remove = add
+
+    def to_store(self):
+        store = TreeStore()
+        for index in self.walk():
+            parent = self.parent[index]
+            store.add(self.ids[index], self.names[self.name[index]], None if parent == NONE else self.ids[parent],
+                      self.mimetypes[self.mime[index]], None if self.size[index] == NONE else self.size[index],
+                      self.md5.get(index))
+        return store
+
+
+class _StringTable:
+    """ A sequence of strings stored as one UTF-8 blob and an offsets column. """
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int):
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]]).decode()
+
+
+class _OptionalStrings:
+    """ dict-like index -> string view of a string table where '' means no value. """
+
+    def __init__(self, strings: _StringTable):
+        self._strings = strings
+
+    def get(self, index: int, default=None):
+        return self._strings[index] or default
+
+    def __contains__(self, index: int):
+        return bool(self._strings[index])
+
+    def __getitem__(self, index: int):
+        value = self._strings[index]
+        if not value:
+            raise KeyError(index)
+        return value
+
+
+class _SortedLookup:
+    """ dict-like string -> index lookup by binary search over a sorted (or sort-permuted) string table. """
+
+    def __init__(self, strings, order=None):
+        self._strings = strings
+        self._order = order
+
+    def __len__(self):
+        return len(self._strings)
+
+    def _key(self, position: int):
+        return self._strings[position if self._order is None else self._order[position]]
+
+    def get(self, key: str, default=None):
+        position = bisect_left(_Keys(self), key)
+        if position < len(self) and self._key(position) == key:
+            return position if self._order is None else self._order[position]
+        return default
+
+    def __getitem__(self, key: str):
+        index = self.get(key)
+        if index is None:
+            raise KeyError(key)
+        return index
+
+    def __contains__(self, key: str):
+        return self.get(key) is not None
+
+
+class _Keys:
+    def __init__(self, lookup: _SortedLookup):
+        self._lookup = lookup
+
+    def __len__(self):
+        return len(self._lookup)
+
+    def __getitem__(self, position: int):
+        return self._lookup._key(position)
+
+
+class _Identity:
+    """ Pre-order numbering makes every node's enter number its own index. """
+
+    def __getitem__(self, index: int):
+        return index
+
+
+def _chains(codes, code_count: int):
+    heads = array('i', [NONE]) * code_count
+    chain = array('i', [NONE]) * len(codes)
+    for index in range(len(codes) - 1, -1, -1):
+        chain[index] = heads[codes[index]]
+        heads[codes[index]] = index
+    return heads, chain
+
+
+def _string_table(strings):
+    blob = bytearray()
+    offsets = array('q', [0])
+    for string in strings:
+        blob += string.encode()
+        offsets.append(len(blob))
+    return offsets, array('B', blob)
+
+
+def _aligned(length: int):
+    return (length + ALIGN - 1) // ALIGN * ALIGN
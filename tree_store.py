@@ -0,0 +1,351 @@
+from array import array
+
+FOLDER_MIMETYPE = 'application/vnd.google-apps.folder'
+NONE = -1
+REMOVED = -2  # parent of a deleted node
+
+
+class TreeStore:
+    """
+    A Drive (or file system) tree held in flat, column-oriented arrays instead of one
+    Dictionary per item. Node i is described by ids[i] and the i-th entry of each column:
+    interned name code, parent index, mimetype code and size. Children are chained through
+    first_child/next_sibling, and items sharing a name or a mimetype through doubly linked
+    chains, so lookups by id, name and mimetype are O(1), the name and mimetype indexes are kept
+    up to date by add and remove, and parent/child walks touch only integers. Path prefix
+    filters use pre-order enter/exit numbers, recomputed on the first query after a change.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.id_index = {}
+        self.name = array('i')
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.last_child = array('i')
+        self.next_sibling = array('i')
+        self.next_same_name = array('i')
+        self.prev_same_name = array('i')
+        self.next_same_mime = array('i')
+        self.prev_same_mime = array('i')
+        self.mime = array('B')
+        self.size = array('q')
+        self.md5 = {}  # index -> md5Checksum, only for items that have one
+        self.names = []
+        self.name_codes = {}
+        self.name_head = array('i')
+        self.mimetypes = [FOLDER_MIMETYPE]
+        self.mime_codes = {FOLDER_MIMETYPE: 0}
+        self.mime_head = array('i', [NONE])
+        self.roots = []
+        self._enter = None
+        self._exit = None
+
+    def __len__(self):
+        return len(self.id_index)
+
+    def __contains__(self, file_id: str):
+        return file_id in self.id_index
+
+    def _intern(self, name: str):
+        code = self.name_codes.get(name)
+        if code is None:
+            code = self.name_codes[name] = len(self.names)
+            self.names.append(name)
+            self.name_head.append(NONE)
+        return code
+
+    def _mime_code(self, mimetype: str):
+        code = self.mime_codes.get(mimetype)
+        if code is None:
+            code = self.mime_codes[mimetype] = len(self.mimetypes)
+            self.mimetypes.append(mimetype)
+            self.mime_head.append(NONE)
+        return code
+
+    # building
+
+    def add(self, file_id: str, name: str, parent_id: str = None, mimetype: str = FOLDER_MIMETYPE, size=None, md5: str = None):
+        """
+        Adds an item under parent_id, or as a root when parent_id is None. Returns its index.
+        An id already in the tree keeps its first place: Drive items can have several parents,
+        and a tree holds each item once.
+        """
+        if file_id in self.id_index:
+            return self.id_index[file_id]
+        index = len(self.ids)
+        parent = NONE if parent_id is None else self.id_index[parent_id]
+        code = self._intern(name)
+        self.ids.append(file_id)
+        self.id_index[file_id] = index
+        self.name.append(code)
+        self.parent.append(parent)
+        self.first_child.append(NONE)
+        self.last_child.append(NONE)
+        self.next_sibling.append(NONE)
+        self.next_same_name.append(NONE)
+        self.prev_same_name.append(NONE)
+        self.next_same_mime.append(NONE)
+        self.prev_same_mime.append(NONE)
+        self.mime.append(self._mime_code(mimetype))
+        self.size.append(NONE if size is None else int(size))
+        if md5 is not None:
+            self.md5[index] = md5
+        self._link(self.name_head, self.next_same_name, self.prev_same_name, code, index)
+        self._link(self.mime_head, self.next_same_mime, self.prev_same_mime, self.mime[index], index)
+        self._enter = None
+        if parent == NONE:
+            self.roots.append(index)
+        elif self.last_child[parent] == NONE:
+            self.first_child[parent] = self.last_child[parent] = index
+        else:
+            self.next_sibling[self.last_child[parent]] = index
+            self.last_child[parent] = index
+        return index
+
+    def remove(self, file_id: str):
+        """ Removes an item and everything under it. The array slots are left as tombstones. """
+        index = self.id_index.get(file_id)
+        if index is None:
+            return
+        parent = self.parent[index]
+        if parent == NONE:
+            self.roots.remove(index)
+        else:
+            previous = self._unlink(self.first_child, self.next_sibling, parent, index)
+            if self.last_child[parent] == index:
+                self.last_child[parent] = previous
+        for node in self._subtree(index):
+            self._unlink_both(self.name_head, self.next_same_name, self.prev_same_name, self.name[node], node)
+            self._unlink_both(self.mime_head, self.next_same_mime, self.prev_same_mime, self.mime[node], node)
+            del self.id_index[self.ids[node]]
+            self.md5.pop(node, None)
+            self.parent[node] = REMOVED
+        self._enter = None
+
+    def _unlink(self, heads, chain, head: int, index: int):
+        """ Takes index out of the chain starting at heads[head], returns the node before it or NONE. """
+        if heads[head] == index:
+            heads[head] = chain[index]
+            return NONE
+        node = heads[head]
+        while chain[node] != index:
+            node = chain[node]
+        chain[node] = chain[index]
+        return node
+
+    @staticmethod
+    def _link(heads, chain, back, head: int, index: int):
+        first = heads[head]
+        chain[index] = first
+        if first != NONE:
+            back[first] = index
+        heads[head] = index
+
+    @staticmethod
+    def _unlink_both(heads, chain, back, head: int, index: int):
+        before, after = back[index], chain[index]
+        if before == NONE:
+            heads[head] = after
+        else:
+            chain[before] = after
+        if after != NONE:
+            back[after] = before
+
+    # queries
+
+    def index(self, file_id: str):
+        return self.id_index[file_id]
+
+    def get(self, file_id: str):
+        """ The item as a plain dict (id, name, mimeType, size), or None. """
+        index = self.id_index.get(file_id)
+        return None if index is None else self.item(index)
+
+    def item(self, index: int):
+        item = {'id': self.ids[index], 'name': self.names[self.name[index]], 'mimeType': self.mimetypes[self.mime[index]]}
+        if self.size[index] != NONE:
+            item['size'] = self.size[index]
+        md5 = self.md5.get(index)
+        if md5 is not None:
+            item['md5Checksum'] = md5
+        return item
+
+    def is_folder(self, index: int):
+        return self.mime[index] == 0
+
+    def _chain(self, first: int, chain, under):
+        found = []
+        node = first
+        if under is None:
+            while node != NONE:
+                found.append(node)
+                node = chain[node]
+            return found
+        low, high = self.span(under)
+        if low == high:
+            return found
+        enter = self._enter
+        while node != NONE:
+            if low <= enter[node] < high:
+                found.append(node)
+            node = chain[node]
+        return found
+
+    def find(self, name: str, under=None):
+        """ Indexes of every item called name, optionally only those under a path or index. """
+        code = self.name_codes.get(name)
+        return [] if code is None else self._chain(self.name_head[code], self.next_same_name, under)
+
+    def find_mimetype(self, mimetype: str, under=None):
+        """ Indexes of every item of a mimetype, optionally only those under a path or index. """
+        code = self.mime_codes.get(mimetype)
+        return [] if code is None else self._chain(self.mime_head[code], self.next_same_mime, under)
+
+    def sizes(self, mimetype: str, under=None):
+        """ (index, size) of every item of a mimetype that has a size. """
+        size = self.size
+        return [(index, size[index]) for index in self.find_mimetype(mimetype, under) if size[index] != NONE]
+
+    def duplicates(self, under=None):
+        """
+        Files with the same md5Checksum and size, found through one (md5, size) -> indexes map.
+        Items without an md5 (folders, Google Docs) are left out.
+
+        Returns:
+            list: one list of indexes per set of two or more identical files, in tree order.
+        """
+        groups = {}
+        start = self.resolve(under) if isinstance(under, str) else under
+        if under is not None and start is None:
+            return []
+        nodes = self.walk(start)
+        for index in nodes:
+            md5 = self.md5.get(index)
+            if md5 is not None:
+                groups.setdefault((md5, self.size[index]), []).append(index)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def resolve(self, path: str):
+        """ The index of the item at a '/' separated path from a root, or None. """
+        parts = path.strip('/').split('/')
+        candidates = self.roots
+        node = None
+        for part in parts:
+            code = self.name_codes.get(part)
+            node = next((c for c in candidates if self.name[c] == code), None)
+            if node is None:
+                return None
+            candidates = self.children(node)
+        return node
+
+    def span(self, under):
+        """
+        The [enter, exit) pre-order numbers of the subtree at a path or index; a node is in the
+        subtree when its enter number falls inside. (0, 0), which holds nothing, if under is not found.
+        """
+        if self._enter is None:
+            self._number()
+        index = self.resolve(under) if isinstance(under, str) else under
+        if index is None:
+            return 0, 0
+        return self._enter[index], self._exit[index]
+
+    def _number(self):
+        enter = array('i', [NONE]) * len(self.ids)
+        leave = array('i', [NONE]) * len(self.ids)
+        counter = 0
+        for root in self.roots:
+            stack = [(root, False)]
+            while stack:
+                node, done = stack.pop()
+                if done:
+                    leave[node] = counter
+                    continue
+                enter[node] = counter
+                counter += 1
+                stack.append((node, True))
+                stack.extend((child, False) for child in self.children(node))
+        self._enter, self._exit = enter, leave
+
+    def children(self, index: int):
+        node = self.first_child[index]
+        while node != NONE:
+            yield node
+            node = self.next_sibling[node]
+
+    def parent_of(self, index: int):
+        parent = self.parent[index]
+        return None if parent == NONE else parent
+
+    def path(self, index: int):
+        parts = []
+        while index != NONE:
+            parts.append(self.names[self.name[index]])
+            index = self.parent[index]
+        return '/'.join(reversed(parts))
+
+    def _subtree(self, index: int):
+        nodes = [index]
+        for node in nodes:
+            nodes.extend(self.children(node))
+        return nodes
+
+    def walk(self, index: int = None):
+        """ Indexes of every live node under index (all roots when None), parents before children. """
+        nodes = list(self.roots) if index is None else [index]
+        for node in nodes:
+            yield node
+            nodes.extend(self.children(node))
+
+    # conversion
+
+    @classmethod
+    def from_drive_items(cls, items: list, root_id: str):
+        """ Builds the subtree under root_id from a flat listing with parents, as flat_build fetches it. """
+        children = {}
+        root = None
+        for item in items:
+            if item['id'] == root_id:
+                root = item
+            for parent in item.get('parents', []):
+                children.setdefault(parent, []).append(item)
+        store = cls()
+        if root is None:
+            return store
+        store.add(root['id'], root['name'], None, root.get('mimeType', FOLDER_MIMETYPE), root.get('size'), root.get('md5Checksum'))
+        frontier = [root_id]
+        for folder_id in frontier:
+            for child in children.get(folder_id, []):
+                if child['id'] in store:
+                    continue  # also under another parent, kept where it was found first
+                store.add(child['id'], child['name'], folder_id, child['mimeType'], child.get('size'), child.get('md5Checksum'))
+                if child['mimeType'] == FOLDER_MIMETYPE:
+                    frontier.append(child['id'])
+        return store
+
+    @classmethod
+    def from_master_dict(cls, master_dict):
+        """ Loads the id_item/id_name/name_id Dictionary (e.g. from google_drive.json). """
+        from tree_builder import INDEX_KEYS  # not at the top: it pulls in googleapiclient, which loading a snapshot never needs
+        store = cls()
+        queue = [(name, item, None) for name, item in master_dict.items() if name not in INDEX_KEYS]
+        for name, item, parent_id in queue:
+            store.add(item['id'], name, parent_id, item.get('mimeType', FOLDER_MIMETYPE), item.get('size'), item.get('md5Checksum'))
+            queue.extend((child_name, child, item['id']) for child_name, child in item.items() if isinstance(child, dict))
+        return store
+
+    def to_master_dict(self):
+        """ Exports the id_item/id_name/name_id Dictionary that is written to google_drive.json. """
+        from tree_builder import add_item, finish_master_dict, new_master_dict
+        master_dict = new_master_dict()
+        stored = {}
+        for index in self.walk():
+            item = {'id': self.ids[index], 'name': self.names[self.name[index]], 'mimeType': self.mimetypes[self.mime[index]]}
+            if self.size[index] != NONE:
+                item['size'] = str(self.size[index])
+            if index in self.md5:
+                item['md5Checksum'] = self.md5[index]
+            parent = self.parent[index]
+            stored[index] = add_item(master_dict, master_dict if parent == NONE else stored[parent], item)
+        return finish_master_dict(master_dict)
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+from tree_store import NONE
+
+PNG_MIMETYPE = 'image/png'
+IMAGES_PER_FOLDER = 427
+Z_LIMIT = 3.0
+
+
+class ValidationReport:
+    """
+    What validate found in an images tree (<root>/<type>/<location>/<speed>/<image>.png):
+        counts: speed folders without the expected number of PNGs (type, location, speed, count)
+        oversized: PNGs over their type's size limit (path, id, type, size, limit)
+        outliers: PNGs whose size z-score within their type is over the limit (path, id, type, size, average, z, limit)
+        folders, images: how many speed folders and PNGs were checked
+    """
+
+    def __init__(self, counts: pd.DataFrame, oversized: pd.DataFrame, outliers: pd.DataFrame, folders: int, images: int):
+        self.counts = counts
+        self.oversized = oversized
+        self.outliers = outliers
+        self.folders = folders
+        self.images = images
+
+    def __bool__(self):
+        """ True when every check passed. """
+        return self.counts.empty and self.oversized.empty and self.outliers.empty
+
+    def summary(self):
+        return (f'{self.images} images in {self.folders} folders: {len(self.counts)} folders with the wrong count, '
+                f'{len(self.oversized)} oversized, {len(self.outliers)} outliers')
+
+
+def _up(parent, nodes):
+    """ The parent of each node, NONE for nodes that are NONE (or removed) themselves. """
+    live = nodes >= 0
+    return np.where(live, parent[np.where(live, nodes, 0)], NONE)
+
+
+def _under(parent, nodes, root: int, depth: int):
+    """ The nodes exactly depth levels under root, and their ancestors below root, nearest first. """
+    ancestors = [_up(parent, nodes)]
+    for _ in range(depth - 1):
+        ancestors.append(_up(parent, ancestors[-1]))
+    keep = ancestors[-1] == root
+    return nodes[keep], [level[keep] for level in ancestors[:-1]]
+
+
+def _strings(table, indexes):
+    """ table[i] for each i in indexes, as an object array. """
+    if isinstance(table, np.ndarray):
+        return table[indexes]
+    if isinstance(table, list):
+        return np.array(table, dtype=object)[indexes]
+    return np.array([table[i] for i in indexes.tolist()], dtype=object)
+
+
+def _categorical(names, codes):
+    """ A Categorical of the names behind codes, with only the categories that occur. """
+    used, inverse = np.unique(codes, return_inverse=True)
+    return pd.Categorical.from_codes(inverse, categories=_strings(names, used))
+
+
+def _speeds(names, codes):
+    """ Speed folder names as numbers, NaN where a name is not one. """
+    used, inverse = np.unique(codes, return_inverse=True)
+    return pd.to_numeric(pd.Series(_strings(names, used)), errors='coerce').to_numpy()[inverse]
+
+
+def tree_frames(store, under=None):
+    """
+    Exports an images tree from a TreeStore (or SnapshotTree) into two DataFrames, reading its
+    columns once and finding every node's ancestors by array indexing instead of a path per node:
+        folders: one row per speed folder: type, location, speed and its node index
+        images: one row per PNG: type, location, speed, name, size, id and its speed folder's index
+    Type, location and name are categoricals, so the frame holds each distinct name once.
+
+    Args:
+        store: the tree, e.g. TreeStore.from_master_dict(Dictionary(json_source='google_drive.json')).
+        under: the images folder as a path or index; the first root if None.
+
+    Raises:
+        ValueError: under is not in the tree.
+    """
+    root = store.roots[0] if under is None else store.resolve(under) if isinstance(under, str) else under
+    if root is None:
+        raise ValueError(f"'{under}' is not in the tree")
+    parent = np.asarray(store.parent, dtype=np.int64)
+    mime = np.asarray(store.mime)
+    name = np.asarray(store.name)
+    names = np.array(store.names, dtype=object) if isinstance(store.names, list) else store.names
+
+    folders, (location, type_) = _under(parent, np.flatnonzero(mime == 0), root, 3)
+    folder_frame = pd.DataFrame({'type': _categorical(names, name[type_]),
+                                 'location': _categorical(names, name[location]),
+                                 'speed': _speeds(names, name[folders]), 'index': folders})
+
+    png = store.mime_codes.get(PNG_MIMETYPE)
+    pngs = np.flatnonzero(mime == png) if png is not None else np.array([], dtype=np.int64)
+    images, (speed, location, type_) = _under(parent, pngs, root, 4)
+    size = np.asarray(store.size)[images]
+    image_frame = pd.DataFrame({'type': _categorical(names, name[type_]),
+                                'location': _categorical(names, name[location]),
+                                'speed': _speeds(names, name[speed]), 'name': _categorical(names, name[images]),
+                                'size': np.where(size == NONE, 0, size), 'id': _strings(store.ids, images), 'folder': speed})
+    return folder_frame, image_frame
+
+
+def _paths(rows):
+    return (rows['type'].astype(str) + '/' + rows['location'].astype(str) + '/'
+            + rows['speed'].map('{:g}'.format) + '/' + rows['name'].astype(str))
+
+
+def validate(store, under=None, limits: dict = None, expected: int = IMAGES_PER_FOLDER):
+    """
+    Runs main.py's image checks over tree_frames, each as one grouped array operation:
+    the PNG count of every speed folder, the size limit of each type, and size outliers by
+    z-score within each type (population standard deviation, as scipy.stats.zscore).
+
+    Args:
+        store: a TreeStore or SnapshotTree.
+        under: the images folder as a path or index; the first root if None.
+        limits: type -> {'size': max bytes, 'z': max |z-score|}; a type without a size has no
+            size limit, one without a z is held to Z_LIMIT.
+        expected: the number of PNGs each speed folder should hold.
+
+    Returns:
+        ValidationReport
+    """
+    limits = limits or {}
+    folders, images = tree_frames(store, under)
+
+    counts = np.bincount(images['folder'].to_numpy(), minlength=len(store.parent))[folders['index'].to_numpy()]
+    wrong = folders.assign(count=counts).loc[counts != expected, ['type', 'location', 'speed', 'count']]
+    wrong = wrong.sort_values(['type', 'location', 'speed'], ignore_index=True)
+
+    types = images['type'].cat.categories
+    codes = images['type'].cat.codes.to_numpy()
+    size = images['size'].to_numpy(dtype=np.float64)
+    count = np.bincount(codes, minlength=len(types))
+    mean = np.bincount(codes, size, len(types)) / np.maximum(count, 1)
+    deviation = np.sqrt(np.bincount(codes, (size - mean[codes]) ** 2, len(types)) / np.maximum(count, 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(deviation[codes] > 0, (size - mean[codes]) / deviation[codes], 0.0)
+    size_limit = np.array([limits.get(t, {}).get('size') or np.inf for t in types], dtype=np.float64)[codes]
+    z_limit = np.array([limits.get(t, {}).get('z', Z_LIMIT) for t in types], dtype=np.float64)[codes]
+
+    over = size > size_limit
+    oversized = images.loc[over, ['id', 'type', 'size']].assign(limit=size_limit[over].astype(np.int64))
+    oversized.insert(0, 'path', _paths(images[over]))
+
+    far = np.abs(z) > z_limit
+    outliers = images.loc[far, ['id', 'type', 'size']].assign(average=np.rint(mean[codes][far]).astype(np.int64),
+                                                                z=np.round(z[far], 2), limit=z_limit[far])
+    outliers.insert(0, 'path', _paths(images[far]))
+    return ValidationReport(wrong, oversized.reset_index(drop=True), outliers.reset_index(drop=True), len(folders), len(images))